@@ -3,7 +3,7 @@ from qtpy.QtCore import *
 from qtpy.QtGui import *
 from qtpy.QtWidgets import *
 
-from xicam.core import msg
+from xicam.core import msg, threads
 from xicam.core.data import load_header, NonDBHeader
 from xicam.core.execution.workflow import Workflow
 
@@ -11,14 +11,24 @@ from xicam.plugins import GUIPlugin, GUILayout, manager as pluginmanager
 
 from xicam.gui.widgets.linearworkfloweditor import WorkflowEditor
 from xicam.SAXS.processing.workflows import ReduceWorkflow, DisplayWorkflow
+from xicam.SAXS.processing import store
+from xicam.SAXS.scheduler import Scheduler
+from xicam.SAXS.formats import prefetch
 from xicam.SAXS.calibration.workflows import SimulateWorkflow
 from xicam.SAXS.masking.workflows import MaskingWorkflow
+from xicam.SAXS.masking import packedmask
 from pyFAI import AzimuthalIntegrator, detectors, calibrant
 import pyqtgraph as pg
 from functools import partial
+from itertools import count
 
 from xicam.gui.widgets.tabview import TabView, TabViewSynchronizer
 
+# Series with at least this many frames are reduced on a process pool rather than on the workflow's thread
+PARALLEL_FRAMES = 256
+# Series with at least this many frames are streamed to disk, so that memory use doesn't grow with the series
+STREAM_FRAMES = 10000
+
 
 class SAXSPlugin(GUIPlugin):
     name = 'SAXS'
@@ -36,8 +46,15 @@ class SAXSPlugin(GUIPlugin):
         self.headermodel = QStandardItemModel()
         self.selectionmodel = QItemSelectionModel(self.headermodel)
 
+        # Display, reduction and simulation requests run latest-wins; superseded jobs are cancelled
+        self.scheduler = Scheduler(stages=('display', 'reduce', 'simulate'))
+
         # Initialize workflows
         self.maskingworkflow = MaskingWorkflow()
+        # The masking workflow's last result, packed; shared read-only by every frame and worker of the reductions
+        self.mask = None
+        # The DynamicMask of its data-dependent processes, compiled once per execution; see masks
+        self.dynamicmask = None
         self.simulateworkflow = SimulateWorkflow()
         self.displayworkflow = DisplayWorkflow()
         self.reduceworkflow = ReduceWorkflow()
@@ -88,7 +105,7 @@ class SAXSPlugin(GUIPlugin):
         self.toolbar.sigDoWorkflow.connect(partial(self.doReduceWorkflow))
         self.reduceeditor.sigWorkflowChanged.connect(self.doReduceWorkflow)
         self.displayeditor.sigWorkflowChanged.connect(self.doDisplayWorkflow)
-        self.reducetabview.currentChanged.connect(self.headerChanged)
+        self.toolbar.remeshaction.toggled.connect(lambda checked: checked and self.doDisplayWorkflow())
         self.reducetabview.currentChanged.connect(self.headerChanged)
 
         # Setup more bindings
@@ -125,8 +142,9 @@ class SAXSPlugin(GUIPlugin):
         return ai
 
     def indexChanged(self):
+        self.doDisplayWorkflow()
         if not self.reduceplot.toolbar.multiplot.isChecked():
-            self.doReduceWorkflow(self.reduceworkflow)
+            self.doReduceWorkflow()
 
     def headerChanged(self):
         self.toolbar.updatedetectorcombobox(None, None)
@@ -142,7 +160,7 @@ class SAXSPlugin(GUIPlugin):
         self.headermodel.dataChanged.emit(QModelIndex(), QModelIndex())
 
     def doCalibrateWorkflow(self, workflow: Workflow):
-        data = self.calibrationtabview.currentWidget().header.meta_array()[0]
+        data = prefetch.prefetched(self.calibrationtabview.currentWidget().header)[0]
         device = self.toolbar.detectorcombobox.currentText()
         ai = self.calibrationsettings.AI(device)
         # ai.detector = detectors.Pilatus2M()
@@ -155,11 +173,14 @@ class SAXSPlugin(GUIPlugin):
         workflow.execute(None, data=data, ai=ai, calibrant=calibrant, callback_slot=setAI, threadkey='calibrate')
 
     def doSimulateWorkflow(self):
+        self.scheduler.submit('simulate', self._simulate)
+
+    def _simulate(self, ticket):
         # TEMPORARY HACK for demonstration
         #self.reducetabview.currentWidget().setTransform()
 
         if not self.calibrationtabview.currentWidget(): return
-        data = self.calibrationtabview.currentWidget().header.meta_array()[0]
+        data = prefetch.prefetched(self.calibrationtabview.currentWidget().header)[0]
         device = self.toolbar.detectorcombobox.currentText()
         ai = self.calibrationsettings.AI(device)
         calibrant = self.calibrationpanel.parameter['Calibrant Material']
@@ -168,13 +189,14 @@ class SAXSPlugin(GUIPlugin):
         def showSimulatedCalibrant(result=None):
             outputwidget.setCalibrantImage(result['data'].value)
 
-        self.simulateworkflow.execute(None, data=data, ai=ai, calibrant=calibrant, callback_slot=showSimulatedCalibrant,
-                                      threadkey='simulate')
+        return self.simulateworkflow.execute(None, data=data, ai=ai, calibrant=calibrant,
+                                             callback_slot=ticket.guard(showSimulatedCalibrant),
+                                             finished_slot=ticket.done, threadkey='simulate')
 
     def doMaskingWorkflow(self, workflow=None):
         if not self.masktabview.currentWidget(): return
         if not self.checkPolygonsSet(self.maskingworkflow):
-            data = self.masktabview.currentWidget().header.meta_array()[0]
+            data = prefetch.prefetched(self.masktabview.currentWidget().header)[0]
             device = self.toolbar.detectorcombobox.currentText()
             ai = self.calibrationsettings.AI(device)
             outputwidget = self.masktabview.currentWidget()
@@ -182,8 +204,15 @@ class SAXSPlugin(GUIPlugin):
             def showMask(result=None):
                 if result:
                     outputwidget.setMaskImage(result['mask'].value)
+                    mask = packedmask.pack(result['mask'].value)
+                    if mask is None or self.mask is None or mask.key != self.mask.key:
+                        self.mask = mask  # otherwise keep the current version, so reductions aren't redone
+                    dynamicmask = self.maskingworkflow.dynamic_mask() if self.mask is not None else None
+                    if dynamicmask is None or self.dynamicmask is None or dynamicmask.key != self.dynamicmask.key:
+                        self.dynamicmask = dynamicmask  # likewise; its evaluation of the last frame is kept too
                 else:
                     outputwidget.setMaskImage(None)
+                    self.mask = self.dynamicmask = None
                 self.doDisplayWorkflow()
                 self.doReduceWorkflow()
 
@@ -191,40 +220,127 @@ class SAXSPlugin(GUIPlugin):
             workflow.execute(None, data=data, ai=ai, callback_slot=showMask, threadkey='masking')
 
     def doDisplayWorkflow(self):
+        self.scheduler.submit('display', self._display)
+
+    def _display(self, ticket):
         if not self.reducetabview.currentWidget(): return
         currentwidget = self.reducetabview.currentWidget()
-        data = currentwidget.header.meta_array()[currentwidget.timeIndex(currentwidget.timeLine)[0]]
+        data = prefetch.prefetched(currentwidget.header)[currentwidget.timeIndex(currentwidget.timeLine)[0]]
         device = self.toolbar.detectorcombobox.currentText()
         ai = self.calibrationsettings.AI(device)
-        mask = self.maskingworkflow.lastresult[0]['mask'].value if self.maskingworkflow.lastresult else None
+        mask, dynamic_mask = self.masks()
         outputwidget = currentwidget
+        self.displayworkflow.setRemeshing(self.toolbar.remeshaction.isChecked())  # otherwise its image isn't shown
 
         def showDisplay(*results):
             outputwidget.setResults(results)
 
-        self.displayworkflow.execute(None, data=data, ai=ai, mask=mask, callback_slot=showDisplay, threadkey='display')
+        return self.displayworkflow.execute(None, data=data, ai=ai, mask=mask,
+                                            dynamic_mask=dynamic_mask,  # evaluated on the frame in the thread
+                                            callback_slot=ticket.guard(showDisplay), finished_slot=ticket.done,
+                                            threadkey='display')
+
+    def masks(self):
+        """
+        The static mask, and the DynamicMask evaluating the masking workflow's data-dependent processes on each frame
+        (or None, if there are none; the static mask is then the masking workflow's whole result). Both are those of the
+        masking workflow's last execution.
+        """
+        if self.dynamicmask is None:
+            return self.mask, None
+        return self.dynamicmask.static, self.dynamicmask
 
     def doReduceWorkflow(self):
+        self.scheduler.submit('reduce', self._reduce)
+
+    def _reduce(self, ticket):
         if not self.reducetabview.currentWidget(): return
         multimode = self.reduceplot.toolbar.multiplot.isChecked()
         currentwidget = self.reducetabview.currentWidget()
-        data = currentwidget.header.meta_array()
-        if not multimode:
-            data = [data[currentwidget.timeIndex(currentwidget.timeLine)[0]]]
+        data = prefetch.prefetched(currentwidget.header)
         device = self.toolbar.detectorcombobox.currentText()
         ai = self.calibrationsettings.AI(device)
-        ai = [ai] * len(data)
-        mask = [self.maskingworkflow.lastresult[0]['mask'].value if self.maskingworkflow.lastresult else None] * len(
-            data)
+        mask, dynamic_mask = self.masks()  # thresholds and zingers are evaluated on each frame
         outputwidget = self.reduceplot
 
         # outputwidget.clear_all()
 
-        def showReduce(*results):
-            self.reduceplot.plot_mode(results)
-            pass
+        # Show stored curves if this reduction was done before, in this session or an earlier one
+        index = None if multimode else currentwidget.timeIndex(currentwidget.timeLine)[0]
+        key = store.result_key(store.frame_key(currentwidget.header, index), self.reduceworkflow, ai, mask, multimode,
+                               dynamic_mask.key if dynamic_mask is not None else None)
+        location = store.location(currentwidget.header)
+        curves = store.results.get(key, location)
+        if curves is not None:
+            outputwidget.plot_series(curves)
+            return
+
+        if multimode and len(data) >= STREAM_FRAMES and self.reduceworkflow.reduces_only():
+            # Very long series are streamed to disk with bounded memory, and plotted from the memory-mapped result;
+            # like the pool below, only if the workflow is just the reduction
+            def reduceStream():
+                result = self.reduceworkflow.execute_streaming(data, ai, store.stream_location(key, location), mask,
+                                                               cancelled=lambda: ticket.cancelled,
+                                                               dynamic_mask=dynamic_mask)
+                if result is None: return
+                curves = [(x, [result[x], result[y]])
+                          for x, y in (('q', 'Iq'), ('chi', 'Ichi'), ('qx', 'Ix'), ('qz', 'Iz'))]
+                store.results.put(key, curves, location)
+                return curves
+
+            thread = threads.QThreadFuture(reduceStream, callback_slot=ticket.guard(outputwidget.plot_series),
+                                           finished_slot=ticket.done)
+            thread.start()
+            return thread
+
+        if multimode and len(data) >= PARALLEL_FRAMES and self.reduceworkflow.reduces_only():
+            # Long series are reduced on a process pool, and plotted once complete; processes added to the workflow
+            # (i.e. fits) only run in the workflow, so then the series is reduced in stacked blocks below
+            def reduceSeries():
+                result = self.reduceworkflow.execute_parallel(data, ai, mask, cancelled=lambda: ticket.cancelled,
+                                                              dynamic_mask=dynamic_mask)
+                if result is None: return
+                curves = [(x, [result[x], result[y]])
+                          for x, y in (('q', 'Iq'), ('chi', 'Ichi'), ('qx', 'Ix'), ('qz', 'Iz'))]
+                store.results.put(key, curves, location)
+                return curves
+
+            thread = threads.QThreadFuture(reduceSeries, callback_slot=ticket.guard(outputwidget.plot_series),
+                                           finished_slot=ticket.done)
+            thread.start()
+            return thread
+
+        if multimode:
+            # Reduce the series in stacked blocks; the first block replaces the previous plots, the rest append
+            blocks = count()
+            stacked = []
+
+            def showStack(*results):
+                curves = [curve for result in results for curve in outputwidget.curves(result)]
+                stacked.extend(curves)
+                outputwidget.plot_series(curves, clear=not next(blocks))
+
+            def finishStack():
+                if not ticket.cancelled:  # otherwise only part of the series was reduced
+                    store.results.put(key, stacked, location)
+                ticket.done()
+
+            return self.reduceworkflow.execute_stack(None, data=data, ai=ai, mask=mask,
+                                                     cancelled=lambda: ticket.cancelled, dynamic_mask=dynamic_mask,
+                                                     callback_slot=ticket.guard(showStack), finished_slot=finishStack,
+                                                     threadkey='reduce')
+
+        data = [data[index]]
 
-        self.reduceworkflow.execute_all(None, data=data, ai=ai, mask=mask, callback_slot=showReduce, threadkey='reduce')
+        def showReduce(*results):
+            curves = [curve for result in results for curve in outputwidget.curves(result)]
+            store.results.put(key, curves, location)
+            outputwidget.plot_series(curves)
+
+        return self.reduceworkflow.execute_all(None, data=data, ai=[ai], mask=[mask],
+                                               dynamic_mask=[dynamic_mask],
+                                               callback_slot=ticket.guard(showReduce), finished_slot=ticket.done,
+                                               threadkey='reduce')
 
     def checkPolygonsSet(self, workflow: Workflow):
         """
@@ -1,13 +1,16 @@
 from xicam.plugins.datahandlerplugin import DataHandlerPlugin, start_doc, descriptor_doc, event_doc, stop_doc, \
     embedded_local_event_doc
 
+import io
 import os
 import fabio
 import uuid
 import re
-import functools
+import numpy as np
 from pathlib import Path
 
+from xicam.SAXS.formats import framecache, metadata
+
 
 class EDFPlugin(DataHandlerPlugin):
     name = 'EDFPlugin'
@@ -19,13 +22,13 @@ class EDFPlugin(DataHandlerPlugin):
     def __init__(self, path):
         super(EDFPlugin, self).__init__()
         self.path = path
-        self.fimg = fabio.open(path)
 
     def __call__(self, *args, **kwargs):
-        return self.fimg.data
+        # Uncompressed frames are memory-mapped, so pixels are only read from disk as they are used. Frames are shared
+        # through the frame cache rather than held by each handler, which bounds the open mappings (and descriptors)
+        return framecache.frames.get(self.path, read)
 
     @staticmethod
-    @functools.lru_cache(maxsize=10, typed=False)
     def parseTXTFile(path):
         p = Path(path)
         if not p.suffix == '.txt':
@@ -34,34 +37,132 @@ class EDFPlugin(DataHandlerPlugin):
         if not os.path.isfile(path):
             return dict()
 
-        with open(path, 'r') as f:
-            lines = f.readlines()
+        return metadata.lookup(path, 'txt', _parse_txt)
+
+    @staticmethod
+    def parseDataFile(path):
+        md = metadata.lookup(path, 'edf', _parse_header)
+        md.update({'object_keys': {'pilatus2M': ['primary']}})
+        return md
+
+    @classmethod
+    def getStartDoc(cls, paths, start_uid):
+        # Index the whole series up front, on a pool of threads; parsing each file's metadata then reads the index
+        cls.scan(paths)
+        return super(EDFPlugin, cls).getStartDoc(paths, start_uid)
 
-        paras = dict()
+    @staticmethod
+    def scan(paths, workers=None):
+        """
+        Parse and index the headers and .txt sidecars of many files at once; only new or modified files are parsed.
+        """
+        paths = [str(path) for path in paths]
+        metadata.scan(paths, 'edf', _parse_header, workers=workers)
+        sidecars = [str(Path(path).with_suffix('.txt')) for path in paths]
+        metadata.scan([path for path in sidecars if os.path.isfile(path)], 'txt', _parse_txt, workers=workers)
 
-        # The 7.3.3 txt format is messy, with keyless values, and extra whitespaces
 
-        keylesslines = 0
-        for line in lines:
-            cells = [_f for _f in re.split('[=:]+', line) if _f]
+def _parse_txt(path):
+    with open(path, 'r') as f:
+        lines = f.readlines()
 
-            key = cells[0].strip()
+    paras = dict()
 
-            if cells.__len__() == 2:
-                cells[1] = cells[1].split('/')[0]
-                paras[key] = key_cast(key, cells[1].strip())
-            elif cells.__len__() == 1:
-                keylesslines += 1
-                paras['Keyless value #' + str(keylesslines)] = key
+    # The 7.3.3 txt format is messy, with keyless values, and extra whitespaces
 
-        return paras
+    keylesslines = 0
+    for line in lines:
+        cells = [_f for _f in re.split('[=:]+', line) if _f]
 
-    @staticmethod
-    @functools.lru_cache(maxsize=10, typed=False)
-    def parseDataFile(path):
-        md = fabio.open(path).header
-        md.update({'object_keys': {'pilatus2M': ['primary']}})
-        return md
+        key = cells[0].strip()
+
+        if cells.__len__() == 2:
+            cells[1] = cells[1].split('/')[0]
+            paras[key] = key_cast(key, cells[1].strip())
+        elif cells.__len__() == 1:
+            keylesslines += 1
+            paras['Keyless value #' + str(keylesslines)] = key
+
+    return paras
+
+
+def _parse_header(path):
+    try:
+        return read_header(path)[0]
+    except ValueError:
+        return dict(fabio.open(path).header)
+
+
+# EDF DataType -> numpy type; the byte order is given separately by ByteOrder
+EDF_TYPES = {'SignedByte': 'i1', 'UnsignedByte': 'u1',
+             'SignedShort': 'i2', 'UnsignedShort': 'u2',
+             'SignedInteger': 'i4', 'UnsignedInteger': 'u4',
+             'SignedLong': 'i4', 'UnsignedLong': 'u4',
+             'Signed64': 'i8', 'Unsigned64': 'u8',
+             'FloatValue': 'f4', 'Float': 'f4', 'FLOATVALUE': 'f4',
+             'DoubleValue': 'f8', 'Double': 'f8', 'DOUBLEVALUE': 'f8'}
+
+EDF_BYTEORDERS = {'LowByteFirst': '<', 'HighByteFirst': '>'}
+
+
+def read_header(path):
+    """
+    Parse the ASCII header block of the first frame of an EDF file, without reading its pixels.
+
+    Returns
+    -------
+    tuple
+        (header, offset): the header's keys and (string) values, and the byte offset of the frame's binary data
+
+    """
+    with open(path, 'rb') as f:
+        block = f.read(512)  # headers are padded to a multiple of 512 bytes
+        if not block.lstrip().startswith(b'{'):
+            raise ValueError('Not an EDF file: {}'.format(path))
+        while b'}' not in block:
+            chunk = f.read(512)
+            if not chunk:
+                raise ValueError('Unterminated EDF header: {}'.format(path))
+            block += chunk
+
+    end = block.index(b'}')
+    offset = block.index(b'\n', end) + 1 if b'\n' in block[end:] else end + 1
+    header = {}
+    for item in block[block.index(b'{') + 1:end].decode('latin1').split(';'):
+        key, sep, value = item.partition('=')
+        if sep:
+            header[key.strip()] = value.strip()
+    return header, offset
+
+
+def read(path):
+    """
+    The first frame of an EDF file; memory-mapped if it's uncompressed.
+    """
+    frame = memmap(path)
+    if frame is None:
+        frame = fabio.open(path).data
+    return frame
+
+
+def memmap(path):
+    """
+    Read-only memory map of the first frame of an uncompressed EDF file; returns None if the frame is compressed (or
+    its header doesn't describe it), in which case it must be decoded (i.e. with fabio).
+    """
+    try:
+        header, offset = read_header(path)
+        if header.get('Compression', 'None').lower() not in ('none', ''):
+            return None
+        dtype = np.dtype(EDF_BYTEORDERS.get(header.get('ByteOrder'), '<') + EDF_TYPES[header['DataType']])
+        shape = (int(header['Dim_2']), int(header['Dim_1']))
+        if 'Size' in header and int(header['Size']) != shape[0] * shape[1] * dtype.itemsize:
+            return None
+        if os.path.getsize(path) < offset + shape[0] * shape[1] * dtype.itemsize:
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
 
 
 def key_cast(key, value):
@@ -287,7 +388,122 @@ conversions = {'int': lambda x: int(x.strip()),
                'float': lambda x: float(x.strip()),
                'str': lambda x: x.strip(),
                'date': lambda x: x.strip(),
-               'tabdelimitedfloat': lambda x: list(map(float, x.split('\t'))) if x else []}
+               'tabdelimitedfloat': lambda x: (np.loadtxt(io.StringIO(x), delimiter='\t', ndmin=1).tolist()
+                                               if x.strip() else [])}
+
+# Column dtypes of each key type, and the value of missing entries
+column_types = {'int': (np.int64, -1),
+                'float': (np.float64, np.nan),
+                'str': (str, ''),
+                'date': (str, ''),
+                'tabdelimitedfloat': (np.float64, np.nan)}
+
+
+def metadata_table(paths, keys=None, workers=None):
+    """
+    The metadata of a series as a structured array, with one record per file and one typed field per key.
+
+    Header and .txt sidecar values are merged (the sidecar taking precedence) and typed by key_type_map. Missing values
+    are -1 in int fields, NaN in float fields and '' in string fields. tabdelimitedfloat keys (i.e. the Alpha_scan_*
+    lists) are fields of NaN-padded arrays.
+
+    Parameters
+    ----------
+    paths: list
+        Paths of the .edf files of the series
+    keys: list
+        Keys of key_type_map to include; defaults to all of those which any file has
+    workers: int
+        Number of threads parsing files which aren't indexed yet
+
+    Examples
+    --------
+    Select the frames in a range of sample positions, without looping over files
+
+    >>> table = metadata_table(paths)
+    >>> frames = np.flatnonzero((table['Sample X Stage'] > 1) & (table['Sample X Stage'] < 2))
+
+    """
+    paths = [os.path.abspath(str(path)) for path in paths]
+    headers = metadata.scan(paths, 'edf', _parse_header, workers=workers)
+    sidecars = {path: str(Path(path).with_suffix('.txt')) for path in paths}
+    txts = metadata.scan([sidecar for sidecar in sidecars.values() if os.path.isfile(sidecar)], 'txt', _parse_txt,
+                         workers=workers)
+
+    records = []
+    for path in paths:
+        record = {key: value for key, value in headers[path].items() if key in key_type_map}
+        for key, value in record.items():
+            if key_type_map[key] == 'tabdelimitedfloat':  # parsed a column at a time; see _tabdelimited
+                continue
+            try:
+                record[key] = key_cast(key, value)
+            except ValueError:
+                record[key] = None
+        record.update(txts.get(sidecars[path], {}))
+        records.append(record)
+
+    if keys is None:
+        keys = [key for key in key_type_map if any(key in record for record in records)]
+
+    columns = {}
+    for key in keys:
+        dtype, missing = column_types[key_type_map.get(key, 'str')]
+        values = [record.get(key) for record in records]
+        if key_type_map.get(key) == 'tabdelimitedfloat':
+            column = _tabdelimited(values)
+        else:
+            column = np.array([missing if value is None or isinstance(value, (list, str)) != (dtype is str)
+                               else value for value in values], dtype=dtype)
+        columns[key] = column
+
+    table = np.empty(len(paths), dtype=[(key, column.dtype, column.shape[1:]) for key, column in columns.items()])
+    for key, column in columns.items():
+        table[key] = column
+    return table
+
+
+def _tabdelimited(values):
+    """
+    A NaN-padded array with a row per value of a tabdelimitedfloat column: header strings, which are all parsed at once,
+    lists already parsed from sidecars, or None. Rows of malformed strings are NaN.
+    """
+    strings = {row: value.strip() for row, value in enumerate(values) if isinstance(value, str) and value.strip()}
+    lists = {row: value for row, value in enumerate(values) if isinstance(value, list) and value}
+    counts = np.array([string.count('\t') + 1 for string in strings.values()], dtype=np.intp)
+    try:
+        flat = np.loadtxt(io.StringIO('\t'.join(strings.values())), delimiter='\t', ndmin=1) if strings else None
+    except ValueError:  # some are malformed; parse them one at a time to tell which
+        flat = None
+        for row, string in strings.items():
+            try:
+                lists[row] = conversions['tabdelimitedfloat'](string)
+            except ValueError:
+                pass
+        strings = {}
+
+    width = max([len(value) for value in lists.values()] + ([counts.max()] if strings else []) + [0])
+    column = np.full((len(values), width), np.nan)
+    if strings:
+        rows = np.repeat(np.fromiter(strings, dtype=np.intp, count=len(strings)), counts)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        column[rows, np.arange(len(flat)) - offsets] = flat
+    for row, value in lists.items():
+        column[row, :len(value)] = value
+    return column
+
+
+def normalization_factors(table, keys=('Izero',)):
+    """
+    Per-frame normalization factors (i.e. for a ReductionBundlePlugin's normalization_factor): the product of the keys'
+    columns of a metadata_table, such as the monitor counts and count time. The factors of frames with missing or
+    non-positive values are NaN, so their intensities are NaN too, rather than raw intensities among normalized ones;
+    np.isfinite(factors) selects the valid frames.
+    """
+    factors = np.ones(len(table), dtype=np.float64)
+    for key in keys:
+        factors *= table[key]
+    return np.where(np.isfinite(factors) & (factors > 0), factors, np.nan).astype(np.float32)
 
 
 def _data_keys_from_value(v, src_name, object_name):
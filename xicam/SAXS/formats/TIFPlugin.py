@@ -5,10 +5,14 @@ import os
 import fabio
 import uuid
 import re
-import functools
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 
+from xicam.SAXS.formats import framecache, metadata
 
 
 class TIFPlugin(DataHandlerPlugin):
@@ -19,20 +23,162 @@ class TIFPlugin(DataHandlerPlugin):
     descriptor_keys = ['object_keys']
 
     def __call__(self, *args, **kwargs):
-        return fabio.open(self.path).data
+        # Decoded frames are shared through the frame cache (see framecache.frames.maxbytes for its budget), so
+        # revisiting a frame doesn't read its file again
+        return framecache.frames.get(self.path, read)
 
     def __init__(self, path):
         super(TIFPlugin, self).__init__()
         self.path = path
-        self.fimg = fabio.open(path)
 
     @staticmethod
-    @functools.lru_cache(maxsize=10, typed=False)
     def parseDataFile(path):
-        md = fabio.open(path).header
+        md = metadata.lookup(path, 'tif', _parse_header)
         md.update({'object_keys': {'pilatus2M': ['primary']}})
         return md
 
     @classmethod
     def getStartDoc(cls, paths, start_uid):
         return start_doc(start_uid=start_uid, metadata={'paths': paths})
+
+
+def _parse_header(path):
+    return {str(key): str(value) for key, value in fabio.open(path).header.items()}
+
+
+# TIFF field types -> struct format
+_TIFF_TYPES = {1: 'B', 2: 's', 3: 'H', 4: 'I', 5: 'II', 6: 'b', 7: 'B', 8: 'h', 9: 'i', 10: 'ii', 11: 'f', 12: 'd',
+               16: 'Q'}
+_SAMPLE_FORMATS = {1: 'u', 2: 'i', 3: 'f'}
+_DEFLATE = (8, 32946)
+
+_decoder = None  # thread pool decompressing strips and tiles; zlib releases the GIL
+
+
+def read_ifd(path):
+    """
+    Parse the tags of the first image of a (classic, not Big-) TIFF file.
+
+    Returns
+    -------
+    tuple
+        (tags, byteorder): a dict of tag number to its tuple of values, and '<' or '>'
+
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        if head[:2] not in (b'II', b'MM'):
+            raise ValueError('Not a TIFF file: {}'.format(path))
+        byteorder = '<' if head[:2] == b'II' else '>'
+        magic, offset = struct.unpack(byteorder + 'HI', head[2:])
+        if magic != 42:
+            raise ValueError('Unsupported TIFF: {}'.format(path))
+        f.seek(offset)
+        count, = struct.unpack(byteorder + 'H', f.read(2))
+        entries = f.read(12 * count)
+
+        tags = {}
+        for i in range(count):
+            tag, type, n, value = struct.unpack(byteorder + 'HHI4s', entries[12 * i:12 * i + 12])
+            if type not in _TIFF_TYPES or type == 2:
+                continue
+            fmt = _TIFF_TYPES[type] * n
+            size = struct.calcsize(byteorder + fmt)
+            if size > 4:
+                f.seek(struct.unpack(byteorder + 'I', value)[0])
+                value = f.read(size)
+            tags[tag] = struct.unpack(byteorder + fmt, value[:size])
+    return tags, byteorder
+
+
+def memmap(path, tags=None, byteorder='<'):
+    """
+    Read-only memory map of an uncompressed, single-channel TIFF stored in contiguous strips; returns None otherwise.
+    """
+    try:
+        if tags is None: tags, byteorder = read_ifd(path)
+        dtype, shape = _layout(tags, byteorder)
+        if tags.get(259, (1,))[0] != 1 or 322 in tags:
+            return None
+        offsets, counts = tags[273], tags[279]
+        if any(offsets[i] + counts[i] != offsets[i + 1] for i in range(len(offsets) - 1)):
+            return None
+        if os.path.getsize(path) < offsets[0] + shape[0] * shape[1] * dtype.itemsize:
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=offsets[0], shape=shape)
+
+
+def decode(path, tags=None, byteorder='<'):
+    """
+    Decode a deflate-compressed (or uncompressed) single-channel TIFF, decompressing its strips or tiles on a pool of
+    threads; returns None for other compressions, which are left to fabio.
+    """
+    global _decoder
+    try:
+        if tags is None: tags, byteorder = read_ifd(path)
+        dtype, (height, width) = _layout(tags, byteorder)
+    except (OSError, ValueError, KeyError):
+        return None
+    compression = tags.get(259, (1,))[0]
+    predictor = tags.get(317, (1,))[0]
+    if compression not in _DEFLATE + (1,) or predictor not in (1, 2) or (predictor == 2 and dtype.kind == 'f'):
+        return None
+
+    if 322 in tags:  # tiled
+        blockwidth, blockheight = tags[322][0], tags[323][0]
+        offsets, counts = tags[324], tags[325]
+    else:
+        blockwidth, blockheight = width, tags.get(278, (height,))[0]
+        offsets, counts = tags[273], tags[279]
+
+    with open(path, 'rb') as f:
+        chunks = []
+        for offset, count in zip(offsets, counts):
+            f.seek(offset)
+            chunks.append(f.read(count))
+
+    if compression in _DEFLATE:
+        if _decoder is None:
+            _decoder = ThreadPoolExecutor(os.cpu_count())
+        chunks = list(_decoder.map(zlib.decompress, chunks))
+
+    across = -(-width // blockwidth)
+    image = np.empty((-(-height // blockheight) * blockheight, across * blockwidth), dtype=dtype)
+    for i, chunk in enumerate(chunks):
+        block = np.frombuffer(chunk, dtype=dtype)
+        rows = min(len(block) // blockwidth, blockheight)
+        block = block[:rows * blockwidth].reshape(rows, blockwidth)
+        if predictor == 2:  # undo horizontal differencing
+            block = np.cumsum(block, axis=1, dtype=dtype)
+        row, column = divmod(i, across)
+        image[row * blockheight:row * blockheight + rows, column * blockwidth:(column + 1) * blockwidth] = block
+    return image[:height, :width]
+
+
+def read(path):
+    """
+    Read the first image of a TIFF: memory-mapped if uncompressed, decoded on a thread pool if deflate-compressed, or
+    else decoded by fabio.
+    """
+    try:
+        tags, byteorder = read_ifd(path)
+    except (OSError, ValueError):
+        return fabio.open(path).data
+    frame = memmap(path, tags, byteorder)
+    if frame is None:
+        frame = decode(path, tags, byteorder)
+    if frame is None:
+        frame = fabio.open(path).data
+    return frame
+
+
+def _layout(tags, byteorder):
+    if tags.get(277, (1,))[0] != 1:
+        raise ValueError('Only single-channel TIFFs are supported')
+    bits = tags.get(258, (1,))[0]
+    if bits not in (8, 16, 32, 64):
+        raise ValueError('Unsupported bit depth: {}'.format(bits))
+    dtype = np.dtype(byteorder + _SAMPLE_FORMATS[tags.get(339, (1,))[0]] + str(bits // 8))
+    return dtype, (tags[257][0], tags[256][0])
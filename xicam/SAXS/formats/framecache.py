@@ -0,0 +1,132 @@
+"""
+Process-wide cache of decoded frames.
+
+Frames are keyed by path, size and modification time, and kept in an LRU bounded in bytes, so revisiting a frame (or
+reducing it again) doesn't read or decode its file again. Memory-mapped frames cost no decoding and are paged by the OS,
+so they don't count against the byte budget. Each holds an open file descriptor though, so far fewer of them are kept
+than of decoded frames (the usual limits are 256 to 1024 descriptors per process). Concurrent loads of the same frame
+(i.e. by a prefetcher and the GUI) are coalesced into one.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FrameCache(object):
+    """
+    A thread-safe LRU of read-only frames, bounded by maxbytes of decoded pixels, by maxframes frames, and by maxmapped
+    memory-mapped frames.
+    """
+
+    def __init__(self, maxbytes=1024 * 2 ** 20, maxframes=4096, maxmapped=64):
+        self.maxbytes = maxbytes
+        self.maxframes = maxframes
+        self.maxmapped = maxmapped
+        self.nbytes = 0
+        self.mapped = 0
+        self._frames = OrderedDict()  # key -> (frame, nbytes, mapped)
+        self._loading = {}  # key -> Event set when its load finishes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, path, load):
+        """
+        The frame of the file at path, loading it with load(path) only if it isn't cached (or the file changed).
+        """
+        return self.fetch(self.key(path), lambda: load(path))
+
+    def fetch(self, key, load):
+        """
+        The frame cached under key, loading it with load() only if it isn't cached.
+        """
+        while True:
+            with self._lock:
+                if key in self._frames:
+                    self._frames.move_to_end(key)
+                    self.hits += 1
+                    return self._frames[key][0]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            loading.wait()  # loaded by another thread; take it from the cache (or load it, if that failed)
+
+        try:
+            frame = load()
+            if isinstance(frame, np.ndarray):
+                frame.flags.writeable = False  # shared by all readers
+            self._remember(key, frame)
+            return frame
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def lookup(self, key):
+        """
+        The frame cached under key, or None if it isn't cached; it isn't loaded.
+        """
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key][0]
+
+    def put(self, key, frame):
+        """
+        Cache a frame loaded elsewhere under key.
+        """
+        if isinstance(frame, np.ndarray):
+            frame.flags.writeable = False  # shared by all readers
+        self._remember(key, frame)
+
+    def __contains__(self, path):
+        try:
+            return self.cached(self.key(path))
+        except OSError:
+            return False
+
+    def cached(self, key):
+        """
+        Whether a frame is cached (or being loaded) under key.
+        """
+        with self._lock:
+            return key in self._frames or key in self._loading
+
+    def _remember(self, key, frame):
+        mapped = isinstance(frame, np.memmap)
+        nbytes = 0 if mapped else getattr(frame, 'nbytes', 0)
+        with self._lock:
+            if nbytes > self.maxbytes or (mapped and not self.maxmapped):
+                return
+            self._frames[key] = frame, nbytes, mapped
+            self.nbytes += nbytes
+            self.mapped += mapped
+            while self.nbytes > self.maxbytes or len(self._frames) > self.maxframes:
+                self._evict(next(iter(self._frames)))
+            if self.mapped > self.maxmapped:  # the least recently used mapping
+                self._evict(next(key for key, (_, _, mapped) in self._frames.items() if mapped))
+
+    def _evict(self, key):
+        _, nbytes, mapped = self._frames.pop(key)
+        self.nbytes -= nbytes
+        self.mapped -= mapped
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+            self.mapped = 0
+
+
+frames = FrameCache()
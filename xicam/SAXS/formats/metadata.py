@@ -0,0 +1,147 @@
+"""
+Persistent index of parsed file metadata.
+
+Parsing headers and sidecar files costs far more than reading them back: an ALS series has thousands of .edf/.txt pairs.
+Parsed metadata is kept in an SQLite database in a '.xicam' directory beside the files (or in the temporary directory if
+that isn't writable), keyed by path, size and modification time, so each file is parsed once unless it changes. Series
+are indexed in bulk, parsing only new or modified files, on a pool of threads.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_CHUNK = 500  # paths per query; below SQLite's limit on the number of parameters
+
+
+def location(directory):
+    """
+    Path of the index of the files in directory.
+    """
+    directory = os.path.abspath(directory)
+    path = os.path.join(directory, '.xicam')
+    try:
+        os.makedirs(path, exist_ok=True)
+        if os.access(path, os.W_OK):
+            return os.path.join(path, 'metadata.sqlite')
+    except OSError:
+        pass
+    path = os.path.join(tempfile.gettempdir(), 'xicam-saxs')
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, 'metadata-{}.sqlite'.format(hashlib.sha1(directory.encode()).hexdigest()))
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class MetadataIndex(object):
+    """
+    An SQLite table of parsed metadata, keyed by (path, kind); entries are valid while the file's size and mtime match.
+
+    kind distinguishes the parsers of the same file (i.e. 'edf' for a frame's header, 'txt' for its sidecar). Metadata is
+    stored as JSON, so must be made of dicts, lists, strings and numbers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS metadata '
+                                     '(path TEXT, kind TEXT, size INTEGER, mtime INTEGER, metadata TEXT, '
+                                     'PRIMARY KEY (path, kind))')
+
+    def get(self, path, kind, parse):
+        """
+        Metadata of the file at path, from the index if it is current, or else from parse(path) (and then indexed).
+        """
+        return self.get_many([path], kind, parse)[path]
+
+    def get_many(self, paths, kind, parse, workers=None):
+        """
+        Metadata of many files at once, as a dict by path; files not yet indexed (or changed since) are parsed on a
+        pool of workers threads and indexed in a single transaction.
+        """
+        paths = list(paths)
+        stats = {path: _stat(path) for path in paths}
+        indexed = {}
+        with self._lock:
+            for start in range(0, len(paths), _CHUNK):
+                chunk = paths[start:start + _CHUNK]
+                rows = self._connection.execute(
+                    'SELECT path, size, mtime, metadata FROM metadata WHERE kind = ? AND path IN ({})'.format(
+                        ','.join('?' * len(chunk))), [kind] + chunk)
+                indexed.update({path: (size, mtime, metadata) for path, size, mtime, metadata in rows})
+
+        results = {}
+        stale = []
+        for path in paths:
+            row = indexed.get(path)
+            if row is not None and stats[path] == row[:2]:
+                results[path] = json.loads(row[2])
+            else:
+                stale.append(path)
+
+        if stale:
+            if len(stale) > 1 and workers != 1:
+                with ThreadPoolExecutor(workers) as executor:
+                    parsed = list(executor.map(parse, stale))
+            else:
+                parsed = list(map(parse, stale))
+            results.update(zip(stale, parsed))
+
+            rows = [(path, kind) + stats[path] + (json.dumps(metadata),) for path, metadata in zip(stale, parsed)
+                    if stats[path] is not None]  # files which don't exist aren't indexed
+            with self._lock, self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)', rows)
+
+        return results
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index(directory):
+    """
+    The (shared) MetadataIndex of the files in directory.
+    """
+    path = location(directory)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = MetadataIndex(path)
+        return _indexes[path]
+
+
+def lookup(path, kind, parse):
+    """
+    Metadata of the file at path, through the index of its directory.
+    """
+    path = os.path.abspath(path)
+    return index(os.path.dirname(path)).get(path, kind, parse)
+
+
+def scan(paths, kind, parse, workers=None):
+    """
+    Index many files (i.e. a whole series) at once, grouped by directory; returns their metadata as a dict by path.
+    """
+    bydirectory = {}
+    for path in map(os.path.abspath, paths):
+        bydirectory.setdefault(os.path.dirname(path), []).append(path)
+    results = {}
+    for directory, group in bydirectory.items():
+        results.update(index(directory).get_many(group, kind, parse, workers=workers))
+    return results
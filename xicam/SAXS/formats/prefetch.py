@@ -0,0 +1,157 @@
+"""
+Read-ahead of the frames of a header.
+
+A header's lazy array reads a frame's file when the frame is indexed, so on network storage each step along the timeline
+waits for a file read. PrefetchedArray wraps the lazy array: frames are served from the shared frame cache, and each
+access predicts the direction (and stride) of the next ones from the previous access, and reads the frames ahead on a
+small pool of I/O threads. The keys of the frames read ahead (statting their files, another round-trip on network
+storage) are computed on the I/O threads too, and reused when the frames are accessed. All views of a header (calibrate,
+mask, reduce and compare) share one PrefetchedArray, and all headers share the frame cache's budget.
+
+Frames of files are cached under the same keys as the file handlers (i.e. TIF and EDF) cache the frames they read, so a
+frame is only cached once, as its handler read it (decoded, or memory-mapped); reading one ahead pages it in.
+"""
+
+import threading
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from xicam.SAXS.formats import framecache
+
+WORKERS = 4  # I/O threads reading ahead, shared by all headers
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _submit(fn, *args):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(WORKERS, thread_name_prefix='xicam-prefetch')
+    return _executor.submit(fn, *args)
+
+
+class PrefetchedArray(object):
+    """
+    A frame sequence (i.e. a header's lazy array) whose frames are cached and read ahead.
+
+    Parameters
+    ----------
+    array:
+        The sequence of frames; indexed with an int to read a frame
+    paths: list
+        One file per frame, if so; frames are then cached by file (and so shared with other arrays of the same files, and
+        with the files' handlers)
+    depth: int
+        Number of frames read ahead
+    frames: framecache.FrameCache
+        Where frames are cached
+
+    """
+
+    def __init__(self, array, paths=None, depth=8, frames=None):
+        self.array = array
+        self.paths = list(paths) if paths is not None and len(paths) == len(array) and len(paths) > 1 else None
+        self.depth = depth
+        self.frames = frames or framecache.frames
+        self._token = uuid.uuid4().hex  # identifies frames which aren't files
+        self._last = None
+        self._ahead = {}  # index -> Future of a read ahead
+        self._keys = {}  # index -> key of a frame read ahead, until it is accessed
+        self._lock = threading.Lock()
+
+    def key(self, index):
+        if self.paths is not None:
+            return self.frames.key(self.paths[index])
+        return 'prefetch', self._token, index
+
+    def read(self, index):
+        frame = self.array[index]
+        if isinstance(frame, np.memmap) or not isinstance(frame, np.ndarray):
+            frame = np.array(frame)  # i.e. page a memory-mapped frame in now, rather than when it is first displayed
+        return frame
+
+    def load(self, index, key):
+        """
+        The frame at index, from the frame cache (under key) if it is there.
+        """
+        if self.paths is None:
+            return self.frames.fetch(key, lambda: self.read(index))
+        frame = self.frames.lookup(key)
+        if frame is None:
+            # The handler caches the frame as it reads it, unless it doesn't cache frames at all
+            frame = self.array[index]
+            if not self.frames.cached(key):
+                self.frames.put(key, frame)
+        return frame
+
+    def __getitem__(self, index):
+        if not isinstance(index, (int, np.integer)):
+            return self.array[index]
+        if index < 0:
+            index += len(self)
+        with self._lock:
+            key = self._keys.pop(index, None)
+        frame = self.load(index, key or self.key(index))
+        self.readahead(index)
+        return frame
+
+    def readahead(self, index):
+        """
+        Read the frames after index, in the direction (and with the stride) of the previous access.
+        """
+        with self._lock:
+            last, self._last = self._last, index
+            step = index - last if last is not None and 0 < abs(index - last) <= self.depth else \
+                (-1 if last is not None and index < last else 1)
+            targets = [index + step * i for i in range(1, self.depth + 1) if 0 <= index + step * i < len(self)]
+
+            # Drop reads ahead which are no longer wanted (i.e. the user reversed), unless they already started
+            for target in list(self._ahead):
+                if target not in targets and (self._ahead[target].done() or self._ahead[target].cancel()):
+                    del self._ahead[target]
+                    self._keys.pop(target, None)
+
+            for target in targets:
+                if target not in self._ahead:
+                    self._ahead[target] = _submit(self._readahead, target)
+
+    def _readahead(self, index):
+        key = self.key(index)
+        with self._lock:
+            if index in self._ahead:  # otherwise it's no longer wanted
+                self._keys[index] = key
+        if not self.frames.cached(key):
+            frame = self.load(index, key)
+            if isinstance(frame, np.memmap):
+                frame.max()  # page it in now, rather than when it is displayed
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getattr__(self, name):  # shape, dtype, ndim, ... of the underlying array
+        if name == 'array':
+            raise AttributeError(name)
+        return getattr(self.array, name)
+
+
+_prefetched = weakref.WeakKeyDictionary()  # header -> {field: PrefetchedArray}
+_prefetched_lock = threading.Lock()
+
+
+def prefetched(header, field=None, **kwargs):
+    """
+    The (shared) PrefetchedArray of a header's field.
+    """
+    with _prefetched_lock:
+        arrays = _prefetched.setdefault(header, {})
+        if field not in arrays:
+            arrays[field] = PrefetchedArray(header.meta_array(field), paths=header.startdoc.get('paths'), **kwargs)
+        return arrays[field]
@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, InOut
 from pyFAI import AzimuthalIntegrator
 import numpy as np
+from xicam.SAXS.processing import engines
 
 
 class DetectorMaskPlugin(ProcessingPlugin):
@@ -13,9 +14,17 @@ class DetectorMaskPlugin(ProcessingPlugin):
 
     def evaluate(self):
         if self.ai.value and self.ai.value.detector:
-            mask = self.ai.value.detector.calc_mask()
-            if mask is None: mask = np.zeros(self.ai.value.detector.shape)
-            self.mask.value = np.logical_or(self.mask.value, mask)
+            self.mask.value = np.logical_or(self.mask.value, self.component())
+
+    def componentkey(self):
+        # Only the detector matters; the mask doesn't change when the geometry is recalibrated
+        if self.ai.value and self.ai.value.detector:
+            return ('detector',) + engines.detector_key(self.ai.value.detector)
+
+    def component(self):
+        mask = self.ai.value.detector.calc_mask()
+        if mask is None: mask = np.zeros(self.ai.value.detector.shape, dtype=np.bool_)
+        return mask
 
     def getCategory() -> str:
         return "Masks"
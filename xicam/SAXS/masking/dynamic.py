@@ -0,0 +1,313 @@
+"""
+Per-frame evaluation of data-dependent mask stages over series.
+
+A masking workflow is evaluated on one frame; its thresholds and zingers then stand for every frame of a series. A
+DynamicMask instead evaluates the data-dependent stages of the workflow's mask graph (see masking.graph) on each chunk
+of frames inside the series reducers. The stages before the first data-dependent one are evaluated once, into the
+static mask; each chunk's masks start as a copy of the static mask in a reused buffer, and the thresholds (and their
+morphological opening) are applied to the whole chunk at once. The reducers integrate with the static mask, and a
+DynamicMask yields only the pixels each frame masks in addition to it (usually few).
+
+DynamicMasks pickle as their packed static mask and the stages' parameters, so they are cheap to send to workers.
+"""
+
+import weakref
+
+import numpy as np
+from scipy import ndimage
+
+from xicam.SAXS.masking import graph, temporal
+from xicam.SAXS.masking.packedmask import PackedMask
+
+
+def disk(radius):
+    """
+    A disk-shaped structuring element, as used by the threshold and grow masks.
+    """
+    y, x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    return x ** 2 + y ** 2 <= radius ** 2
+
+
+class Threshold(object):
+    """
+    Mask pixels outside [minimum, maximum], in clusters which survive an opening with a disk of radius neighborhood.
+    """
+
+    dynamic = True
+
+    def __init__(self, minimum, maximum, neighborhood):
+        self.minimum, self.maximum, self.neighborhood = minimum, maximum, neighborhood
+
+    @property
+    def key(self):
+        return 'threshold', self.minimum, self.maximum, self.neighborhood
+
+    def apply(self, frames, mask, scratch):
+        np.less(frames, self.minimum, out=scratch)
+        scratch |= frames > self.maximum
+
+        # Only pixels which aren't masked yet can change the mask. The opening is exact within a margin of twice the
+        # kernel's radius, so it is only computed around them (often nowhere, or over a few hot spots), and for the
+        # whole chunk at once; the kernel is flat along the frame axis, so frames aren't mixed.
+        new = scratch > mask
+        rows, columns = np.flatnonzero(new.any(axis=(0, 2))), np.flatnonzero(new.any(axis=(0, 1)))
+        if not len(rows): return
+        margin = 2 * self.neighborhood
+        region = (slice(None),
+                  slice(max(rows[0] - margin, 0), rows[-1] + margin + 1),
+                  slice(max(columns[0] - margin, 0), columns[-1] + margin + 1))
+        mask[region] |= ndimage.binary_opening(scratch[region], disk(self.neighborhood)[np.newaxis])
+
+
+class Grow(object):
+    """
+    Dilate the mask with a disk of radius size.
+    """
+
+    dynamic = False
+
+    def __init__(self, size):
+        self.size = size
+
+    @property
+    def key(self):
+        return 'grow', self.size
+
+    def apply(self, frames, mask, scratch):
+        ndimage.binary_dilation(mask, disk(self.size)[(np.newaxis,) * (mask.ndim - 2)], output=scratch)
+        mask[...] = scratch
+
+
+class Zinger(object):
+    """
+    Mask cosmic rays (zingers) detected in each frame, given the mask so far.
+    """
+
+    dynamic = True
+
+    @property
+    def key(self):
+        return 'zinger',
+
+    def apply(self, frames, mask, scratch):
+        import astroscrappy
+        for frame, framemask in zip(frames, mask):
+            framemask |= astroscrappy.detect_cosmics(np.asarray(frame, dtype=np.float32), framemask)[0]
+
+
+class TemporalZinger(object):
+    """
+    Mask zingers against the neighbouring frames (see masking.temporal); evaluated on a chunk of a series (see
+    DynamicMask.chunk), its windows extend past the chunk. A single frame has no neighbours to tell zingers by.
+    """
+
+    dynamic = True
+
+    def __init__(self, window, sigma, floor):
+        self.window, self.sigma, self.floor = window, sigma, floor
+
+    @property
+    def key(self):
+        return 'temporal zinger', self.window, self.sigma, self.floor
+
+    @property
+    def context(self):
+        return self.window // 2  # also for even windows, which are rounded up
+
+    def extent(self, start, stop, count):
+        return temporal.extent(self.window, start, stop, count)
+
+    def apply(self, frames, mask, scratch):
+        mask |= temporal.zingers(frames, self.window, self.sigma, self.floor, out=scratch)
+
+
+class DynamicMask(object):
+    """
+    The masks of chunks of frames: a static mask, and stages applied to each chunk.
+
+    Parameters
+    ----------
+    static: PackedMask
+        Mask shared by all frames (or None)
+    stages: list
+        Stages (i.e. Threshold, Grow, Zinger, TemporalZinger) applied in order to each chunk, after the static mask
+
+    """
+
+    def __init__(self, static, stages):
+        self.static = static
+        self.stages = list(stages)
+        self._buffers = None
+        self._last = None  # (weakref to the frames, result) of the last call writing to the reused buffer
+
+    @property
+    def key(self):
+        """
+        Fingerprint of the static mask and the stages.
+        """
+        return (self.static.key if self.static is not None else None,) + tuple(stage.key for stage in self.stages)
+
+    @property
+    def context(self):
+        """
+        The most neighbouring frames on either side of a frame which its masks depend on (i.e. temporal windows).
+        """
+        return max([getattr(stage, 'context', 0) for stage in self.stages] + [0])
+
+    def extent(self, start, stop, count):
+        """
+        The frames of a series of count frames which the masks of its frames start:stop depend on.
+        """
+        extents = [stage.extent(start, stop, count) for stage in self.stages if hasattr(stage, 'extent')]
+        return min([start] + [lo for lo, _ in extents]), max([stop] + [hi for _, hi in extents])
+
+    def chunk(self, data, start, stop, frames=None, out=None):
+        """
+        The masks of the frames start:stop of a series data (already read, if frames is given), as if the whole series
+        were evaluated: the neighbouring frames they depend on (see extent) are read and evaluated with them.
+        """
+        if frames is None:
+            frames = np.stack([data[i] for i in range(start, stop)])
+        lo, hi = self.extent(start, stop, len(data))
+        if (lo, hi) == (start, stop):
+            return self(frames, out=out)
+        frames = np.stack([data[i] for i in range(lo, start)] + list(frames) + [data[i] for i in range(stop, hi)])
+        return self(frames, out=out, context=(start - lo, hi - stop))
+
+    def __call__(self, frames, out=None, context=(0, 0)):
+        """
+        The pixels of a frame or (N, rows, columns) stack of frames masked in addition to the static mask (1 is masked);
+        written to out, or to a buffer reused by the next call. Calling again with the same (read-only) frames returns
+        that buffer without evaluating the stages again, so the processes of a workflow can each evaluate it.
+
+        context gives the numbers of leading and trailing frames of the stack which are only evaluated as neighbours of
+        the others (see chunk); their masks aren't returned.
+        """
+        if out is None and self._last is not None and self._last[0]() is frames and not frames.flags.writeable and \
+                self._last[2] == context:
+            return self._last[1]
+        self._last = None
+        source = frames
+        frames = np.asarray(frames)
+        stacked = frames.ndim == 3
+        if not stacked:
+            frames = frames[np.newaxis]
+        lead, trail = context
+
+        if self._buffers is None or self._buffers[0].shape[1:] != frames.shape[1:] or \
+                len(self._buffers[0]) < len(frames):
+            self._buffers = (np.empty(frames.shape, dtype=np.bool_), np.empty(frames.shape, dtype=np.bool_))
+        mask, scratch = (buffer[:len(frames)] for buffer in self._buffers)
+        if out is not None and not stacked:
+            out = out[np.newaxis]
+
+        if self.static is not None:
+            np.copyto(mask, self.static.array)  # broadcast over the chunk; no new allocation
+        else:
+            mask.fill(False)
+        for stage in self.stages:
+            stage.apply(frames, mask, scratch)
+
+        # Written to out directly, unless there is context to drop; otherwise to scratch (no longer needed by the
+        # stages), which is returned, or copied to out
+        direct = out is not None and not (lead or trail)
+        target = out if direct else scratch
+        if self.static is not None:
+            np.greater(mask, self.static.array, out=target)
+        else:
+            np.copyto(target, mask)
+        if not direct:
+            target = target[lead:len(target) - trail]
+            if out is None:
+                result = target if stacked else target[0]
+                if isinstance(source, np.ndarray):
+                    self._last = weakref.ref(source), result, context
+                return result
+            np.copyto(out, target)
+        return out if stacked else out[0]
+
+    def __getstate__(self):
+        return dict(static=self.static, stages=self.stages)
+
+    def __setstate__(self, state):
+        self.__init__(state['static'], state['stages'])
+
+
+def evaluate(dynamic_mask, frames):
+    """
+    The additional masks of a frame or stack of frames, given a DynamicMask (evaluated on them), an array of masks (as
+    is) or None.
+    """
+    if isinstance(dynamic_mask, DynamicMask):
+        return dynamic_mask(frames)
+    return dynamic_mask
+
+
+def evaluable(maskgraph):
+    """
+    Whether a compiled mask graph can be evaluated per frame: whether all of its processes which depend on the frame,
+    and its transforms, provide stage().
+    """
+    return all(hasattr(process, 'stage') for node in maskgraph
+               for process in (node.dynamic if isinstance(node, graph.Segment) else [node]))
+
+
+def compile(maskgraph, cache=None):
+    """
+    The DynamicMask of a compiled mask graph, or None if none of its processes depend on the frame (in which case the
+    graph's result applies to every frame).
+
+    Processes which depend on the frame provide stage(), returning their Threshold or Zinger; transforms provide it too
+    (i.e. Grow). The processes before the first frame-dependent one are evaluated once, into the static mask. Raises
+    TypeError if the graph can't be evaluated per frame (see evaluable).
+    """
+    if not evaluable(maskgraph):
+        raise TypeError('the mask graph has processes which can\'t be evaluated per frame')
+    nodes = []
+    for node in maskgraph:
+        if isinstance(node, graph.Segment):
+            union = graph.static_union(node.static, cache)  # the static components of a segment are applied first
+            if union is not None:
+                nodes.append(union)
+            nodes.extend(process.stage() for process in node.dynamic)
+        else:
+            nodes.append(node.stage())
+
+    if not any(getattr(node, 'dynamic', False) for node in nodes):
+        return None
+
+    # Fold everything before the first frame-dependent stage into the static mask
+    static, stages = None, []
+    for node in nodes:
+        if stages or getattr(node, 'dynamic', False):
+            stages.append(node if not isinstance(node, PackedMask) else _Union(node))
+        elif isinstance(node, PackedMask):
+            static = node if static is None else static | node
+        elif static is not None:  # a transform of the static mask so far; there's nothing to transform otherwise
+            static = (cache or graph.components).get(('transform', static.key, node.key),
+                                                     lambda static=static, node=node: _transformed(static, node))
+    return DynamicMask(static, stages)
+
+
+def _transformed(static, stage):
+    mask = static.array[np.newaxis].copy()
+    stage.apply(None, mask, np.empty_like(mask))
+    return mask[0]
+
+
+class _Union(object):
+    """
+    A static component applied after a frame-dependent stage.
+    """
+
+    dynamic = False
+
+    def __init__(self, mask):
+        self.mask = mask
+
+    @property
+    def key(self):
+        return ('union',) + self.mask.key
+
+    def apply(self, frames, mask, scratch):
+        mask |= self.mask.array
@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, InOut
 from pyFAI import AzimuthalIntegrator
 import fabio
+import os
 import numpy as np
 
 
@@ -18,13 +19,24 @@ class FileMask(ProcessingPlugin):
         if not self.path.value:
             return
 
+        mask = self.component()
+
+        if self.mask.value is None: self.mask.value = np.zeros(self.ai.value.detector.shape, dtype=np.bool_)
+        self.mask.value = np.logical_or(self.mask.value, mask)
+
+    def componentkey(self):
+        # The file is only read again if it was modified
+        if self.path.value:
+            stat = os.stat(self.path.value)
+            return ('file', os.path.abspath(self.path.value), stat.st_size, stat.st_mtime_ns,
+                    tuple(self.ai.value.detector.shape))
+
+    def component(self):
         mask = fabio.open(self.path.value).data.astype(np.bool_)
 
         if not mask.shape == self.ai.value.detector.shape:
             raise IndexError('Mask file does not match detector shape.')
-
-        if self.mask.value is None: self.mask.value = np.zeros(self.ai.value.detector.shape).astype(np.bool_)
-        self.mask.value = np.logical_or(self.mask.value, mask)
+        return mask
 
     def getCategory() -> str:
         return "Masks"
@@ -0,0 +1,138 @@
+"""
+Fused, cached evaluation of masking workflows.
+
+A masking workflow's processes are compiled into a mask graph instead of being evaluated one after another. Masks
+compose by union, so each process is one of:
+
+- a static component (detector gaps, mask files, polygons): it has componentkey(), a key of everything its mask depends
+  on, and component(), which computes that mask. Each is computed once per key and cached packed, and the union of the
+  static components between two transforms is cached by their keys;
+- a data-dependent component (thresholds): it has only component(), which is computed on every evaluation;
+- a transform (growing the mask, detecting zingers against it): any other process; it is evaluated as usual, with the
+  mask accumulated so far as its input.
+
+The components are ORed in place into a single buffer, allocated once per evaluation. So recalibrating (i.e. moving the
+beam center) doesn't re-read mask files or recompute the detector's gaps; only the thresholds are recomputed.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import reduce
+
+import numpy as np
+
+from xicam.SAXS.masking.packedmask import PackedMask
+
+
+class ComponentCache(object):
+    """
+    A bounded, thread-safe LRU of packed mask components (and their unions), keyed by their component keys.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._components = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """
+        Get the component stored under key, or compute it with factory() and store it packed.
+        """
+        with self._lock:
+            component = self._components.get(key)
+            if component is not None:
+                self._components.move_to_end(key)
+                self.hits += 1
+                return component
+            self.misses += 1
+
+        component = factory()
+        if not isinstance(component, PackedMask):
+            component = PackedMask(component)
+
+        with self._lock:
+            self._components[key] = component
+            while len(self._components) > self.maxsize:
+                self._components.popitem(last=False)
+        return component
+
+    def clear(self):
+        with self._lock:
+            self._components.clear()
+
+
+components = ComponentCache()
+
+
+class Segment(object):
+    """
+    The components between two transforms; their union doesn't depend on their order.
+    """
+
+    def __init__(self):
+        self.static = []
+        self.dynamic = []
+
+
+def compile(processes):
+    """
+    Compile processes into a mask graph: a list of Segments and transforms, in the order they apply.
+    """
+    graph = []
+    for process in processes:
+        if not hasattr(process, 'component'):
+            graph.append(process)
+            continue
+        if not graph or not isinstance(graph[-1], Segment):
+            graph.append(Segment())
+        (graph[-1].static if hasattr(process, 'componentkey') else graph[-1].dynamic).append(process)
+    return graph
+
+
+def static_union(processes, cache=None):
+    """
+    The union of the static components of processes, as a PackedMask; None if none of them contribute.
+    """
+    cache = cache or components
+    keyed = [(key, process) for key, process in ((process.componentkey(), process) for process in processes)
+             if key is not None]
+    if not keyed:
+        return None
+
+    def union():
+        return reduce(lambda a, b: a | b, (cache.get(key, process.component) for key, process in keyed))
+
+    if len(keyed) == 1:
+        return union()
+    return cache.get(('union',) + tuple(key for key, _ in keyed), union)
+
+
+def evaluate(graph, mask=None, cache=None):
+    """
+    Evaluate a compiled mask graph, starting from mask (if any); returns the bool mask, or None if nothing was masked.
+    """
+    buffer = None if mask is None else np.array(mask, dtype=np.bool_)
+    for node in graph:
+        if isinstance(node, Segment):
+            union = static_union(node.static, cache)
+            if union is not None:
+                if buffer is None:
+                    buffer = np.array(union.array)
+                else:
+                    np.logical_or(buffer, union.array, out=buffer)
+            for process in node.dynamic:
+                component = process.component()
+                if component is None: continue
+                if buffer is None:
+                    buffer = np.array(component, dtype=np.bool_)
+                else:
+                    np.logical_or(buffer, component, out=buffer)
+        else:
+            node.mask.value = buffer
+            node.evaluate()
+            buffer = node.mask.value
+            if buffer is not None and buffer.dtype != np.bool_:
+                buffer = buffer.astype(np.bool_)
+    return buffer
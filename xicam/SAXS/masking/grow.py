@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, InOut
 from scipy.ndimage import morphology
 import numpy as np
+from xicam.SAXS.masking import dynamic
 
 
 class GrowMask(ProcessingPlugin):
@@ -14,5 +15,8 @@ class GrowMask(ProcessingPlugin):
         kernel = x ** 2 + y ** 2 <= self.size.value ** 2
         morphology.binary_dilation(self.mask.value, kernel, output=self.mask.value)  # write-back to mask
 
+    def stage(self):
+        return dynamic.Grow(self.size.value)
+
     def getCategory() -> str:
         return "Masks"
@@ -0,0 +1,125 @@
+"""
+Compact, read-only masks shared by every frame, process and worker of a reduction.
+
+A PackedMask stores its pixels with np.packbits (1 bit per pixel), which is also all that is pickled when it is sent to
+worker processes. Its canonical form is a read-only bool array, unpacked once on first use and shared by all consumers.
+Each mask carries a process-wide version, so in-process caches can tell whether the mask changed by comparing one int,
+and a content key (shape and CRC of the packed bits), which stays valid across sessions.
+"""
+
+import itertools
+import zlib
+
+import numpy as np
+
+_versions = itertools.count(1)
+
+
+class PackedMask(object):
+    """
+    An immutable boolean mask (True is masked), stored as packed bits.
+
+    Parameters
+    ----------
+    mask: np.ndarray
+        Mask of any dtype; nonzero pixels are masked
+
+    """
+
+    dtype = np.dtype(np.bool_)
+
+    def __init__(self, mask):
+        mask = np.asarray(mask)
+        self.shape = mask.shape
+        self.bits = np.packbits(mask.astype(np.bool_, copy=False), axis=None)
+        self.bits.flags.writeable = False
+        self.version = next(_versions)
+        self._array = None
+        self._key = None
+
+    @classmethod
+    def frombits(cls, bits, shape):
+        """
+        The mask of shape stored in bits (as returned by np.packbits).
+        """
+        mask = cls.__new__(cls)
+        mask.shape = tuple(shape)
+        mask.bits = np.array(bits, dtype=np.uint8)
+        mask.bits.flags.writeable = False
+        mask.version = next(_versions)
+        mask._array = mask._key = None
+        return mask
+
+    @property
+    def array(self):
+        """
+        The mask as a read-only bool array.
+        """
+        if self._array is None:
+            array = np.unpackbits(self.bits, count=int(np.prod(self.shape))).reshape(self.shape).view(np.bool_)
+            array.flags.writeable = False
+            self._array = array
+        return self._array
+
+    @property
+    def key(self):
+        """
+        Fingerprint of the mask's contents.
+        """
+        if self._key is None:
+            self._key = self.shape, 'packed', zlib.crc32(self.bits)
+        return self._key
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __array__(self, dtype=None, copy=None):
+        # The unpacked array is shared and read-only; copies (i.e. np.array(mask)) must be writable
+        array = self.array
+        if dtype is not None and np.dtype(dtype) != array.dtype:
+            if copy is False:
+                raise ValueError('A PackedMask can\'t be converted to {} without a copy'.format(np.dtype(dtype)))
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __or__(self, other):
+        if isinstance(other, PackedMask) and other.shape == self.shape:
+            return PackedMask.frombits(np.bitwise_or(self.bits, other.bits), self.shape)
+        return PackedMask(np.logical_or(self.array, other))
+
+    __ror__ = __or__
+
+    def __getstate__(self):  # only the bits are sent to workers
+        return dict(shape=self.shape, bits=self.bits, version=self.version)
+
+    def __setstate__(self, state):
+        self.shape, self.bits, self.version = state['shape'], state['bits'], state['version']
+        self.bits.flags.writeable = False
+        self._array = self._key = None
+
+    def __repr__(self):
+        return 'PackedMask(shape={}, version={})'.format(self.shape, self.version)
+
+
+def pack(mask):
+    """
+    The mask as a PackedMask; None and PackedMasks are returned as is.
+    """
+    if mask is None or isinstance(mask, PackedMask):
+        return mask
+    return PackedMask(mask)
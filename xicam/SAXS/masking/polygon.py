@@ -4,7 +4,7 @@ import numpy as np
 from pyqtgraph import ROI
 from pyqtgraph.parametertree import parameterTypes
 from typing import List, Tuple
-from matplotlib.path import Path
+from xicam.SAXS.masking.rasterize import fill_polygons
 
 
 class PolygonMask(ProcessingPlugin):
@@ -18,20 +18,18 @@ class PolygonMask(ProcessingPlugin):
 
     def evaluate(self):
         if self.polygon.value is not None:
-            # create path
-            path = Path(np.vstack([self.polygon.value, self.polygon.value[-1]]),
-                        [Path.MOVETO] + [Path.LINETO] * (len(self.polygon.value) - 1) + [Path.CLOSEPOLY])
-
-            # create a grid
-            ny, nx = self.ai.value.detector.shape
-            x = np.linspace(0, nx, nx)
-            y = np.linspace(0, ny, ny)
-            xgrid, ygrid = np.meshgrid(x, y)
-            pixel_coordinates = np.c_[xgrid.ravel(), ygrid.ravel()]
-
-            # find points within path
-            self.mask.value = np.logical_or(self.mask.value,
-                                            np.flipud(path.contains_points(pixel_coordinates).reshape(ny, nx)))
+            # fill a copy; the incoming mask may be an upstream process's (memoized) output
+            shape = self.ai.value.detector.shape
+            mask = np.zeros(shape, dtype=np.bool_) if self.mask.value is None else np.array(self.mask.value, dtype=np.bool_)
+            self.mask.value = fill_polygons([self.polygon.value], out=mask, flipud=True)
+
+    def componentkey(self):
+        if self.polygon.value is not None:
+            return ('polygon', tuple(self.ai.value.detector.shape),
+                    np.asarray(self.polygon.value, dtype=np.float64).tobytes())
+
+    def component(self):
+        return fill_polygons([self.polygon.value], shape=self.ai.value.detector.shape, flipud=True)
 
     @property
     def parameter(self):
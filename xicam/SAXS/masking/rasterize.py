@@ -0,0 +1,80 @@
+"""
+Scanline rasterization of polygons into boolean masks.
+
+Only the rows of each polygon's bounding box are visited. For each row, the crossings of the row's pixel centers with
+the polygons' (non-horizontal) edges are found at once, and the spans between pairs of crossings are filled; so the cost
+scales with the polygons' extent rather than the detector's, and no pixel coordinate grid is ever built.
+"""
+
+import numpy as np
+
+
+def fill_polygons(polygons, shape=None, out=None, flipud=False):
+    """
+    Set the pixels inside any of polygons to True.
+
+    A pixel is inside a polygon if its center is, by the even-odd rule; pixel (row, column) has its center at
+    (x, y) = (column + .5, row + .5).
+
+    Parameters
+    ----------
+    polygons: list
+        Polygons, each a sequence of (x, y) vertices; the last vertex connects back to the first
+    shape: tuple
+        Shape of the mask to create, if out isn't given
+    out: np.ndarray
+        Boolean mask to fill in place
+    flipud: bool
+        Whether y counts rows from the bottom of out (i.e. as drawn over a displayed image)
+
+    Returns
+    -------
+    np.ndarray
+        out, or the new mask
+
+    """
+    if out is None:
+        out = np.zeros(shape, dtype=np.bool_)
+    target = out[::-1] if flipud else out
+    height, width = target.shape
+
+    # Edge table: (x0, y0, x1, y1) of each non-horizontal edge, lower end first, and the polygon it belongs to
+    edges, owners = [], []
+    for owner, polygon in enumerate(polygons):
+        vertices = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        if len(vertices) < 3: continue
+        start, end = vertices, np.roll(vertices, -1, axis=0)
+        slanted = start[:, 1] != end[:, 1]
+        start, end = start[slanted], end[slanted]
+        flip = start[:, 1] > end[:, 1]
+        start[flip], end[flip] = end[flip], start[flip].copy()
+        edges.append(np.hstack([start, end]))
+        owners.append(np.full(len(start), owner))
+    if not edges:
+        return out
+    x0, y0, x1, y1 = np.vstack(edges).T
+    owners = np.concatenate(owners)
+    slope = (x1 - x0) / (y1 - y0)
+
+    # Rows whose centers lie within the polygons' vertical extent
+    first = max(int(np.ceil(y0.min() - .5)), 0)
+    last = min(int(np.floor(y1.max() - .5)), height - 1)
+
+    order = np.argsort(y0, kind='stable')  # edges become active in this order
+    x0, y0, y1, slope, owners = x0[order], y0[order], y1[order], slope[order], owners[order]
+    for row in range(first, last + 1):
+        y = row + .5
+        candidates = slice(0, np.searchsorted(y0, y, side='right'))  # edges starting at or below this row
+        active = y1[candidates] > y  # half-open, so vertices aren't counted twice
+        if not active.any(): continue
+        xs = (x0[candidates] + (y - y0[candidates]) * slope[candidates])[active]
+        ids = owners[candidates][active]
+        crossings = np.lexsort((xs, ids))  # by polygon, then left to right; each polygon crosses an even number of times
+        xs = xs[crossings]
+        starts = np.clip(np.ceil(xs[0::2] - .5), 0, width).astype(int)
+        stops = np.clip(np.ceil(xs[1::2] - .5), 0, width).astype(int)
+        line = target[row]
+        for a, b in zip(starts, stops):
+            if b > a:
+                line[a:b] = True
+    return out
@@ -0,0 +1,129 @@
+"""
+Zinger rejection along the frame axis of a series.
+
+A zinger (a cosmic ray, or a hot pixel's spike) lights a pixel in a single frame, so it stands out against the same
+pixel in the neighbouring frames far more than against its neighbours in the frame. Each pixel of each frame is compared
+to the median of a window of neighbouring frames (centered, but shifted to stay within the series), and flagged if it
+exceeds it by more than sigma standard deviations, estimated from the window's median absolute deviation (MAD). A few
+frames' MAD often underestimates the counting noise, so the estimate is at least the median's Poisson noise.
+
+Windows are small, so their medians are computed with sorting networks of elementwise minima and maxima, over chunks of
+pixels of every frame at once; no per-pixel loop or per-frame detection is involved.
+"""
+
+import numpy as np
+
+MAD_SIGMA = 1.4826  # the standard deviation of normally distributed values, relative to their MAD
+CHUNK_ELEMENTS = 2 ** 20  # window values held per chunk of pixels
+
+
+def zingers(frames, window=5, sigma=5., floor=1., out=None):
+    """
+    Mask the zingers of a (N, rows, columns) stack of frames (1 is masked).
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        Stack of frames
+    window: int
+        Number of frames in each pixel's window (rounded up to an odd number; reduced to fit shorter stacks)
+    sigma: float
+        Rejection threshold, in standard deviations above the window's median
+    floor: float
+        Least standard deviation (i.e. for pixels with few counts)
+    out: np.ndarray
+        Array (same shape as frames) the mask is written to
+
+    """
+    if out is None:
+        out = np.empty(np.shape(frames), dtype=np.bool_)
+    _filter(frames, window, sigma, floor, out, None)
+    return out
+
+
+def repair(frames, window=5, sigma=5., floor=1., out=None):
+    """
+    The frames with their zingers (see zingers) replaced by the median of their window, and the zingers' mask; out may
+    be frames, to repair them in place.
+    """
+    if out is None:
+        out = np.array(frames, dtype=np.result_type(np.asarray(frames).dtype, np.float32))
+    mask = np.empty(np.shape(frames), dtype=np.bool_)
+    _filter(frames, window, sigma, floor, mask, out)
+    return out, mask
+
+
+def window_size(window, count):
+    """
+    The number of frames in the windows of a stack of count frames: window, rounded up to an odd number (so that the
+    median is a frame's value), and reduced to fit the stack. Below 3, zingers can't be told.
+    """
+    window += 1 - window % 2
+    return min(window, count if count % 2 else count - 1)
+
+
+def extent(window, start, stop, count):
+    """
+    The frames of a stack of count frames spanned by the windows of its frames start:stop; masking those frames alone
+    gives them the same windows as masking the whole stack.
+    """
+    window = window_size(window, count)
+    if window < 3:
+        return start, stop
+    return (int(np.clip(start - window // 2, 0, count - window)),
+            int(np.clip(stop - 1 - window // 2, 0, count - window)) + window)
+
+
+def _filter(frames, window, sigma, floor, mask, repaired):
+    frames = np.asarray(frames)
+    count = len(frames)
+    window = window_size(window, count)
+    if window < 3:  # no majority of frames to tell a zinger by
+        mask[...] = False
+        return
+
+    flat = frames.reshape(count, -1)
+    flatmask = mask.reshape(count, -1)
+    flatrepaired = repaired.reshape(count, -1) if repaired is not None else None
+    starts = np.clip(np.arange(count) - window // 2, 0, count - window)
+    chunk = max(CHUNK_ELEMENTS // (window * count), 1)
+
+    # window rows of values, and a spare row, swapped with them by the sorting network; then the median, the deviation
+    buffers = [np.empty((count, chunk), dtype=np.float32) for _ in range(window + 3)]
+    for start in range(0, flat.shape[1], chunk):
+        pixels = slice(start, min(start + chunk, flat.shape[1]))
+        width = pixels.stop - pixels.start
+        block = flat[:, pixels]
+        rows = [buffer[:, :width] for buffer in buffers]
+        median, deviation = rows.pop(), rows.pop()
+        for offset, row in enumerate(rows[:window]):
+            np.copyto(row, block[starts + offset], casting='unsafe')  # each frame's window, one offset at a time
+
+        np.copyto(median, _median(rows))
+        for row in rows[:window]:  # the absolute deviations, in place of the sorted values
+            np.subtract(row, median, out=row)
+            np.abs(row, out=row)
+        np.multiply(_median(rows), MAD_SIGMA, out=deviation)
+        np.maximum(deviation, np.sqrt(np.maximum(median, floor ** 2, out=rows[window]), out=rows[window]),
+                   out=deviation)
+        np.multiply(deviation, sigma, out=deviation)
+
+        excess = rows[window]
+        np.subtract(block, median, out=excess, casting='unsafe')
+        np.greater(excess, deviation, out=flatmask[:, pixels])
+        if flatrepaired is not None:
+            np.copyto(flatrepaired[:, pixels], median, where=flatmask[:, pixels], casting='unsafe')
+
+
+def _median(rows):
+    """
+    Sort rows[:-1] (an odd number of equal arrays) elementwise in place, with an odd-even transposition sorting network,
+    and return the middle one, i.e. the median. rows[-1] is spare; arrays are swapped within rows, not copied.
+    """
+    count = len(rows) - 1
+    for step in range(count):
+        for i in range(step % 2, count - 1, 2):
+            np.minimum(rows[i], rows[i + 1], out=rows[-1])
+            np.maximum(rows[i], rows[i + 1], out=rows[i + 1])
+            rows[i], rows[-1] = rows[-1], rows[i]
+    return rows[count // 2]
@@ -1,6 +1,7 @@
 import numpy as np
 from xicam.plugins import ProcessingPlugin, Input, InOut
 from scipy.ndimage import morphology
+from xicam.SAXS.masking import dynamic
 
 
 class ThresholdMaskPlugin(ProcessingPlugin):
@@ -22,6 +23,12 @@ class ThresholdMaskPlugin(ProcessingPlugin):
                  type=np.ndarray)
 
     def evaluate(self):
+        mask = self.component()
+        if self.mask.value is not None:
+            mask = np.logical_or(mask, self.mask.value)  # .astype(np.int, copy=False)
+        self.mask.value = mask
+
+    def component(self):
         mask = np.logical_or(self.data.value < self.minimum.value, self.data.value > self.maximum.value)
 
         y, x = np.ogrid[-self.neighborhood.value:self.neighborhood.value + 1,
@@ -29,9 +36,10 @@ class ThresholdMaskPlugin(ProcessingPlugin):
         kernel = x ** 2 + y ** 2 <= self.neighborhood.value ** 2
 
         morphology.binary_opening(mask, kernel, output=mask)  # write-back to mask
-        if self.mask.value is not None:
-            mask = np.logical_or(mask, self.mask.value)  # .astype(np.int, copy=False)
-        self.mask.value = mask
+        return mask
+
+    def stage(self):
+        return dynamic.Threshold(self.minimum.value, self.maximum.value, self.neighborhood.value)
 
     def getCategory() -> str:
         return "Masks"
@@ -1,8 +1,14 @@
 from xicam.core.execution.workflow import Workflow
+from xicam.SAXS.masking import dynamic, graph
 from .detector import DetectorMaskPlugin
 
 
 class MaskingWorkflow(Workflow):
+    """
+    A Workflow whose processes are evaluated as one fused mask graph (see masking.graph), rather than one at a time;
+    static mask components are cached by their own keys, so only data-dependent components are recomputed.
+    """
+
     def __init__(self):
         super(MaskingWorkflow, self).__init__('Masking')
 
@@ -10,3 +16,28 @@ class MaskingWorkflow(Workflow):
 
         self.processes = [detectormask]
         self.autoConnectAll()
+
+    def convertGraph(self):
+        # A single task evaluates the whole mask graph; its result is the last process's outputs, as when the
+        # processes are evaluated one at a time
+        processes = self.processes
+        maskgraph = graph.compile(processes)
+        first = processes[0].inputs.get('mask')
+        initial = first.value if first is not None and not first.map_inputs else None
+
+        def evaluate(*args):
+            outputs = processes[-1].outputs
+            outputs['mask'].value = graph.evaluate(maskgraph, mask=initial)
+            return outputs
+
+        return {'mask': (evaluate,)}, ['mask']
+
+    def dynamic_mask(self):
+        """
+        The DynamicMask evaluating this workflow's data-dependent processes on each frame, with the parameters of the
+        last execution; None if none of them depend on the frame, or one can't be evaluated per frame.
+        """
+        maskgraph = graph.compile(self.processes)
+        if not dynamic.evaluable(maskgraph):  # i.e. a third-party process; the last mask then stands for every frame
+            return None
+        return dynamic.compile(maskgraph)
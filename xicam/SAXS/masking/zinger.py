@@ -1,17 +1,44 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, InOut
 import numpy as np
 import astroscrappy
+from xicam.SAXS.masking import dynamic, temporal
 
 
 class ZingerMaskPlugin(ProcessingPlugin):
-    data = Input(description='Frame image data',
+    data = Input(description='Frame image data, or a (N, rows, columns) stack of frames',
                  type=np.ndarray)
+    method = Input(description='Zinger detection method: \'cosmic\' (L.A.Cosmic, on each frame) or \'temporal\' '
+                               '(against the median of the neighbouring frames; for stacks of frames)',
+                   type=str, default='cosmic')
+    window = Input(description='Number of frames compared to each frame (temporal method; rounded up to an odd number)',
+                   type=int, default=5)
+    sigma = Input(description='Rejection threshold, in standard deviations above the neighbouring frames\' median '
+                              '(temporal method)',
+                  type=float, default=5.)
+    floor = Input(description='Least standard deviation of a pixel (temporal method)',
+                  type=float, default=1.)
     mask = InOut(description='Mask array (1 is masked).',
                  type=np.ndarray)
+    repaired = Output(description='Frame image data with the zingers replaced by the neighbouring frames\' median '
+                                  '(temporal method)',
+                      type=np.ndarray)
 
     def evaluate(self):
+        if self.method.value == 'temporal':
+            frames = self.data.value if self.data.value.ndim == 3 else self.data.value[np.newaxis]
+            repaired, zingers = temporal.repair(frames, self.window.value, self.sigma.value, self.floor.value)
+            self.repaired.value = repaired if self.data.value.ndim == 3 else repaired[0]
+            zingers = zingers if self.data.value.ndim == 3 else zingers[0]
+            self.mask.value = zingers if self.mask.value is None else np.logical_or(self.mask.value, zingers)
+            return
+
         self.mask.value = np.logical_or(self.mask.value,
                                         astroscrappy.detect_cosmics(self.data.value, self.mask.value)[0])
 
+    def stage(self):
+        if self.method.value == 'temporal':
+            return dynamic.TemporalZinger(self.window.value, self.sigma.value, self.floor.value)
+        return dynamic.Zinger()
+
     def getCategory() -> str:
         return "Masks"
@@ -34,11 +34,14 @@ class CoM(ProcessingPlugin):
     y_cen = InOut(description='Y pixel index, center of mass', type=float)
 
     def evaluate(self):
-        data = np.flipud(self.data.value)
-        mask = np.flipud(self.mask.value)
-        data = data * np.logical_not(mask)
-        (self.y_cen.value, self.x_cen.value) = ndimage.measurements.center_of_mass(
-            data[self.y_min.value:self.y_max.value,
-            self.x_min.value:self.x_max.value])
+        # Rows are counted from the bottom; slice the region out of the unflipped frame instead of flipping a copy of it
+        data = self.data.value
+        height = data.shape[0]
+        rows = slice(max(height - self.y_max.value, 0), max(height - self.y_min.value, 0))
+        columns = slice(self.x_min.value, self.x_max.value)
+        region = data[rows, columns]
+        if self.mask.value is not None:
+            region = region * np.logical_not(self.mask.value[rows, columns])
+        (y_cen, self.x_cen.value) = ndimage.measurements.center_of_mass(region)
         self.x_cen.value = self.x_cen.value + self.x_min.value
-        self.y_cen.value = self.y_cen.value + self.y_min.value
+        self.y_cen.value = (region.shape[0] - 1 - y_cen) + self.y_min.value
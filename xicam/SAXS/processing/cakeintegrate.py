@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, Output
 import numpy as np
 from pyFAI import AzimuthalIntegrator, units
+from xicam.SAXS.processing import engines
 
 
 class CakeIntegratePlugin(ProcessingPlugin):
@@ -41,26 +42,23 @@ class CakeIntegratePlugin(ProcessingPlugin):
                type=np.array)
 
     def evaluate(self):
-        self.cake.value, q, chi = self.ai.value.integrate2d(data=nonesafe_flipud(self.data.value),
-                                                            npt_rad=self.npt_rad.value,
-                                                            npt_azim=self.npt_azim.value,
-                                                            radial_range=self.radial_range.value,
-                                                            azimuth_range=self.azimuth_range.value,
-                                                            mask=nonesafe_flipud(self.mask.value),
-                                                            polarization_factor=self.polz_factor.value,
-                                                            dark=nonesafe_flipud(self.dark.value),
-                                                            flat=nonesafe_flipud(self.flat.value),
-                                                            method=self.method.value,
-                                                            unit=self.unit.value,
-                                                            normalization_factor=self.normalization_factor.value)
+        self.cake.value, q, chi = engines.integrate2d(self.ai.value,
+                                                      data=self.data.value,
+                                                      npt_rad=self.npt_rad.value,
+                                                      npt_azim=self.npt_azim.value,
+                                                      radial_range=self.radial_range.value,
+                                                      azimuth_range=self.azimuth_range.value,
+                                                      mask=self.mask.value,
+                                                      polarization_factor=self.polz_factor.value,
+                                                      dark=self.dark.value,
+                                                      flat=self.flat.value,
+                                                      method=self.method.value,
+                                                      unit=self.unit.value,
+                                                      normalization_factor=self.normalization_factor.value,
+                                                      flipud=True)
 
         self.chi.value = chi
         self.q.value = q
 
     def getCategory() -> str:
         return "Integrations"
-
-
-def nonesafe_flipud(data: np.ndarray):
-    if data is None: return None
-    return np.flipud(data).copy()
@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, PlotHint
 import numpy as np
 from pyFAI import AzimuthalIntegrator, units
+from xicam.SAXS.processing import engines
 
 
 class ChiIntegratePlugin(ProcessingPlugin):
@@ -26,9 +27,9 @@ class ChiIntegratePlugin(ProcessingPlugin):
                  type=np.ndarray)
     flat = Input(description='Flat field image',
                  type=np.ndarray)
-    method = Input(description='Can be "numpy", "cython", "BBox" or "splitpixel", "lut", "csr", "nosplit_csr", '
-                               '"full_csr", "lut_ocl" and "csr_ocl" if you want to go on GPU. To Specify the device: '
-                               '"csr_ocl_1,2"',
+    method = Input(description='Only used for "lut", "lut_ocl" and "csr_ocl" (GPU) integration; to specify the '
+                               'device: "csr_ocl_1,2". Otherwise chi profiles are histogrammed directly, without '
+                               'pixel splitting.',
                    type=str, default='splitbbox')
     normalization_factor = Input(description='Value of a normalization monitor',
                                  type=float, default=1.)
@@ -40,26 +41,37 @@ class ChiIntegratePlugin(ProcessingPlugin):
     hints = [PlotHint(chi, Ichi)]
 
     def evaluate(self):
-        self.Ichi.value, q, chi = self.ai.value.integrate2d(data=nonesafe_flipud(self.data.value),
-                                                            npt_rad=1,
-                                                            npt_azim=self.npt_azim.value,
-                                                            radial_range=self.radial_range.value,
-                                                            azimuth_range=self.azimuth_range.value,
-                                                            mask=nonesafe_flipud(self.mask.value),
-                                                            polarization_factor=self.polz_factor.value,
-                                                            dark=nonesafe_flipud(self.dark.value),
-                                                            flat=nonesafe_flipud(self.flat.value),
-                                                            method=self.method.value,
-                                                            unit=self.unit.value,
-                                                            normalization_factor=self.normalization_factor.value)
+        if self.method.value not in engines.SPLITTING:  # i.e. GPU methods; go through pyFAI
+            self.Ichi.value, q, self.chi.value = engines.integrate2d(self.ai.value,
+                                                                     data=self.data.value,
+                                                                     npt_rad=1,
+                                                                     npt_azim=self.npt_azim.value,
+                                                                     radial_range=self.radial_range.value,
+                                                                     azimuth_range=self.azimuth_range.value,
+                                                                     mask=self.mask.value,
+                                                                     polarization_factor=self.polz_factor.value,
+                                                                     dark=self.dark.value,
+                                                                     flat=self.flat.value,
+                                                                     method=self.method.value,
+                                                                     unit=self.unit.value,
+                                                                     normalization_factor=self.normalization_factor.value,
+                                                                     flipud=True)
+            self.Ichi.value = np.sum(self.Ichi.value, axis=-1)
+            return
 
-        self.Ichi.value = np.sum(self.Ichi.value, axis=1)
-        self.chi.value = chi
+        # Histogram pixels directly by chi; the row flip is applied to the cached chi map rather than to the frames
+        self.chi.value, self.Ichi.value = engines.integrate_chi(self.ai.value,
+                                                                data=self.data.value,
+                                                                npt_azim=self.npt_azim.value,
+                                                                radial_range=self.radial_range.value,
+                                                                azimuth_range=self.azimuth_range.value,
+                                                                mask=self.mask.value,
+                                                                polarization_factor=self.polz_factor.value,
+                                                                dark=self.dark.value,
+                                                                flat=self.flat.value,
+                                                                unit=self.unit.value,
+                                                                normalization_factor=self.normalization_factor.value,
+                                                                flipud=True)
 
     def getCategory() -> str:
         return "Integrations"
-
-
-def nonesafe_flipud(data: np.ndarray):
-    if data is None: return None
-    return np.flipud(data).copy()
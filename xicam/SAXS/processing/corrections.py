@@ -0,0 +1,95 @@
+"""
+Cached dark/flat/mask correction operators.
+
+The X/Z integrations and linecuts correct frames as (data - dark) * average(flat - dark) / (flat - dark) * !mask. That
+is an affine map of data, so it is precomputed once per dark/flat/mask as a float32 gain and offset, and each frame
+costs only a multiply and an add.
+"""
+
+import numpy as np
+
+from xicam.SAXS.processing import engines
+
+
+class CorrectionOperator(object):
+    """
+    The correction data * gain + offset for one combination of dark, flat and mask.
+
+    Missing dark, flat or mask are treated as zeros, ones and no masked pixels, respectively.
+    """
+
+    def __init__(self, shape, dark: np.ndarray = None, flat: np.ndarray = None, mask: np.ndarray = None):
+        self.shape = tuple(shape)
+
+        dark = np.zeros(self.shape) if dark is None else np.asarray(dark, dtype=np.float64)
+        flat = np.ones(self.shape) if flat is None else np.asarray(flat, dtype=np.float64)
+        response = flat - dark
+        gain = np.average(response) / response
+        if mask is not None:
+            gain *= np.logical_not(mask)
+
+        self.gain = gain.astype(np.float32)
+        self.offset = None
+        if dark.any():
+            self.offset = (-dark * gain).astype(np.float32)
+
+        self.gain.setflags(write=False)
+        if self.offset is not None:
+            self.offset.setflags(write=False)
+
+    def apply(self, data: np.ndarray, index=None, out: np.ndarray = None, inplace: bool = False):
+        """
+        Correct a frame, a stack of frames, or a region of a frame.
+
+        Parameters
+        ----------
+        data: np.ndarray
+            A frame, an (N, rows, columns) stack of frames, or the region of a frame selected by index
+        index
+            If given, data is frame[index], and only the matching region of the operator is applied
+        out: np.ndarray
+            Buffer to write the corrected data to; a float32 array is allocated if not given
+        inplace: bool
+            Write the corrected data back to data, which must then have a floating point dtype
+
+        Returns
+        -------
+        np.ndarray
+            The corrected data
+
+        """
+        gain, offset = self.gain, self.offset
+        if index is not None:
+            gain = gain[index]
+            offset = offset[index] if offset is not None else None
+
+        if inplace:
+            out = data
+        elif out is None:
+            out = np.empty(np.broadcast(data, gain).shape, dtype=np.float32)
+
+        np.multiply(data, gain, out=out)
+        if offset is not None:
+            out += offset
+        return out
+
+    __call__ = apply
+
+
+operators = engines.EngineCache(maxsize=4)
+
+
+def operator(shape, dark: np.ndarray = None, flat: np.ndarray = None, mask: np.ndarray = None):
+    """
+    Get the CorrectionOperator for this dark, flat and mask, building it only when one of them has changed.
+    """
+    key = ('correction', tuple(shape), engines.array_key(dark), engines.array_key(flat), engines.array_key(mask))
+    return operators.get(key, lambda: CorrectionOperator(shape, dark=dark, flat=flat, mask=mask))
+
+
+def correct(data: np.ndarray, dark: np.ndarray = None, flat: np.ndarray = None, mask: np.ndarray = None,
+            out: np.ndarray = None, inplace: bool = False):
+    """
+    Apply the cached correction for dark, flat and mask to a frame or stack; see CorrectionOperator.apply.
+    """
+    return operator(np.shape(data)[-2:], dark=dark, flat=flat, mask=mask).apply(data, out=out, inplace=inplace)
@@ -0,0 +1,115 @@
+"""
+Correlation function and pair distribution function of reduced I(q) profiles.
+
+    gamma(r) = int I(q) q^2 sin(qr)/(qr) dq / int I(q) q^2 dq
+    p(r) = r^2 / (2 pi^2) int I(q) q^2 sin(qr)/(qr) dq
+
+Outside the measured range, I(q) is extrapolated as constant towards q=0 and with Porod's law K/q^4 towards infinity,
+where K is averaged over the last points of the profile. Quadrature and both extrapolations are linear in I, so for a
+given q and r grid they fold into a single kernel matrix; a whole (N, npt) series is transformed by one product.
+"""
+
+import numpy as np
+from scipy.special import sici
+
+from xicam.SAXS.processing import engines
+
+
+class CorrelationEngine(object):
+    """
+    The sine-transform kernel for one q grid and r grid.
+
+    Parameters
+    ----------
+    q: np.ndarray
+        q bin centers of the profiles, in 1/Angstrom
+    r: np.ndarray
+        Distances to evaluate at, in Angstrom; defaults to npt_r points from 0 to pi / q_min
+    npt_r: int
+        Number of distances, if r is not given
+    porod_fraction: float
+        Fraction of the highest-q points from which the Porod constant is averaged
+
+    """
+
+    def __init__(self, q: np.ndarray, r: np.ndarray = None, npt_r: int = 200, porod_fraction: float = .1):
+        self.q = q = np.asarray(q, dtype=np.float64)
+        if r is None:
+            r = np.linspace(0, np.pi / q[q > 0].min(), npt_r)
+        self.r = r = np.asarray(r, dtype=np.float64)
+
+        # Trapezoid weights over the (possibly non-uniform) q grid
+        weights = np.zeros_like(q)
+        weights[1:] += np.diff(q) / 2
+        weights[:-1] += np.diff(q) / 2
+
+        qr = np.outer(r, q)
+        kernel = weights * q ** 2 * np.sinc(qr / np.pi)
+
+        # Constant extrapolation below the first point: int_0^q0 q^2 sinc(qr) dq
+        q0 = q[0]
+        b = q0 * r
+        with np.errstate(divide='ignore', invalid='ignore'):
+            low = np.where(b > 1e-3, (np.sin(b) - b * np.cos(b)) / r ** 3, q0 ** 3 / 3)
+        kernel[:, 0] += low
+
+        # Porod extrapolation above the last point: K * int_qmax^inf q^-2 sinc(qr) dq, with K the mean of I q^4 over
+        # the tail
+        qmax = q[-1]
+        b = qmax * r
+        with np.errstate(divide='ignore', invalid='ignore'):
+            high = np.where(b > 1e-3,
+                            r * (np.sin(b) / (2 * b ** 2) + np.cos(b) / (2 * b) + sici(b)[0] / 2 - np.pi / 4),
+                            1 / qmax)
+        ntail = max(int(round(len(q) * porod_fraction)), 1)
+        kernel[:, -ntail:] += np.outer(high, q[-ntail:] ** 4 / ntail)
+
+        self.kernel = kernel.astype(np.float32)
+        self.invariant = (weights * q ** 2).astype(np.float32)  # int I q^2 dq, with the same extrapolations
+        self.invariant[0] += q0 ** 3 / 3
+        self.invariant[-ntail:] += q[-ntail:] ** 4 / ntail / qmax
+
+    def transform(self, I: np.ndarray):
+        """
+        Transform a profile, or an (N, npt) series of profiles, at once.
+
+        Returns
+        -------
+        tuple
+            (gamma, p), each with shape (npt_r,), or (N, npt_r) for a series
+
+        """
+        I = np.asarray(I, dtype=np.float32)
+        sums = I.dot(self.kernel.T)
+        invariant = I.dot(self.invariant)[..., None]
+        gamma = np.divide(sums, invariant, out=np.zeros(sums.shape, dtype=np.float32), where=invariant != 0)
+        p = sums * (self.r ** 2 / (2 * np.pi ** 2)).astype(np.float32)
+        return gamma, p
+
+
+kernels = engines.EngineCache(maxsize=4)
+
+
+def engine(q: np.ndarray, r: np.ndarray = None, npt_r: int = 200, porod_fraction: float = .1):
+    """
+    Get the CorrelationEngine for this q and r grid, building its kernel only on a cache miss.
+    """
+    key = ('correlation', engines.array_key(np.asarray(q)), engines.array_key(None if r is None else np.asarray(r)),
+           npt_r, porod_fraction)
+    return kernels.get(key, lambda: CorrelationEngine(q, r=r, npt_r=npt_r, porod_fraction=porod_fraction))
+
+
+def correlation_function(q: np.ndarray, I: np.ndarray, r: np.ndarray = None, npt_r: int = 200):
+    """
+    Normalized correlation function gamma(r) of a profile or series; returns (r, gamma).
+    """
+    correlation = engine(q, r=r, npt_r=npt_r)
+    return correlation.r, correlation.transform(I)[0]
+
+
+def pair_distribution(q: np.ndarray, I: np.ndarray, r: np.ndarray = None, npt_r: int = 200):
+    """
+    Pair distance distribution function p(r) of a profile or series; returns (r, p).
+    """
+    correlation = engine(q, r=r, npt_r=npt_r)
+    return correlation.r, correlation.transform(I)[1]
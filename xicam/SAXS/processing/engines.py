@@ -0,0 +1,810 @@
+"""
+Geometry-keyed cache of precomputed sparse integration engines.
+
+pyFAI rebuilds its LUT/CSR matrices whenever it receives a new AzimuthalIntegrator (or detector) instance, even if the
+geometry is unchanged. The engines here are keyed by a fingerprint of the geometry and integration parameters instead,
+so that any integrator describing the same geometry reuses a single precomputed sparse matrix.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from pyFAI import AzimuthalIntegrator, units
+
+from xicam.SAXS.masking.packedmask import PackedMask
+
+# Integration methods which can be served from a cached CSR matrix, mapped to their pixel splitting scheme. Other
+# methods (LUT, OpenCL, ...) are passed through to pyFAI.
+SPLITTING = {'splitbbox': 'bbox',
+             'bbox': 'bbox',
+             'csr': 'bbox',
+             'bbox_csr': 'bbox',
+             'splitpixel': 'full',
+             'full_csr': 'full',
+             'numpy': 'no',
+             'cython': 'no',
+             'histogram': 'no',
+             'nosplit_csr': 'no'}
+
+
+def array_key(array: np.ndarray):
+    """
+    Cheap fingerprint of an array's contents, used to key engines on masks.
+
+    Returns None if array is None; packed masks are fingerprinted by their (cached) key.
+    """
+    if array is None: return None
+    if isinstance(array, PackedMask): return array.key
+    array = np.ascontiguousarray(array)
+    return array.shape, array.dtype.str, zlib.crc32(array)
+
+
+def detector_key(detector):
+    """
+    Fingerprint of a detector: its type, shape, binning and pixel size.
+    """
+    return (type(detector).__name__,
+            tuple(detector.shape) if detector.shape is not None else None,
+            tuple(detector.binning),
+            detector.pixel1,
+            detector.pixel2,
+            getattr(detector, 'splineFile', None))
+
+
+def geometry_key(ai: AzimuthalIntegrator):
+    """
+    Fingerprint of the geometry described by ai: the detector (see detector_key), the PONI/rotations and the
+    wavelength.
+    """
+    return detector_key(ai.detector) + (ai.dist, ai.poni1, ai.poni2, ai.rot1, ai.rot2, ai.rot3,
+                                        ai.wavelength,
+                                        ai.chiDiscAtPi)
+
+
+class IntegrationEngine(object):
+    """
+    A precomputed sparse integration matrix for one geometry.
+
+    Rows of the matrix are output bins and columns are detector pixels; masked pixels are excluded from the matrix. The
+    solid angle and polarization corrections are folded into a per-bin normalization, so integrating a frame is a single
+    sparse product followed by a division. With flipud, the matrix columns are permuted so that the geometry applies to
+    frames (and mask and flat) with their rows reversed, without flipping or copying the frames themselves.
+    """
+
+    def __init__(self, ai: AzimuthalIntegrator, shape, npt, unit, radial_range=None, azimuth_range=None, mask=None,
+                 polarization_factor=None, split='bbox', flipud=False):
+        self.shape = tuple(shape)
+        self.npt = npt
+        self.unit = units.to_unit(unit)
+
+        pos0_range = None
+        if radial_range is not None:
+            pos0_range = (min(radial_range) / self.unit.scale, max(radial_range) / self.unit.scale)
+        pos1_range = None
+        if azimuth_range is not None:
+            pos1_range = tuple(np.deg2rad([min(azimuth_range), max(azimuth_range)]))
+
+        mask = _pyfaimask(mask, flipud)
+
+        kwargs = dict(mask=mask, pos0_range=pos0_range, pos1_range=pos1_range, unit=self.unit, split=split)
+        try:
+            csr = ai.setup_CSR(self.shape, npt, scale=False, **kwargs)
+        except TypeError:  # older pyFAI always works in internal units
+            csr = ai.setup_CSR(self.shape, npt, **kwargs)
+
+        coefficients = csr.data
+        if pos0_range is not None and not isinstance(npt, tuple):
+            # pyFAI's 1D sparse matrix puts pixels less than a bin below the radial range in the first bin, where its
+            # histogram (i.e. integrate1d with method='splitbbox') leaves them out
+            below = np.asarray(csr.cpos0) + np.asarray(csr.dpos0) < csr.pos0_min
+            coefficients = np.where(below[csr.indices], np.zeros_like(coefficients), coefficients)
+
+        nbins = int(np.prod(npt))
+        npix = int(np.prod(self.shape))
+        indices = flipcolumns(csr.indices, self.shape) if flipud else csr.indices
+        self.matrix = sparse.csr_matrix((coefficients, indices, csr.indptr), shape=(nbins, npix))
+        self.matrix.eliminate_zeros()
+        self.matrix.sort_indices()
+
+        if isinstance(npt, tuple):
+            self.radial = np.asarray(csr.bin_centers0) * self.unit.scale
+            self.azimuthal = np.rad2deg(csr.bin_centers1)
+        else:
+            self.radial = np.asarray(csr.bin_centers) * self.unit.scale
+            self.azimuthal = None
+
+        # Per-pixel normalization (solid angle x polarization), and its binned form for the common flat=None case
+        normalization = ai.solidAngleArray(self.shape)
+        if polarization_factor is not None:
+            normalization = normalization * ai.polarization(self.shape, polarization_factor)
+        if flipud:
+            normalization = normalization[::-1]
+        self.normalization = np.ascontiguousarray(normalization, dtype=np.float32).ravel()
+        self.denominator = self.matrix.dot(self.normalization)
+
+    def __getstate__(self):
+        # pyFAI units don't pickle; engines are sent to worker processes with their unit by name
+        state = self.__dict__.copy()
+        if self.unit is not None:
+            state['unit'] = str(self.unit)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.unit is not None:
+            self.unit = units.to_unit(self.unit)
+
+    def sums(self, data: np.ndarray, dark: np.ndarray = None, flat: np.ndarray = None,
+             dynamic_mask: np.ndarray = None):
+        """
+        Binned signal and normalization sums of a frame or stack, before division.
+
+        dynamic_mask masks pixels of each frame in addition to the engine's mask; it has the shape of data (1 is
+        masked). Its pixels are zeroed in the signal, and their contributions are subtracted from the normalization with
+        one sparse product over the masked pixels only, so the matrix isn't rebuilt.
+
+        Returns
+        -------
+        tuple
+            (signal, normalization); signal is flat over bins, with a leading frame axis for a stack, and normalization
+            is flat over bins, with a leading frame axis if dynamic_mask is given for a stack
+
+        """
+        data = np.asarray(data)
+        if dynamic_mask is not None:
+            dynamic_mask = np.asarray(dynamic_mask, dtype=np.bool_).reshape(len(data) if data.ndim == 3 else 1, -1)
+            frames, pixels = np.divmod(masked_pixels(dynamic_mask), dynamic_mask.shape[1])
+
+        if data.ndim == 3:
+            # One cast-and-transpose pass puts pixels on rows, so the whole stack is a single sparse x dense product
+            signal = np.asarray(data.reshape(len(data), -1).T, dtype=np.float32, order='C')
+            if dark is not None:
+                signal -= np.asarray(dark, dtype=np.float32).reshape(-1, 1)
+            if dynamic_mask is not None:
+                signal[pixels, frames] = 0
+            signal = self.matrix.dot(signal).T
+        else:
+            signal = np.asarray(data, dtype=np.float32).ravel()
+            if dark is not None:
+                signal = signal - np.asarray(dark, dtype=np.float32).ravel()
+            if dynamic_mask is not None:
+                signal = np.where(dynamic_mask[0], np.float32(0), signal)
+            signal = self.matrix.dot(signal)
+
+        normalization = self.normalization
+        denominator = self.denominator
+        if flat is not None:
+            normalization = normalization * np.asarray(flat, dtype=np.float32).ravel()
+            denominator = self.matrix.dot(normalization)
+
+        if dynamic_mask is not None:
+            removed = sparse.csr_matrix((normalization[pixels], (pixels, frames)), shape=dynamic_mask.shape[::-1])
+            denominator = denominator - self.matrix.dot(removed).toarray().T
+            if data.ndim != 3:
+                denominator = denominator[0]
+
+        return signal, denominator
+
+    def integrate(self, data: np.ndarray, dark: np.ndarray = None, flat: np.ndarray = None,
+                  normalization_factor=1., dynamic_mask: np.ndarray = None):
+        """
+        Integrate a frame, or a stack of frames at once.
+
+        Parameters
+        ----------
+        data: np.ndarray
+            A single frame, or an (N, rows, columns) stack of frames
+        dark: np.ndarray
+            Dark noise image, shared by all frames
+        flat: np.ndarray
+            Flat field image, shared by all frames
+        normalization_factor: float or np.ndarray
+            Monitor value; for a stack this may also be one value per frame
+        dynamic_mask: np.ndarray
+            Pixels masked in each frame (with the shape of data), in addition to the engine's mask
+
+        Returns
+        -------
+        np.ndarray
+            The binned intensity with the same shape as npt, or with a leading frame axis of length N for a stack
+
+        """
+        signal, denominator = self.sums(data, dark=dark, flat=flat, dynamic_mask=dynamic_mask)
+        intensity = normalize(signal, denominator, normalization_factor)
+
+        if isinstance(self.npt, tuple):
+            return intensity.reshape(intensity.shape[:-1] + self.npt).swapaxes(-1, -2)
+        return intensity
+
+
+def masked_pixels(mask: np.ndarray):
+    """
+    Flat indices of the masked pixels of a (usually sparse) mask; a faster np.flatnonzero, which finds the 8-pixel words
+    with any masked pixels first.
+    """
+    mask = np.ascontiguousarray(mask, dtype=np.bool_).ravel()
+    if mask.size % 8:
+        return np.flatnonzero(mask)
+    words = np.flatnonzero(mask.view(np.uint64))
+    candidates = (words[:, np.newaxis] * 8 + np.arange(8)).ravel()
+    return candidates[mask[candidates]]
+
+
+def flipcolumns(indices: np.ndarray, shape):
+    """
+    Map flat pixel indices in the geometry's orientation to the indices of the same pixels in a row-reversed frame.
+    """
+    rows, columns = np.divmod(indices, shape[-1])
+    return ((shape[-2] - 1 - rows) * shape[-1] + columns).astype(indices.dtype)
+
+
+def normalize(signal: np.ndarray, denominator: np.ndarray, normalization_factor=1.):
+    """
+    Divide binned signal sums by their normalization sums; empty bins are 0.
+
+    signal (and denominator) may carry a leading frame axis, in which case normalization_factor may be one value per
+    frame.
+    """
+    normalization_factor = np.asarray(normalization_factor, dtype=np.float32)
+    if normalization_factor.ndim:
+        normalization_factor = normalization_factor.reshape((-1,) + (1,) * (signal.ndim - 1))
+    return np.divide(signal, denominator * normalization_factor, out=np.zeros(signal.shape, dtype=np.float32),
+                     where=denominator != 0)
+
+
+class ChiEngine(IntegrationEngine):
+    """
+    A direct azimuthal (chi) histogram for one geometry.
+
+    Only the pixels within the radial range enter the matrix, each in the bin of its precomputed chi; no 2D intermediate
+    is formed. With flipud, the coordinate maps are applied to frames with their rows reversed, which matches the
+    orientation used by the cake without copying the frames.
+    """
+
+    def __init__(self, ai: AzimuthalIntegrator, shape, npt_azim, unit, radial_range=None, azimuth_range=None,
+                 mask=None, polarization_factor=None, flipud=False):
+        self.shape = tuple(shape)
+        self.npt = npt_azim
+        self.unit = units.to_unit(unit)
+
+        chi = maps.chi(ai, self.shape)
+        radial = maps.radial(ai, self.shape, self.unit)
+        normalization = ai.solidAngleArray(self.shape)
+        if polarization_factor is not None:
+            normalization = normalization * ai.polarization(self.shape, polarization_factor)
+        if flipud:
+            chi, radial, normalization = chi[::-1], radial[::-1], normalization[::-1]
+
+        valid = np.ones(self.shape, dtype=bool)
+        if mask is not None:
+            valid &= np.logical_not(mask)
+        if radial_range is not None:
+            valid &= (radial >= min(radial_range)) & (radial <= max(radial_range))
+        if azimuth_range is not None:
+            valid &= (chi >= min(azimuth_range)) & (chi <= max(azimuth_range))
+        pixels = np.flatnonzero(valid)
+        chi = chi.ravel()[pixels]
+
+        if azimuth_range is not None:
+            low, high = min(azimuth_range), max(azimuth_range)
+        else:
+            low, high = (chi.min(), chi.max()) if len(chi) else (-180, 180)
+        delta = (high - low) / npt_azim or 1
+        bins = np.minimum(((chi - low) / delta).astype(np.intp), npt_azim - 1)
+
+        self.matrix = sparse.csr_matrix((np.ones(len(pixels), dtype=np.float32), (bins, pixels)),
+                                        shape=(npt_azim, int(np.prod(self.shape))))
+        self.radial = None
+        self.azimuthal = low + (np.arange(npt_azim) + .5) * delta
+
+        self.normalization = np.ascontiguousarray(normalization, dtype=np.float32).ravel()
+        self.denominator = self.matrix.dot(self.normalization)
+
+
+class RemeshEngine(IntegrationEngine):
+    """
+    A sparse resampling of detector pixels onto a regular grid of GISAXS reciprocal space (or exit angle) coordinates.
+
+    Each output bin averages the pixels that fall in it. Bins finer than the pixels, which no pixel falls in, take the
+    nearest pixel instead, as long as it is within a pixel's footprint; bins off the detector stay empty. The grid is
+    stored with the first coordinate (q_par, q_y or 2theta_f) along columns and the second (q_z or alpha_f) along rows.
+    """
+
+    def __init__(self, ai: AzimuthalIntegrator, shape, alphai=0., out_range=None, resolution=None, coord_sys='qp_qz',
+                 mask=None, flipud=False):
+        self.shape = tuple(shape)
+        self.unit = None
+        u, v = maps.gisaxs(ai, self.shape, alphai, coord_sys)
+        if flipud:
+            mask = np.flipud(mask) if mask is not None else None
+
+        nu, nv = resolution if resolution is not None else self.shape[::-1]
+        self.npt = (int(nu), int(nv))
+        (ulow, uhigh), (vlow, vhigh) = out_range if out_range is not None else ((u.min(), u.max()), (v.min(), v.max()))
+        du, dv = (uhigh - ulow) / nu or 1, (vhigh - vlow) / nv or 1
+        self.radial = ulow + (np.arange(nu) + .5) * du
+        self.azimuthal = vlow + (np.arange(nv) + .5) * dv
+
+        # Pixel coordinates in units of output bins
+        u = ((u - ulow) / du).ravel()
+        v = ((v - vlow) / dv).ravel()
+        valid = np.ones(u.shape, dtype=bool) if mask is None else np.logical_not(mask).ravel()
+
+        # Average the pixels within each bin
+        iu, iv = np.floor(u).astype(np.intp), np.floor(v).astype(np.intp)
+        inside = valid & (iu >= 0) & (iu < nu) & (iv >= 0) & (iv < nv)
+        pixels = np.flatnonzero(inside)
+        bins = iu[pixels] * nv + iv[pixels]
+        counts = np.bincount(bins, minlength=nu * nv)
+        weights = 1. / counts[bins]
+
+        # Fill the remaining bins from their nearest pixel
+        empty = np.flatnonzero(counts == 0)
+        candidates = np.flatnonzero(valid)
+        if len(empty) and len(candidates):
+            from scipy.spatial import cKDTree
+            shape2d = self.shape[-2:]
+            footprint = np.maximum(np.hypot(*(np.gradient(u.reshape(shape2d), axis=0),
+                                              np.gradient(v.reshape(shape2d), axis=0))),
+                                   np.hypot(*(np.gradient(u.reshape(shape2d), axis=1),
+                                              np.gradient(v.reshape(shape2d), axis=1)))).ravel()
+            centers = np.column_stack(np.divmod(empty, nv)) + .5
+            distance, nearest = cKDTree(np.column_stack((u[candidates], v[candidates]))).query(centers)
+            nearest = candidates[nearest]
+            filled = distance <= footprint[nearest]
+            bins = np.concatenate((bins, empty[filled]))
+            pixels = np.concatenate((pixels, nearest[filled]))
+            weights = np.concatenate((weights, np.ones(np.count_nonzero(filled))))
+
+        if flipud:
+            pixels = flipcolumns(pixels, self.shape)
+        self.matrix = sparse.csr_matrix((weights.astype(np.float32), (bins, pixels)),
+                                        shape=(nu * nv, int(np.prod(self.shape))))
+
+        self.normalization = np.ones(int(np.prod(self.shape)), dtype=np.float32)
+        self.denominator = self.matrix.dot(self.normalization)
+
+
+class MapCache(object):
+    """
+    A small, thread-safe LRU of per-pixel coordinate maps and axes keyed by geometry.
+
+    Maps are computed lazily in float32 and shared (read-only) by all plugins; since they are keyed by the geometry's
+    fingerprint, they are only recomputed when the geometry changes.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ai: AzimuthalIntegrator, shape, name, factory):
+        """
+        Get the map called name for this geometry, or build it with factory() and store it.
+        """
+        key = (geometry_key(ai), tuple(shape), name)
+        with self._lock:
+            array = self._maps.get(key)
+            if array is not None:
+                self._maps.move_to_end(key)
+                return array
+
+        array = factory()
+        array.setflags(write=False)  # maps are shared; never modify them in place
+
+        with self._lock:
+            self._maps[key] = array
+            while len(self._maps) > self.maxsize:
+                self._maps.popitem(last=False)
+        return array
+
+    def chi(self, ai: AzimuthalIntegrator, shape):
+        """
+        Azimuthal angle of each pixel center, in degrees.
+        """
+        return self.get(ai, shape, 'chi', lambda: np.rad2deg(ai.chiArray(shape)).astype(np.float32))
+
+    def radial(self, ai: AzimuthalIntegrator, shape, unit='q_A^-1'):
+        """
+        Radial position of each pixel center, in unit.
+        """
+        unit = units.to_unit(unit)
+        return self.get(ai, shape, str(unit),
+                        lambda: np.asarray(ai.array_from_unit(shape, 'center', unit, scale=True), dtype=np.float32))
+
+    def qx(self, ai: AzimuthalIntegrator, shape):
+        """
+        Horizontal component of q at each pixel center, in 1/Angstrom.
+        """
+        return self.get(ai, shape, 'qx', lambda: self._qcomponents(ai, shape)[0])
+
+    def qz(self, ai: AzimuthalIntegrator, shape):
+        """
+        Vertical component of q at each pixel center, in 1/Angstrom.
+        """
+        return self.get(ai, shape, 'qz', lambda: self._qcomponents(ai, shape)[1])
+
+    @staticmethod
+    def _qcomponents(ai: AzimuthalIntegrator, shape):
+        twotheta = ai.twoThetaArray(shape)
+        chi = ai.chiArray(shape)
+        k = 2 * np.pi / (ai.wavelength * 1e10)
+        return (k * np.sin(twotheta) * np.sin(chi)).astype(np.float32), \
+               (k * np.sin(twotheta) * np.cos(chi)).astype(np.float32)
+
+    def gisaxs(self, ai: AzimuthalIntegrator, shape, alphai=0., coord_sys='qp_qz'):
+        """
+        Grazing incidence coordinates of each pixel center, for an incidence angle alphai in degrees.
+
+        coord_sys is one of 'qp_qz' (signed in-plane q and q_z), 'qy_qz' (q_y and q_z), both in 1/Angstrom, or
+        'theta_alpha' (in-plane scattering angle 2theta_f and exit angle alpha_f), in degrees.
+
+        Returns
+        -------
+        np.ndarray
+            A (2, rows, columns) array of the two coordinates
+
+        """
+        if coord_sys not in ('qp_qz', 'qy_qz', 'theta_alpha'):
+            raise ValueError('Unknown coordinate system: {}'.format(coord_sys))
+
+        def _gisaxs():
+            z, y, x = np.moveaxis(ai.position_array(shape), -1, 0)
+            alphai_ = np.deg2rad(alphai)
+            twotheta_f = np.arctan2(x, z)
+            alpha_f = np.arctan2(y, np.hypot(x, z)) - alphai_
+            if coord_sys == 'theta_alpha':
+                return np.rad2deg([twotheta_f, alpha_f]).astype(np.float32)
+
+            k = 2 * np.pi / (ai.wavelength * 1e10)
+            qx = k * (np.cos(alpha_f) * np.cos(twotheta_f) - np.cos(alphai_))
+            qy = k * np.cos(alpha_f) * np.sin(twotheta_f)
+            qz = k * (np.sin(alpha_f) + np.sin(alphai_))
+            if coord_sys == 'qp_qz':
+                qy = np.sign(qy) * np.hypot(qx, qy)
+            return np.array([qy, qz], dtype=np.float32)
+
+        return self.get(ai, shape, ('gisaxs', alphai, coord_sys), _gisaxs)
+
+    def qx_axis(self, ai: AzimuthalIntegrator, shape):
+        """
+        Signed q (1/Angstrom) of each column along the row through the beam center; negative left of the center.
+        """
+
+        def _qx_axis():
+            fit2d = ai.getFit2D()
+            columns = np.arange(shape[-1])
+            qx = ai.qFunction(np.full(shape[-1], fit2d['centerY']), columns) / 10.
+            qx[columns < fit2d['centerX']] *= -1.
+            return qx.astype(np.float32)
+
+        return self.get(ai, shape[-2:], 'qx_axis', _qx_axis)
+
+    def qz_axis(self, ai: AzimuthalIntegrator, shape):
+        """
+        Signed q (1/Angstrom) of each row along the column through the beam center; negative below the center.
+        """
+
+        def _qz_axis():
+            fit2d = ai.getFit2D()
+            rows = np.arange(shape[-2])
+            qz = ai.qFunction(rows, np.full(shape[-2], fit2d['centerX'])) / 10.
+            qz[rows < fit2d['centerY']] *= -1.
+            return qz.astype(np.float32)
+
+        return self.get(ai, shape[-2:], 'qz_axis', _qz_axis)
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+
+
+maps = MapCache(maxsize=16)
+
+
+class EngineCache(object):
+    """
+    A bounded, thread-safe LRU of IntegrationEngines keyed by geometry and integration parameters.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def engine(self, ai: AzimuthalIntegrator, shape, npt, unit='q_A^-1', radial_range=None, azimuth_range=None,
+               mask=None, polarization_factor=None, method='splitbbox', flipud=False):
+        """
+        Get the engine for this geometry and set of parameters, building it only on a cache miss.
+        """
+        mask = _framemask(ai, mask, flipud)
+        unit = units.to_unit(unit)
+        key = (geometry_key(ai), tuple(shape), npt, str(unit),
+               tuple(radial_range) if radial_range is not None else None,
+               tuple(azimuth_range) if azimuth_range is not None else None,
+               array_key(mask), polarization_factor, SPLITTING[method], flipud)
+
+        return self.get(key, lambda: IntegrationEngine(ai, shape, npt, unit, radial_range=radial_range,
+                                                      azimuth_range=azimuth_range, mask=mask,
+                                                      polarization_factor=polarization_factor,
+                                                      split=SPLITTING[method], flipud=flipud))
+
+    def chi_engine(self, ai: AzimuthalIntegrator, shape, npt_azim, unit='q_A^-1', radial_range=None,
+                   azimuth_range=None, mask=None, polarization_factor=None, flipud=False):
+        """
+        Get the ChiEngine for this geometry and set of parameters, building it only on a cache miss.
+        """
+        mask = _framemask(ai, mask, flipud)
+        unit = units.to_unit(unit)
+        key = ('chi', geometry_key(ai), tuple(shape), npt_azim, str(unit),
+               tuple(radial_range) if radial_range is not None else None,
+               tuple(azimuth_range) if azimuth_range is not None else None,
+               array_key(mask), polarization_factor, flipud)
+
+        return self.get(key, lambda: ChiEngine(ai, shape, npt_azim, unit, radial_range=radial_range,
+                                               azimuth_range=azimuth_range, mask=mask,
+                                               polarization_factor=polarization_factor, flipud=flipud))
+
+    def remesh_engine(self, ai: AzimuthalIntegrator, shape, alphai=0., out_range=None, resolution=None,
+                      coord_sys='qp_qz', mask=None, flipud=False):
+        """
+        Get the RemeshEngine for this geometry, incidence angle and output grid, building it only on a cache miss.
+        """
+        mask = _framemask(ai, mask, flipud)
+        key = ('remesh', geometry_key(ai), tuple(shape), alphai,
+               tuple(map(tuple, out_range)) if out_range is not None else None,
+               tuple(resolution) if resolution is not None else None,
+               coord_sys, array_key(mask), flipud)
+
+        return self.get(key, lambda: RemeshEngine(ai, shape, alphai=alphai, out_range=out_range,
+                                                  resolution=resolution, coord_sys=coord_sys, mask=mask,
+                                                  flipud=flipud))
+
+    def get(self, key, factory):
+        """
+        Get the engine stored under key, or build it with factory() and store it.
+        """
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                self.hits += 1
+                return engine
+            self.misses += 1
+
+        engine = factory()
+        engine.key = key
+
+        with self._lock:
+            self._engines[key] = engine
+            while len(self._engines) > self.maxsize:
+                self._engines.popitem(last=False)
+        return engine
+
+    def put(self, engine):
+        """
+        Store an engine built elsewhere (i.e. in another process) under its key.
+        """
+        with self._lock:
+            self._engines[engine.key] = engine
+            while len(self._engines) > self.maxsize:
+                self._engines.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._engines.clear()
+
+
+cache = EngineCache()
+
+
+def _framemask(ai: AzimuthalIntegrator, mask: np.ndarray, flipud: bool):
+    """
+    The mask in the orientation of the frames; defaults to the detector's mask, which is in the geometry's orientation.
+    """
+    if mask is None and ai.detector.mask is not None:
+        mask = ai.detector.mask
+        if flipud:
+            mask = mask[::-1]
+    return mask
+
+
+def _flipped(array: np.ndarray, flipud: bool):
+    """
+    A row-reversed view of a frame or stack (or None), for the methods that are passed through to pyFAI.
+    """
+    if array is None or not flipud: return array
+    return np.flip(array, -2)
+
+
+def _pyfaimask(mask, flipud: bool, dynamic_mask=None):
+    """
+    The mask (or None) as pyFAI needs it: in the geometry's orientation, contiguous and writable (pyFAI fingerprints it
+    through a writable buffer, and masks here are usually shared read-only). A frame's dynamic_mask is added to it.
+    """
+    if dynamic_mask is not None:
+        mask = dynamic_mask if mask is None else np.logical_or(mask, dynamic_mask)
+    if mask is None: return None
+    return np.array(np.flipud(mask) if flipud else mask, dtype=np.int8, order='C')
+
+
+def integrate1d(ai: AzimuthalIntegrator, data: np.ndarray, npt: int, unit='q_A^-1', radial_range=None,
+                azimuth_range=None, mask=None, polarization_factor=None, dark=None, flat=None, method='splitbbox',
+                normalization_factor=1., flipud=False, dynamic_mask=None):
+    """
+    Drop-in for AzimuthalIntegrator.integrate1d which reuses cached engines; returns (radial, intensity).
+
+    data may also be an (N, rows, columns) stack, in which case intensity has shape (N, npt). With flipud, the geometry
+    is applied to the frame (and mask, dark and flat) as if its rows were reversed. dynamic_mask masks pixels of each
+    frame (it has the shape of data) in addition to mask, without rebuilding the engine.
+    """
+    if method not in SPLITTING:
+        data, dark, flat = (_flipped(array, flipud) for array in (data, dark, flat))
+
+        def _integrate1d(frame, factor, framemask):
+            return ai.integrate1d(data=frame, npt=npt, unit=unit, radial_range=radial_range,
+                                  azimuth_range=azimuth_range, mask=_pyfaimask(mask, flipud, framemask),
+                                  polarization_factor=polarization_factor, dark=dark, flat=flat, method=method,
+                                  normalization_factor=factor)[:2]
+
+        if data.ndim == 3:
+            factors = np.broadcast_to(normalization_factor, (len(data),))
+            framemasks = dynamic_mask if dynamic_mask is not None else [None] * len(data)
+            results = [_integrate1d(*args) for args in zip(data, factors, framemasks)]
+            return results[0][0], np.stack([I for _, I in results])
+        return _integrate1d(data, normalization_factor, dynamic_mask)
+
+    engine = cache.engine(ai, data.shape[-2:], npt, unit=unit, radial_range=radial_range,
+                          azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                          method=method, flipud=flipud)
+    return engine.radial, engine.integrate(data, dark=dark, flat=flat, normalization_factor=normalization_factor,
+                                           dynamic_mask=dynamic_mask)
+
+
+def integrate2d(ai: AzimuthalIntegrator, data: np.ndarray, npt_rad: int, npt_azim: int, unit='q_A^-1',
+                radial_range=None, azimuth_range=None, mask=None, polarization_factor=None, dark=None, flat=None,
+                method='splitbbox', normalization_factor=1., flipud=False, dynamic_mask=None):
+    """
+    Drop-in for AzimuthalIntegrator.integrate2d which reuses cached engines; returns (intensity, radial, azimuthal).
+
+    data may also be an (N, rows, columns) stack, in which case intensity has shape (N, npt_azim, npt_rad). flipud and
+    dynamic_mask are as for integrate1d.
+    """
+    if method not in SPLITTING:
+        data, dark, flat = (_flipped(array, flipud) for array in (data, dark, flat))
+
+        def _integrate2d(frame, factor, framemask):
+            return ai.integrate2d(data=frame, npt_rad=npt_rad, npt_azim=npt_azim, unit=unit,
+                                  radial_range=radial_range, azimuth_range=azimuth_range,
+                                  mask=_pyfaimask(mask, flipud, framemask), polarization_factor=polarization_factor,
+                                  dark=dark, flat=flat, method=method, normalization_factor=factor)[:3]
+
+        if data.ndim == 3:
+            factors = np.broadcast_to(normalization_factor, (len(data),))
+            framemasks = dynamic_mask if dynamic_mask is not None else [None] * len(data)
+            results = [_integrate2d(*args) for args in zip(data, factors, framemasks)]
+            return np.stack([I for I, _, _ in results]), results[0][1], results[0][2]
+        return _integrate2d(data, normalization_factor, dynamic_mask)
+
+    engine = cache.engine(ai, data.shape[-2:], (npt_rad, npt_azim), unit=unit, radial_range=radial_range,
+                          azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                          method=method, flipud=flipud)
+    return (engine.integrate(data, dark=dark, flat=flat, normalization_factor=normalization_factor,
+                             dynamic_mask=dynamic_mask),
+            engine.radial, engine.azimuthal)
+
+
+_lastbundle = (None, None)
+_bundlelock = threading.Lock()
+
+
+def bundle(ai: AzimuthalIntegrator, data: np.ndarray, npt_rad: int, npt_azim: int, unit='q_A^-1',
+           radial_range=None, azimuth_range=None, mask=None, polarization_factor=None, dark=None, flat=None,
+           method='splitbbox', normalization_factor=1., flipud=False, dynamic_mask=None):
+    """
+    Reduce a frame to its cake, I(q) and I(chi) with a single histogram of its pixels.
+
+    The cake's binned signal and normalization sums are computed once; I(q) and I(chi) are the ratios of those sums
+    collapsed along chi and q, which weights each cake bin by its pixel contribution. The last result is memoized on the
+    frame's contents, so that a second stage reducing the same frame (i.e. the display after the reduction) is free.
+    For a stack of frames the cake is not kept, only the profiles are returned, and nothing is memoized (a series'
+    blocks are reduced once). flipud and dynamic_mask are as for
+    integrate2d.
+
+    Returns
+    -------
+    tuple
+        (cake, q, chi, Iq, Ichi)
+
+    """
+    global _lastbundle
+
+    if method not in SPLITTING:  # no sparse engine; fall back to separate pyFAI integrations
+        cake, q, chi = integrate2d(ai, data, npt_rad, npt_azim, unit=unit, radial_range=radial_range,
+                                   azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                                   dark=dark, flat=flat, method=method, normalization_factor=normalization_factor,
+                                   flipud=flipud, dynamic_mask=dynamic_mask)
+        _, Iq = integrate1d(ai, data, npt_rad, unit=unit, radial_range=radial_range, azimuth_range=azimuth_range,
+                            mask=mask, polarization_factor=polarization_factor, dark=dark, flat=flat, method=method,
+                            normalization_factor=normalization_factor, flipud=flipud, dynamic_mask=dynamic_mask)
+        Ichi, _, _ = integrate2d(ai, data, 1, npt_azim, unit=unit, radial_range=radial_range,
+                                 azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                                 dark=dark, flat=flat, method=method, normalization_factor=normalization_factor,
+                                 flipud=flipud, dynamic_mask=dynamic_mask)
+        return (cake if np.ndim(data) == 2 else None), q, chi, Iq, np.sum(Ichi, axis=-1)
+
+    engine = cache.engine(ai, data.shape[-2:], (npt_rad, npt_azim), unit=unit, radial_range=radial_range,
+                          azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                          method=method, flipud=flipud)
+    key = None
+    if np.ndim(data) == 2:
+        key = (engine.key, array_key(data), array_key(dark), array_key(flat),
+               array_key(np.asarray(normalization_factor)), array_key(dynamic_mask))
+        with _bundlelock:
+            lastkey, lastresult = _lastbundle
+        if key == lastkey:
+            return lastresult
+
+    signal, denominator = engine.sums(data, dark=dark, flat=flat, dynamic_mask=dynamic_mask)
+    signal = signal.reshape(signal.shape[:-1] + (npt_rad, npt_azim))
+    denominator = denominator.reshape(denominator.shape[:-1] + (npt_rad, npt_azim))
+
+    cake = None
+    if signal.ndim == 2:
+        cake = normalize(signal, denominator, normalization_factor).T
+    Iq = normalize(signal.sum(axis=-1), denominator.sum(axis=-1), normalization_factor)
+    Ichi = normalize(signal.sum(axis=-2), denominator.sum(axis=-2), normalization_factor)
+
+    result = (cake, engine.radial, engine.azimuthal, Iq, Ichi)
+    if key is not None:
+        with _bundlelock:
+            _lastbundle = (key, result)
+    return result
+
+
+def integrate_chi(ai: AzimuthalIntegrator, data: np.ndarray, npt_azim: int, unit='q_A^-1', radial_range=None,
+                  azimuth_range=None, mask=None, polarization_factor=None, dark=None, flat=None,
+                  normalization_factor=1., flipud=False, dynamic_mask=None):
+    """
+    Azimuthal profile of the pixels within radial_range, histogrammed directly by chi; returns (chi, intensity).
+
+    data may also be an (N, rows, columns) stack, in which case intensity has shape (N, npt_azim). flipud and
+    dynamic_mask are as for integrate1d.
+    """
+    engine = cache.chi_engine(ai, data.shape[-2:], npt_azim, unit=unit, radial_range=radial_range,
+                              azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                              flipud=flipud)
+    return engine.azimuthal, engine.integrate(data, dark=dark, flat=flat, normalization_factor=normalization_factor,
+                                              dynamic_mask=dynamic_mask)
+
+
+def remesh(ai: AzimuthalIntegrator, data: np.ndarray, alphai=0., out_range=None, resolution=None, coord_sys='qp_qz',
+           mask=None, dark=None, flat=None, flipud=False):
+    """
+    Resample a frame (or an (N, rows, columns) stack) onto a regular GISAXS grid; see RemeshEngine.
+
+    Parameters
+    ----------
+    alphai: float
+        Angle of incidence, in degrees
+    out_range: sequence
+        ((low, high), (low, high)) of the two output coordinates; defaults to the extent of the detector
+    resolution: sequence
+        (columns, rows) of the output image; defaults to the detector's shape
+    coord_sys: str
+        'qp_qz', 'qy_qz' or 'theta_alpha'
+
+    Returns
+    -------
+    tuple
+        (image, x, y), where x and y are the bin centers along the image's columns and rows
+
+    """
+    engine = cache.remesh_engine(ai, data.shape[-2:], alphai=alphai, out_range=out_range, resolution=resolution,
+                                 coord_sys=coord_sys, mask=mask, flipud=flipud)
+    return engine.integrate(data, dark=dark, flat=flat), engine.radial, engine.azimuthal
@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, PlotHint
 import numpy as np
 from pyFAI import AzimuthalIntegrator, units
+from xicam.SAXS.processing import corrections
 
 
 class LinecutPlugin(ProcessingPlugin):
@@ -31,12 +32,14 @@ class LinecutPlugin(ProcessingPlugin):
             self.coordinate.value = lperp-1
         if self.coordinate.value < 0:
             self.coordinate.value = 0
-        if self.dark.value is None: self.dark.value = np.zeros_like(self.data.value)
-        if self.flat.value is None: self.flat.value = np.ones_like(self.data.value)
-        if self.mask.value is None: self.mask.value = np.zeros_like(self.data.value)
-        h = ((self.data.value - self.dark.value) * np.average(self.flat.value - self.dark.value) / (
-                self.flat.value - self.dark.value) * np.logical_not(self.mask.value))
-        self.I.value = (h[lperp -1 - self.coordinate.value] if x else [b[self.coordinate.value] for b in h][::-1])
+        operator = corrections.operator(self.data.value.shape, dark=self.dark.value, flat=self.flat.value,
+                                        mask=self.mask.value)
+        if x:  # rows are counted from the bottom
+            row = lperp - 1 - self.coordinate.value
+            self.I.value = operator.apply(self.data.value[row], index=row)
+        else:
+            column = (slice(None), self.coordinate.value)
+            self.I.value = operator.apply(self.data.value[column], index=column)[::-1]
         self.px.value = range(self.data.value.shape[x])#booleans are ints
 
     def getCategory() -> str:
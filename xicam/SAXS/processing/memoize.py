@@ -0,0 +1,154 @@
+"""
+Input-hash memoization of workflow processes.
+
+Each memoized process remembers a fingerprint of the input values it was last evaluated with, and the output values
+that evaluation produced. When a workflow is re-executed and a process's inputs are unchanged, its outputs are restored
+instead of evaluating it again; so editing a parameter of a downstream process (i.e. the domain of a fit) only
+re-evaluates that process and those after it, rather than re-integrating the frame.
+"""
+
+import numbers
+import threading
+import weakref
+
+import numpy as np
+from pyFAI.geometry import Geometry
+
+from xicam.SAXS.masking.dynamic import DynamicMask
+from xicam.SAXS.masking.packedmask import PackedMask
+from xicam.SAXS.processing import engines
+
+_digests = {}  # id of a read-only array -> (weakref to it, digest); see _digest
+_lock = threading.Lock()
+
+
+class _Unmatched(object):
+    """
+    Fingerprint of a value which can't be fingerprinted; never equal to anything, so the process is always evaluated.
+    """
+
+    def __eq__(self, other):
+        return False
+
+    def __ne__(self, other):
+        return True
+
+    __hash__ = None
+
+
+def _digest(array: np.ndarray):
+    # Read-only arrays (i.e. the cached maps) can't change under us, so their digest is remembered for as long as they
+    # are alive, and is only computed once
+    if array.flags.writeable:
+        return engines.array_key(array)
+    with _lock:
+        ref, digest = _digests.get(id(array), (None, None))
+        if ref is not None and ref() is array:
+            return digest
+    digest = engines.array_key(array)
+    try:
+        ref = weakref.ref(array, lambda _, key=id(array): _digests.pop(key, None))
+    except TypeError:  # i.e. a memory map's base; just don't remember it
+        return digest
+    with _lock:
+        _digests[id(array)] = ref, digest
+    return digest
+
+
+def fingerprint(value):
+    """
+    Cheap, comparable fingerprint of an input value.
+
+    Arrays are fingerprinted by their shape, dtype and a CRC of their contents, packed masks by their version, dynamic
+    masks by their key, and integrators by their geometry. Scalars, strings and types are their own fingerprint, and
+    containers are fingerprinted element-wise. Any other object is fingerprinted by its identity, so an object mutated in
+    place between executions is not noticed.
+
+    (N, rows, columns) stacks of frames are not fingerprinted: the series reductions feed each block of frames through
+    the workflow once, so hashing the blocks would only cost a pass over every frame. They never match.
+    """
+    if value is None or isinstance(value, (numbers.Number, str, bytes, type, np.generic)):
+        return value
+    if isinstance(value, np.ndarray):
+        if value.ndim == 3:
+            return _Unmatched()
+        return ('array',) + _digest(value)
+    if isinstance(value, PackedMask):
+        return 'mask', value.version
+    if isinstance(value, DynamicMask):
+        return ('dynamic mask',) + value.key
+    if isinstance(value, Geometry):  # i.e. an AzimuthalIntegrator
+        return ('ai',) + engines.geometry_key(value)
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(map(fingerprint, value))
+    if isinstance(value, dict):
+        try:
+            return ('dict',) + tuple(sorted((key, fingerprint(item)) for key, item in value.items()))
+        except TypeError:
+            return _Unmatched()
+    try:
+        hash(value)
+    except TypeError:
+        return _Unmatched()
+    return ('object', type(value), id(value))
+
+
+class Memoized(object):
+    """
+    Replacement for a process's evaluate, which skips the evaluation when the process's inputs are unchanged.
+
+    Processes whose result depends on state other than their inputs list the names of those attributes in
+    `memoattrs`; they are fingerprinted along with the inputs.
+    """
+
+    def __init__(self, process):
+        self.process = process
+        self.evaluate = process.evaluate
+        self.key = None
+        self.outputs = None
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self):
+        process = self.process
+        return (tuple((name, fingerprint(input.value)) for name, input in process.inputs.items()) +
+                tuple((name, fingerprint(getattr(process, name, None))) for name in getattr(process, 'memoattrs', ())))
+
+    def __call__(self):
+        key = self.fingerprint()
+        if self.outputs is not None and key == self.key:
+            self.hits += 1
+            for name, value in self.outputs.items():
+                self.process.outputs[name].value = value
+            return
+
+        self.misses += 1
+        self.key = self.outputs = None  # if the evaluation fails, the next one isn't skipped
+        self.evaluate()
+        self.key = key
+        self.outputs = {name: output.value for name, output in self.process.outputs.items()}
+
+    def invalidate(self):
+        """
+        Forget the last evaluation, so that the next one isn't skipped.
+        """
+        self.key = self.outputs = None
+
+
+def memoize(process):
+    """
+    Memoize process's evaluate by its inputs (once; memoizing a process again has no effect). Returns the Memoized.
+    """
+    evaluate = process.evaluate
+    if isinstance(evaluate, Memoized):
+        return evaluate
+    process.evaluate = Memoized(process)
+    return process.evaluate
+
+
+def invalidate(process):
+    """
+    Forget process's last evaluation, if it is memoized.
+    """
+    if isinstance(process.evaluate, Memoized):
+        process.evaluate.invalidate()
@@ -0,0 +1,167 @@
+"""
+Process-parallel reduction of a series of frames.
+
+Frames are read by the parent process into a ring of blocks in shared memory; worker processes reduce a block at a time
+and write their profiles straight into preallocated shared output arrays at the block's frame indices, so results are
+in order without being pickled back. The geometry and the prebuilt integration engine are sent to each worker once, when
+the pool starts, rather than with every task.
+"""
+
+import copy
+import multiprocessing
+import os
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+from pyFAI import AzimuthalIntegrator
+
+from xicam.SAXS.processing import corrections, engines
+
+_worker = {}  # state of a worker process, set by _initialize
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _initialize(ai, engine, params, framespec, outputspecs):
+    if engine is not None:
+        engines.cache.put(engine)  # so the reduction finds the parent's engine instead of rebuilding it
+    _worker['ai'] = ai
+    _worker['params'] = params
+    _worker['memory'], _worker['frames'] = zip(*[_attach(spec) for spec in [framespec] + outputspecs])
+
+
+def _reduce(slot, start, stop, lo, hi):
+    # The slot holds frames lo:hi; those beyond start:stop are the neighbours the dynamic mask's stages depend on
+    ai, params = _worker['ai'], _worker['params']
+    block = _worker['frames'][0][slot, :hi - lo]
+    frames = block[start - lo:stop - lo]
+    Iq, Ichi, Ix, Iz = _worker['frames'][1:]
+    factors = params['normalization_factor'][start:stop]
+    dynamic = None
+    if params['dynamic_mask'] is not None:
+        dynamic = params['dynamic_mask'](block, context=(start - lo, hi - stop))
+
+    _, _, _, Iq[start:stop], Ichi[start:stop] = engines.bundle(ai, frames, params['npt_rad'], params['npt_azim'],
+                                                               unit=params['unit'],
+                                                               radial_range=params['radial_range'],
+                                                               azimuth_range=params['azimuth_range'],
+                                                               mask=params['mask'],
+                                                               polarization_factor=params['polarization_factor'],
+                                                               dark=params['dark'], flat=params['flat'],
+                                                               method=params['method'],
+                                                               normalization_factor=factors, flipud=True,
+                                                               dynamic_mask=dynamic)
+
+    corrected = corrections.correct(frames, dark=params['dark'], flat=params['flat'], mask=params['mask'])
+    if dynamic is not None:
+        corrected[dynamic] = 0
+    Ix[start:stop] = corrected.sum(axis=-2)
+    Iz[start:stop] = corrected.sum(axis=-1)[..., ::-1]
+    return slot
+
+
+def reduce_series(ai: AzimuthalIntegrator, data, npt_rad: int = 1000, npt_azim: int = 1000, unit='q_A^-1',
+                  radial_range=None, azimuth_range=None, mask=None, polarization_factor=None, dark=None, flat=None,
+                  method='splitbbox', normalization_factor=1., processes: int = None, chunksize: int = 16,
+                  context='spawn', cancelled=None, dynamic_mask=None):
+    """
+    Reduce a series of frames to I(q), I(chi), I(x) and I(z) on a pool of processes.
+
+    Parameters
+    ----------
+    ai: AzimuthalIntegrator
+        Geometry shared by all frames
+    data:
+        Sequence of frames (i.e. a header's lazy array); frames are read by this process as their block is reached
+    normalization_factor: float or np.ndarray
+        Monitor value, or one value per frame
+    processes: int
+        Number of worker processes; defaults to the number of CPUs
+    chunksize: int
+        Number of frames per task
+    context: str
+        multiprocessing start method; 'spawn' is safe to use from a GUI with running threads
+    cancelled: callable
+        Checked before each block is read; once it returns True the reduction stops, and None is returned
+    dynamic_mask: masking.dynamic.DynamicMask
+        Evaluated by the workers on each block (and the neighbouring frames it depends on, which are read into the
+        block's slot too), to mask pixels of each frame in addition to mask
+
+    Returns
+    -------
+    dict
+        q, chi, qx and qz axes, and the Iq, Ichi, Ix and Iz profiles, each with one row per frame
+
+    """
+    count = len(data)
+    first = np.asarray(data[0])
+    shape = first.shape
+    processes = processes or os.cpu_count()
+    slots = 2 * processes  # blocks in flight; bounds the shared memory to a few blocks regardless of the series length
+
+    # Build (or reuse) the engine here, so that workers receive it ready-made
+    engine = None
+    if method in engines.SPLITTING:
+        engine = engines.cache.engine(ai, shape, (npt_rad, npt_azim), unit=unit, radial_range=radial_range,
+                                      azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor,
+                                      method=method, flipud=True)
+    q, chi = (engine.radial, engine.azimuthal) if engine is not None else (None, None)
+    params = dict(npt_rad=npt_rad, npt_azim=npt_azim, unit=str(unit), radial_range=radial_range,
+                  azimuth_range=azimuth_range, mask=mask, polarization_factor=polarization_factor, dark=dark,
+                  flat=flat, method=method, dynamic_mask=dynamic_mask,
+                  normalization_factor=np.broadcast_to(np.asarray(normalization_factor, dtype=np.float32), (count,)))
+
+    padding = 2 * dynamic_mask.context if dynamic_mask is not None else 0  # neighbouring frames read with a block
+    specs = [((slots, chunksize + padding) + shape, first.dtype),
+             ((count, npt_rad), np.float32),
+             ((count, npt_azim), np.float32),
+             ((count, shape[1]), np.float32),
+             ((count, shape[0]), np.float32)]
+    memories = [shared_memory.SharedMemory(create=True, size=max(int(np.prod(specshape)) * np.dtype(dtype).itemsize, 1))
+                for specshape, dtype in specs]
+    try:
+        arrays = [np.ndarray(specshape, dtype=dtype, buffer=memory.buf)
+                  for memory, (specshape, dtype) in zip(memories, specs)]
+        frames, Iq, Ichi, Ix, Iz = arrays
+        names = [(memory.name, specshape, dtype) for memory, (specshape, dtype) in zip(memories, specs)]
+
+        pool = multiprocessing.get_context(context).Pool(processes, initializer=_initialize,
+                                                         initargs=(copy.deepcopy(ai), engine, params, names[0],
+                                                                   names[1:]))
+        try:
+            free = deque(range(slots))
+            pending = deque()
+            for start in range(0, count, chunksize):
+                if cancelled and cancelled(): return None
+                if not free:  # wait for the oldest block to finish, and reuse its slot
+                    free.append(pending.popleft().get())
+                slot = free.popleft()
+                stop = min(start + chunksize, count)
+                lo, hi = dynamic_mask.extent(start, stop, count) if dynamic_mask is not None else (start, stop)
+                for i in range(lo, hi):
+                    frames[slot, i - lo] = data[i]
+                pending.append(pool.apply_async(_reduce, (slot, start, stop, lo, hi)))
+            while pending:
+                pending.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+        if q is None:  # not a sparse method; take the axes from a reduction of the first frame
+            _, q, chi, _, _ = engines.bundle(ai, first, npt_rad, npt_azim, unit=unit, radial_range=radial_range,
+                                             azimuth_range=azimuth_range, mask=mask,
+                                             polarization_factor=polarization_factor, method=method, flipud=True)
+
+        return dict(q=q, Iq=Iq.copy(), chi=chi, Ichi=Ichi.copy(),
+                    qx=engines.maps.qx_axis(ai, shape), Ix=Ix.copy(),
+                    qz=engines.maps.qz_axis(ai, shape), Iz=Iz.copy())
+    finally:
+        arrays = frames = Iq = Ichi = Ix = Iz = None  # release the buffers before closing their memory
+        for memory in memories:
+            memory.close()
+            memory.unlink()
@@ -30,6 +30,7 @@ class QBackgroundFit(ProcessingPlugin):
     hints = [PlotHint(q, Iq), PlotHint(q, backgroundprofile), PlotHint(q, rawIq)]
 
     modelvars = {}
+    memoattrs = ('peakranges',)  # the excluded peak domains change the fit, though they aren't inputs
 
     def __init__(self):
         super(QBackgroundFit, self).__init__()
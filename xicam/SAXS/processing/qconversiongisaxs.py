@@ -1,6 +1,7 @@
 from xicam.plugins import ProcessingPlugin, Input, Output
 import numpy as np
 from pyFAI import AzimuthalIntegrator
+from xicam.SAXS.processing import engines
 
 
 class QconversionGISAXS(ProcessingPlugin):
@@ -11,16 +12,10 @@ class QconversionGISAXS(ProcessingPlugin):
     qz = Output(description='qz array with dimension of data', type=np.ndarray)
 
     def evaluate(self):
-        self.qx, self.qz = self.qconverion()
+        self.qx.value, self.qz.value = self.qconverion()
 
     def qconverion(self):
-        chi = self.integrator.chiArray()
-        twotheta = self.integrator.twoThetaArray()
-        # find alphai
-        alphai = self.integrator.getvalue('Wavelength')
-
-        # Doble check what is chi = 0
-        qx = 2 * np.pi / self.integrator.getvalue('Wavelength') * np.sin(twotheta) * np.sin(chi)
-        qz = 2 * np.pi / self.integrator.getvalue('Wavelength') * np.sin(twotheta) * np.cos(chi)
-
-        return qx, qz
+        # Shared, per-geometry maps; only recomputed when the geometry changes
+        ai = self.integrator.value
+        shape = self.data.value.shape[-2:] if self.data.value is not None else ai.detector.shape
+        return engines.maps.qx(ai, shape), engines.maps.qz(ai, shape)
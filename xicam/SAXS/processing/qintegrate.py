@@ -1,12 +1,14 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, PlotHint
 import numpy as np
 from pyFAI import AzimuthalIntegrator, units
+from xicam.SAXS.processing import engines
 
 
 class QIntegratePlugin(ProcessingPlugin):
     ai = Input(description='A PyFAI.AzimuthalIntegrator object',
                type=AzimuthalIntegrator)
-    data = Input(description='2d array representing intensity for each pixel',
+    data = Input(description='2d array representing intensity for each pixel, or a 3d stack of frames to be '
+                             'integrated at once',
                  type=np.ndarray)
     npt = Input(description='Number of bins along q', default=1000, type=int)
     polz_factor = Input(description='Polarization factor for correction',
@@ -34,23 +36,24 @@ class QIntegratePlugin(ProcessingPlugin):
                                  type=float, default=1.)
     q = Output(description='Q bin center positions',
                type=np.array)
-    Iq = Output(description='Binned/pixel-split integrated intensity',
+    Iq = Output(description='Binned/pixel-split integrated intensity; one row per frame when data is a stack',
                 type=np.array)
 
     hints = [PlotHint(q, Iq)]
 
     def evaluate(self):
-        self.q.value, self.Iq.value = self.ai.value.integrate1d(data=self.data.value,
-                                                                npt=self.npt.value,
-                                                                radial_range=self.radial_range.value,
-                                                                azimuth_range=self.azimuth_range.value,
-                                                                mask=self.mask.value,
-                                                                polarization_factor=self.polz_factor.value,
-                                                                dark=self.dark.value,
-                                                                flat=self.flat.value,
-                                                                method=self.method.value,
-                                                                unit=self.unit.value,
-                                                                normalization_factor=self.normalization_factor.value)
+        self.q.value, self.Iq.value = engines.integrate1d(self.ai.value,
+                                                          data=self.data.value,
+                                                          npt=self.npt.value,
+                                                          radial_range=self.radial_range.value,
+                                                          azimuth_range=self.azimuth_range.value,
+                                                          mask=self.mask.value,
+                                                          polarization_factor=self.polz_factor.value,
+                                                          dark=self.dark.value,
+                                                          flat=self.flat.value,
+                                                          method=self.method.value,
+                                                          unit=self.unit.value,
+                                                          normalization_factor=self.normalization_factor.value)
 
     def getCategory() -> str:
         return "Integrations"
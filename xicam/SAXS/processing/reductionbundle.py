@@ -0,0 +1,82 @@
+from xicam.plugins import ProcessingPlugin, Input, Output, PlotHint
+import numpy as np
+from pyFAI import AzimuthalIntegrator, units
+from xicam.SAXS.masking import dynamic
+from xicam.SAXS.processing import engines
+
+
+class ReductionBundlePlugin(ProcessingPlugin):
+    name = 'Reduction Bundle'
+
+    ai = Input(description='A PyFAI.AzimuthalIntegrator object',
+               type=AzimuthalIntegrator)
+    data = Input(description='2d array representing intensity for each pixel, or a 3d stack of frames',
+                 type=np.ndarray)
+    npt_rad = Input(description='Number of bins along q', default=1000, type=int)
+    npt_azim = Input(description='Number of bins along chi', default=1000, type=int)
+    polz_factor = Input(description='Polarization factor for correction',
+                        type=float, default=0)
+    unit = Input(description='Output units for q',
+                 type=[str, units.Unit],
+                 default="q_A^-1")
+    radial_range = Input(description='The lower and upper range of the radial unit. If not provided, range is simply '
+                                     '(data.min(), data.max()). Values outside the range are ignored.',
+                         type=tuple)
+    azimuth_range = Input(description='The lower and upper range of the azimuthal angle in degree. If not provided, '
+                                      'range is simply (data.min(), data.max()). Values outside the range are ignored.',
+                          type=tuple)
+    mask = Input(description='Array (same size as image) with 1 for masked pixels, and 0 for valid pixels',
+                 type=np.ndarray)
+    dynamic_mask = Input(description='DynamicMask (see masking.dynamic) evaluated on data, or its evaluation: an array '
+                                     '(same shape as data) with 1 for pixels masked in that frame only, in addition '
+                                     'to mask',
+                         type=object)
+    dark = Input(description='Dark noise image',
+                 type=np.ndarray)
+    flat = Input(description='Flat field image',
+                 type=np.ndarray)
+    method = Input(description='Can be "numpy", "cython", "BBox" or "splitpixel", "lut", "csr", "nosplit_csr", '
+                               '"full_csr", "lut_ocl" and "csr_ocl" if you want to go on GPU. To Specify the device: '
+                               '"csr_ocl_1,2"',
+                   type=str, default='splitbbox')
+    normalization_factor = Input(description='Value of a normalization monitor',
+                                 type=float, default=1.)
+    q = Output(description='Q bin center positions',
+               type=np.array)
+    Iq = Output(description='Integrated intensity along q',
+                type=np.array)
+    chi = Output(description='Chi bin center positions',
+                 type=np.array)
+    Ichi = Output(description='Integrated intensity along chi, within the radial range',
+                  type=np.array)
+    cake = Output(description='Binned/pixel-split intensity in q and chi; only produced for single frames',
+                  type=np.array)
+
+    hints = [PlotHint(q, Iq), PlotHint(chi, Ichi)]
+
+    def __init__(self):
+        # The stage is in both the reduce and display workflows; each gets its own hints, as hints are parented to the
+        # instance they belong to
+        self.hints = [PlotHint(hint.x, hint.y) for hint in ReductionBundlePlugin.hints]
+        super(ReductionBundlePlugin, self).__init__()
+
+    def evaluate(self):
+        self.cake.value, self.q.value, self.chi.value, self.Iq.value, self.Ichi.value = \
+            engines.bundle(self.ai.value,
+                           data=self.data.value,
+                           npt_rad=self.npt_rad.value,
+                           npt_azim=self.npt_azim.value,
+                           radial_range=self.radial_range.value,
+                           azimuth_range=self.azimuth_range.value,
+                           mask=self.mask.value,
+                           polarization_factor=self.polz_factor.value,
+                           dark=self.dark.value,
+                           flat=self.flat.value,
+                           method=self.method.value,
+                           unit=self.unit.value,
+                           normalization_factor=self.normalization_factor.value,
+                           flipud=True,
+                           dynamic_mask=dynamic.evaluate(self.dynamic_mask.value, self.data.value))
+
+    def getCategory() -> str:
+        return "Integrations"
@@ -1,34 +1,38 @@
 from xicam.plugins import ProcessingPlugin, Input, Output
 import numpy as np
-import pyFAI
-import hipies
+from pyFAI import AzimuthalIntegrator
+from xicam.SAXS.processing import engines
 
 
 class ImageRemap(ProcessingPlugin):
     name = 'Remesh'
 
-    data = Input(description='Detector image', type=np.ndarray)
-    geometry = InOut(description='pyFAI Geometry', type=pyFAI.geometry.Geometry)
-    alphai = Input(description='GISAXS angle of incedence', type=float)
-    out_range = Input(description='Coordinates of output image', type=list, default=None)
-    resolution = Input(description='Resolution of output image', type=list, default=None)
-    coord_sys = Input(description='Choice of coordinate system for output image', 
-        type=str, default='qp_qz')
+    ai = Input(description='A PyFAI.AzimuthalIntegrator object',
+               type=AzimuthalIntegrator)
+    data = Input(description='Detector image, or a 3d stack of images', type=np.ndarray)
+    mask = Input(description='Array (same size as image) with 1 for masked pixels, and 0 for valid pixels',
+                 type=np.ndarray)
+    alphai = Input(description='GISAXS angle of incidence, in degrees', type=float, default=0.)
+    out_range = Input(description='Coordinates of output image, as [[x_min, x_max], [y_min, y_max]]', type=list,
+                      default=None)
+    resolution = Input(description='Resolution of output image, as [columns, rows]', type=list, default=None)
+    coord_sys = Input(description='Choice of coordinate system for output image; "qp_qz", "qy_qz" or "theta_alpha"',
+                      type=str, default='qp_qz')
 
-
-    qImage = Output(description='Remapped image', type=np.ndarray)
-    xcrd = Output(description='X-coordinates output image', type=np.ndarray)
-    ycrd = Output(description='Y-coordinates output image', type=np.ndarray)
-    #hints = [ ]
+    remesh = Output(description='Remapped image', type=np.ndarray)
+    xcrd = Output(description='X-coordinates of the output image columns', type=np.ndarray)
+    ycrd = Output(description='Y-coordinates of the output image rows', type=np.ndarray)
 
     def evaluate(self):
-        I, x, y = hipies.remesh(self.Image.value, self.geometry.value, self.alphai.value,
-                    out_range = self.out_range.value, res = self.resolution.value,
-                    coord_sys = self.coord_sys.value)
-        self.qImage.value = I
-        dist = self.geometry.value._dist
-        centerX = np.unravel_index(x.abs().argmin(), x.shape)[1]
-        centerY = np.unravel_index(y.abs().argmin(), y.shape)[0]
-        pixel = [self.geometry.value.get_pixel1(), self.geometry.value.get_pixel2()]
-        center = [ centerX * pixel[0], centerY * pixel[1])
-        geometry.value.setFit2D(self.geometry.value._dist, center[0], center[1])
+        # The pixel to (x, y) resampling matrix is cached per geometry, incidence angle and output grid
+        self.remesh.value, self.xcrd.value, self.ycrd.value = engines.remesh(self.ai.value,
+                                                                             self.data.value,
+                                                                             alphai=self.alphai.value,
+                                                                             out_range=self.out_range.value,
+                                                                             resolution=self.resolution.value,
+                                                                             coord_sys=self.coord_sys.value,
+                                                                             mask=self.mask.value,
+                                                                             flipud=True)
+
+    def getCategory() -> str:
+        return "Remeshing"
@@ -0,0 +1,64 @@
+"""
+Derived representations of a reduced I(q): Guinier, Porod, Kratky and I*q^n plots, and the correlation and pair
+distribution functions.
+
+Each representation is a vectorized transform of (q, I) into plot axes. I may be a single profile or an (N, npt)
+series of profiles sharing q, so switching representations costs a few array operations rather than a reintegration.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from xicam.SAXS.processing import correlation
+
+
+def guinier(q: np.ndarray, I: np.ndarray):
+    """
+    ln(I) against q^2; non-positive intensities are NaN.
+    """
+    I = np.asarray(I)
+    lnI = np.full(I.shape, np.nan, dtype=np.result_type(I.dtype, np.float32))
+    np.log(I, out=lnI, where=I > 0)
+    return np.square(q), lnI
+
+
+def porod(q: np.ndarray, I: np.ndarray):
+    """
+    I*q^4 against q^4; linear, with the Porod constant as intercept and the background as slope.
+    """
+    q4 = np.power(q, 4)
+    return q4, I * q4
+
+
+def power(n: int):
+    """
+    Build the representation I*q^n against q (i.e. n=2 is the Kratky plot).
+    """
+
+    def _power(q: np.ndarray, I: np.ndarray):
+        return q, I * np.power(q, n)
+
+    _power.__doc__ = 'I*q^{} against q.'.format(n)
+    return _power
+
+
+kratky = power(2)
+
+# Representations by key: (plot title, x label, y label, transform)
+REPRESENTATIONS = OrderedDict([
+    ('guinier', ('Guinier', 'q² (Å⁻²)', 'ln(I)', guinier)),
+    ('porod', ('Porod', 'q⁴ (Å⁻⁴)', 'I×q⁴', porod)),
+    ('iq2', ('I×q²', 'q (Å⁻¹)', 'I×q²', kratky)),
+    ('iq3', ('I×q³', 'q (Å⁻¹)', 'I×q³', power(3))),
+    ('iq4', ('I×q⁴', 'q (Å⁻¹)', 'I×q⁴', power(4))),
+    ('gamma', ('Correlation Function', 'r (Å)', 'γ(r)', correlation.correlation_function)),
+    ('pr', ('Pair Distribution Function', 'r (Å)', 'p(r)', correlation.pair_distribution)),
+])
+
+
+def represent(key: str, q: np.ndarray, I: np.ndarray):
+    """
+    Apply the representation named key to a profile or series of profiles; returns the (x, y) plot axes.
+    """
+    return REPRESENTATIONS[key][3](np.asarray(q), I)
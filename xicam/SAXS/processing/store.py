@@ -0,0 +1,219 @@
+"""
+Two-tier store of reduced results.
+
+Reduced curves are kept in a byte-bounded in-memory LRU, and written through to .npz files in a '.xicam' directory
+next to the data. Results are keyed by the identity of the frames (their paths, sizes and modification times), the
+reduction workflow's parameters, the geometry and the mask; so revisiting a frame, or reopening a dataset in a later
+session, shows its curves without reading or reducing the raw frames again.
+
+Curves which are memory-mapped .npy files (i.e. the rows of a streamed reduction, see stream_location) are already on
+disk: they are stored by reference to their files, which are mapped again when loaded, and don't count against the
+memory tier's budget.
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from xicam.SAXS.processing import engines, memoize
+
+VERSION = 1  # bump when the stored format, or the meaning of a reduction, changes
+
+
+def frame_key(header, index=None):
+    """
+    Identity of a header's frames (or of its frame at index) which is stable across sessions: the path, size and
+    modification time of each file. Headers without paths fall back to their uid, which only lasts a session.
+    """
+    paths = list(header.startdoc.get('paths') or [])
+    if index is not None and len(paths) > 1:
+        paths = [paths[index]]
+    try:
+        identity = tuple((os.path.abspath(path), os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths)
+    except (OSError, TypeError):
+        identity = ()
+    if not identity:
+        identity = (header.startdoc.get('uid'),)
+    return identity + (index,)
+
+
+def workflow_key(workflow, exclude=('data', 'ai', 'mask', 'dynamic_mask')):
+    """
+    Fingerprint of a workflow's parameters: each process's inputs, except those fed by an earlier process or by the
+    execution's arguments (named in exclude), and the attributes it lists in memoattrs (see memoize.Memoized).
+    """
+    fed = set(exclude)
+    key = []
+    for process in workflow.processes:
+        key.append((type(process).__name__,
+                    tuple((name, memoize.fingerprint(input.value)) for name, input in process.inputs.items()
+                          if name not in fed),
+                    tuple((name, memoize.fingerprint(getattr(process, name, None)))
+                          for name in getattr(process, 'memoattrs', ()))))
+        fed.update(process.outputs.keys())
+    return tuple(key)
+
+
+def result_key(frames, workflow, ai, mask, *extra):
+    """
+    Key of a reduction of frames (see frame_key) by workflow, with the geometry ai and mask.
+    """
+    return (VERSION, frames, workflow_key(workflow), engines.geometry_key(ai), engines.array_key(mask)) + extra
+
+
+def location(header):
+    """
+    Where a header's results are stored on disk: '.xicam' beside its first file, or a temporary directory if that isn't
+    writable (or the header has no files).
+    """
+    paths = header.startdoc.get('paths') or []
+    if paths:
+        path = os.path.join(os.path.dirname(os.path.abspath(paths[0])), '.xicam')
+        try:
+            os.makedirs(path, exist_ok=True)
+            if os.access(path, os.W_OK):
+                return path
+        except OSError:
+            pass
+    return os.path.join(tempfile.gettempdir(), 'xicam-saxs')
+
+
+def stream_location(key, directory):
+    """
+    Where a reduction streamed to disk (see streaming.reduce_stream) under key writes its rows: a directory in directory
+    (see location) named by the key. So reducing again reuses it, rather than leaving another copy of the rows behind.
+    It is emptied first; an earlier reduction's rows that are still memory-mapped stay readable (their files are
+    unlinked, not overwritten).
+    """
+    path = os.path.join(directory, ResultStore.digest(key) + '.stream')
+    shutil.rmtree(path, ignore_errors=True)
+    return path
+
+
+def _mapped(value):
+    # The path of a whole .npy file memory-mapped by value, or None; slices of a map are mapped by their parent
+    if isinstance(value, np.memmap) and isinstance(value.base, mmap.mmap) and str(value.filename).endswith('.npy'):
+        return value.filename
+
+
+def _nbytes(curves):
+    return sum(np.asarray(value).nbytes for _, values in curves for value in values if not isinstance(value, np.memmap))
+
+
+def _save(path, curves):
+    arrays, references = {}, {}
+    for i, (_, values) in enumerate(curves):
+        for j, value in enumerate(values):
+            if _mapped(value):
+                references['{}.{}'.format(i, j)] = os.path.relpath(_mapped(value), os.path.dirname(path))
+            else:
+                arrays['{}.{}'.format(i, j)] = np.asarray(value)
+    if not all(array.dtype.kind in 'biufc' for array in arrays.values()):  # i.e. a fitted model; keep it in memory
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.{}.tmp'.format(os.getpid())
+    with open(temporary, 'wb') as file:  # written aside and renamed, so a reader never sees a partial file
+        np.savez(file, names=np.array([name for name, _ in curves]),
+                 counts=np.array([len(values) for _, values in curves]),
+                 references=np.array(sorted(references.items()), dtype=str).reshape(-1, 2), **arrays)
+    os.replace(temporary, path)
+    return True
+
+
+def _load(path):
+    with np.load(path) as file:
+        references = dict(file['references']) if 'references' in file else {}
+
+        def value(name):
+            if name in references:
+                return np.load(os.path.join(os.path.dirname(path), references[name]), mmap_mode='r')
+            return file[name]
+
+        return [(str(name), [value('{}.{}'.format(i, j)) for j in range(count)])
+                for i, (name, count) in enumerate(zip(file['names'], file['counts']))]
+
+
+class ResultStore(object):
+    """
+    A thread-safe LRU of reduced curves, bounded in bytes, backed by .npz files on disk.
+
+    Curves are lists of (name, [x, y]) as plotted by SAXSSpectra.plot_series; y may have one row per frame.
+    """
+
+    def __init__(self, maxbytes=512 * 2 ** 20):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key, directory=None):
+        """
+        Get the curves stored under key, from memory or else from directory; returns None if there are none.
+        """
+        digest = self.digest(key)
+        with self._lock:
+            if digest in self._results:
+                self._results.move_to_end(digest)
+                self.hits += 1
+                return self._results[digest][0]
+
+        if directory is not None:
+            try:
+                curves = _load(os.path.join(directory, digest + '.npz'))
+            except (OSError, KeyError, ValueError):
+                pass
+            else:
+                self._remember(digest, curves)
+                with self._lock:
+                    self.hits += 1
+                return curves
+
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, curves, directory=None):
+        """
+        Store curves under key, in memory and, if directory is given, on disk.
+        """
+        digest = self.digest(key)
+        self._remember(digest, curves)
+        if directory is not None:
+            try:
+                _save(os.path.join(directory, digest + '.npz'), curves)
+            except OSError:
+                pass  # the disk tier is only a cache
+
+    def _remember(self, digest, curves):
+        nbytes = _nbytes(curves)
+        with self._lock:
+            if digest in self._results:
+                self.nbytes -= self._results.pop(digest)[1]
+            if nbytes > self.maxbytes:  # too large to keep in memory; only on disk
+                return
+            self._results[digest] = curves, nbytes
+            self.nbytes += nbytes
+            while self.nbytes > self.maxbytes:
+                self.nbytes -= self._results.popitem(last=False)[1][1]
+
+    def clear(self):
+        """
+        Forget all results in memory (those on disk are kept).
+        """
+        with self._lock:
+            self._results.clear()
+            self.nbytes = 0
+
+
+results = ResultStore()
@@ -0,0 +1,148 @@
+"""
+Bounded-memory streaming reduction of long series.
+
+Frames are pulled from the series a chunk at a time into a reused buffer, reduced (to the same I(q), I(chi), I(x) and
+I(z) profiles as parallel.reduce_series), and their profiles appended to .npy files on disk; only one chunk of frames and one chunk of profiles are held in memory, however long the series is.
+"""
+
+import os
+import struct
+
+import numpy as np
+from pyFAI import AzimuthalIntegrator
+
+from xicam.SAXS.processing import corrections, engines
+
+
+class AppendableArray(object):
+    """
+    An .npy file which grows along its first axis as rows are appended.
+
+    The header is rewritten in place after each append, so the file is a valid .npy (i.e. for np.load with
+    mmap_mode='r') at all times.
+    """
+
+    HEADERSIZE = 256  # fixed, so the shape can grow without moving the data
+
+    def __init__(self, path, rowshape=None, dtype=np.float32):
+        self.path = path
+        if rowshape is None:  # reopen an existing array to append to it
+            with open(path, 'rb') as file:
+                np.lib.format.read_magic(file)
+                shape, _, dtype = np.lib.format.read_array_header_1_0(file)
+            self.rowshape, self.dtype, self.length = tuple(shape[1:]), np.dtype(dtype), shape[0]
+            self._file = open(path, 'r+b')
+        else:
+            self.rowshape, self.dtype, self.length = tuple(rowshape), np.dtype(dtype), 0
+            self._file = open(path, 'w+b')
+            self._writeheader()
+
+    def _writeheader(self):
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+            self.dtype.str, (self.length,) + self.rowshape)
+        header = header.ljust(self.HEADERSIZE - 10 - 1) + '\n'
+        self._file.seek(0)
+        self._file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+    def append(self, rows: np.ndarray):
+        """
+        Append a row, or an array of rows, to the end of the array.
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape((-1,) + self.rowshape)
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(rows.data)
+        self.length += len(rows)
+        self._writeheader()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def read(self):
+        """
+        A read-only memory map of the rows written so far.
+        """
+        self.flush()
+        return np.load(self.path, mmap_mode='r')
+
+    def __len__(self):
+        return self.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def reduce_stream(ai: AzimuthalIntegrator, data, directory, npt_rad: int = 1000, npt_azim: int = 1000,
+                  unit='q_A^-1', radial_range=None, azimuth_range=None, mask=None, polarization_factor=None, dark=None,
+                  flat=None, method='splitbbox', normalization_factor=1., chunksize: int = 16, callback=None,
+                  cancelled=None, dynamic_mask=None):
+    """
+    Reduce a series chunk by chunk, appending I(q), I(chi), I(x) and I(z) rows to Iq.npy, Ichi.npy, Ix.npy and Iz.npy
+    in directory.
+
+    Parameters
+    ----------
+    data:
+        Sequence of frames (i.e. a header's lazy array); only one chunk of frames is read at a time
+    directory: str
+        Where the q.npy, chi.npy, qx.npy and qz.npy axes, and the profiles' rows are written
+    normalization_factor: float or np.ndarray
+        Monitor value, or one value per frame
+    callback: callable
+        Called with the number of frames reduced so far after each chunk
+    cancelled: callable
+        Checked before each chunk; once it returns True the reduction stops, and None is returned
+    dynamic_mask: masking.dynamic.DynamicMask
+        Evaluated on each chunk (and the neighbouring frames it depends on), to mask pixels of each frame in addition to
+        mask
+
+    Returns
+    -------
+    dict
+        The q, chi, qx and qz axes, and read-only memory maps of the Iq, Ichi, Ix and Iz rows
+
+    """
+    count = len(data)
+    first = np.asarray(data[0])
+    factors = np.broadcast_to(np.asarray(normalization_factor, dtype=np.float32), (count,))
+    buffer = np.empty((min(chunksize, count),) + first.shape, dtype=first.dtype)
+
+    os.makedirs(directory, exist_ok=True)
+    with AppendableArray(os.path.join(directory, 'Iq.npy'), (npt_rad,)) as Iq, \
+            AppendableArray(os.path.join(directory, 'Ichi.npy'), (npt_azim,)) as Ichi, \
+            AppendableArray(os.path.join(directory, 'Ix.npy'), (first.shape[1],)) as Ix, \
+            AppendableArray(os.path.join(directory, 'Iz.npy'), (first.shape[0],)) as Iz:
+        for start in range(0, count, chunksize):
+            if cancelled and cancelled(): return None
+            stop = min(start + chunksize, count)
+            frames = buffer[:stop - start]
+            for i in range(start, stop):
+                frames[i - start] = data[i]
+
+            framemasks = dynamic_mask.chunk(data, start, stop, frames) if dynamic_mask is not None else None
+            _, q, chi, Iqchunk, Ichichunk = engines.bundle(ai, frames, npt_rad, npt_azim, unit=unit,
+                                                           radial_range=radial_range, azimuth_range=azimuth_range,
+                                                           mask=mask, polarization_factor=polarization_factor,
+                                                           dark=dark, flat=flat, method=method,
+                                                           normalization_factor=factors[start:stop], flipud=True,
+                                                           dynamic_mask=framemasks)
+            Iq.append(Iqchunk)
+            Ichi.append(Ichichunk)
+
+            corrected = corrections.correct(frames, dark=dark, flat=flat, mask=mask)
+            if framemasks is not None:
+                corrected[framemasks] = 0
+            Ix.append(corrected.sum(axis=-2))
+            Iz.append(corrected.sum(axis=-1)[..., ::-1])
+            if callback: callback(stop)
+
+    axes = dict(q=q, chi=chi, qx=engines.maps.qx_axis(ai, first.shape), qz=engines.maps.qz_axis(ai, first.shape))
+    for name, axis in axes.items():
+        np.save(os.path.join(directory, name + '.npy'), axis)
+    return dict(axes, **{name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+                         for name in ('Iq', 'Ichi', 'Ix', 'Iz')})
@@ -1,30 +1,165 @@
+import itertools
+
+import numpy as np
 from xicam.core.execution.workflow import Workflow
 from xicam.SAXS.processing.arrayrotate import ArrayRotate
 from xicam.SAXS.processing.arraytranspose import ArrayTranspose
-from .qintegrate import QIntegratePlugin
-from .chiintegrate import ChiIntegratePlugin
+from . import memoize, parallel, streaming
+from .reductionbundle import ReductionBundlePlugin
+from .remesh import ImageRemap
 from .xintegrate import XIntegratePlugin
 from .zintegrate import ZIntegratePlugin
-from .cakeintegrate import CakeIntegratePlugin
 
 
-class ReduceWorkflow(Workflow):
+class MemoizedWorkflow(Workflow):
+    """
+    A Workflow whose processes are memoized by their inputs; re-executing it only evaluates the processes whose inputs
+    changed since their last evaluation, and those downstream of them.
+    """
+
+    def update(self):
+        # Called whenever processes are added, removed or replaced; memoize any new ones
+        for process in self._processes:
+            memoize.memoize(process)
+        super(MemoizedWorkflow, self).update()
+
+    def invalidate(self):
+        """
+        Forget all processes' last evaluations, so that the next execution evaluates every process.
+        """
+        for process in self._processes:
+            memoize.invalidate(process)
+
+
+class ReduceWorkflow(MemoizedWorkflow):
     def __init__(self):
         super(ReduceWorkflow, self).__init__('Reduce')
 
-        self.qintegrate = QIntegratePlugin()
-        self.chiintegrate = ChiIntegratePlugin()
+        # q, chi (and cake) integrations share a single histogram of each frame
+        self.bundle = ReductionBundlePlugin()
+        self.qintegrate = self.chiintegrate = self.bundle  # the integrations the bundle replaced
         self.xintegrate = XIntegratePlugin()
         self.zintegrate = ZIntegratePlugin()
 
-        self.processes = [self.qintegrate, self.chiintegrate, self.xintegrate, self.zintegrate]
+        self.processes = [self.bundle, self.xintegrate, self.zintegrate]
         self.autoConnectAll()
 
+    def reduces_only(self) -> bool:
+        """
+        Whether the workflow's (enabled) processes are just its own integrations, which execute_parallel and
+        execute_streaming compute without executing the workflow; processes added by the user need execute_stack.
+        """
+        return list(self.processes) == [self.bundle, self.xintegrate, self.zintegrate]
+
+    def execute_stack(self, connection, data, ai, mask=None, chunksize=16, cancelled=None, dynamic_mask=None,
+                      **kwargs):
+        """
+        Execute this workflow over a series of frames, a block of frames at a time.
+
+        Each block is stacked into an (N, rows, columns) array and sent through the workflow once, so that the
+        integrations apply their sparse matrices to the whole block in a single product. The callback_slot receives
+        one result per block, with a leading frame axis on each intensity output.
+
+        Parameters
+        ----------
+        data:
+            Sequence of frames (i.e. a header's lazy array); frames are only read as their block is reached
+        ai: AzimuthalIntegrator
+            Geometry shared by all frames
+        mask: np.ndarray
+            Mask shared by all frames
+        chunksize: int
+            Maximum number of frames per block
+        cancelled: callable
+            Checked before each block is read; once it returns True, no more blocks are executed
+        dynamic_mask: masking.dynamic.DynamicMask
+            Evaluated on each block (and the neighbouring frames it depends on), to mask pixels of each frame in
+            addition to mask
+
+        Returns
+        -------
+        QThreadFuture
+            As returned by execute_all
+
+        """
+        starts = range(0, len(data), chunksize)
+        blocks = (np.stack([data[i] for i in range(start, min(start + chunksize, len(data)))]) for start in starts
+                  if not (cancelled and cancelled()))
+        if dynamic_mask is None:  # still given, so that the last execution's dynamic masks aren't kept
+            return self.execute_all(connection, data=blocks, ai=[ai] * len(starts), mask=[mask] * len(starts),
+                                    dynamic_mask=[None] * len(starts), **kwargs)
+
+        # Each block's masks are evaluated as the block is read; a new array per block, as the processes keep inputs
+        blocks, masked = itertools.tee((block, dynamic_mask.chunk(data, start, start + len(block), block,
+                                                                  out=np.empty(block.shape, dtype=np.bool_)))
+                                       for start, block in zip(starts, blocks))
+        return self.execute_all(connection, data=(block for block, _ in blocks), ai=[ai] * len(starts),
+                                mask=[mask] * len(starts), dynamic_mask=(masks for _, masks in masked), **kwargs)
 
-class DisplayWorkflow(Workflow):
+    def execute_parallel(self, data, ai, mask=None, processes=None, chunksize=16, cancelled=None, dynamic_mask=None):
+        """
+        Reduce a series of frames on a pool of processes, with this workflow's reduction parameters.
+
+        Unlike execute_stack, this blocks until the whole series is reduced, and returns all profiles at once; see
+        parallel.reduce_series. Only the workflow's own integrations are computed (see reduces_only).
+
+        Returns
+        -------
+        dict
+            q, chi, qx and qz axes, and the Iq, Ichi, Ix and Iz profiles, each with one row per frame
+
+        """
+        bundle = self.bundle
+        return parallel.reduce_series(ai, data, npt_rad=bundle.npt_rad.value, npt_azim=bundle.npt_azim.value,
+                                      unit=bundle.unit.value, radial_range=bundle.radial_range.value,
+                                      azimuth_range=bundle.azimuth_range.value, mask=mask,
+                                      polarization_factor=bundle.polz_factor.value, dark=bundle.dark.value,
+                                      flat=bundle.flat.value, method=bundle.method.value,
+                                      normalization_factor=bundle.normalization_factor.value, processes=processes,
+                                      chunksize=chunksize, cancelled=cancelled, dynamic_mask=dynamic_mask)
+
+    def execute_streaming(self, data, ai, directory, mask=None, chunksize=16, callback=None, cancelled=None,
+                          dynamic_mask=None):
+        """
+        Reduce a series of any length with bounded memory, appending I(q), I(chi), I(x) and I(z) rows to .npy files in
+        directory.
+
+        Blocks until the series is reduced; see streaming.reduce_stream. Only the workflow's own integrations are
+        computed (see reduces_only).
+
+        Returns
+        -------
+        dict
+            The q, chi, qx and qz axes, and read-only memory maps of the Iq, Ichi, Ix and Iz rows
+
+        """
+        bundle = self.bundle
+        return streaming.reduce_stream(ai, data, directory, npt_rad=bundle.npt_rad.value,
+                                       npt_azim=bundle.npt_azim.value, unit=bundle.unit.value,
+                                       radial_range=bundle.radial_range.value,
+                                       azimuth_range=bundle.azimuth_range.value, mask=mask,
+                                       polarization_factor=bundle.polz_factor.value, dark=bundle.dark.value,
+                                       flat=bundle.flat.value, method=bundle.method.value,
+                                       normalization_factor=bundle.normalization_factor.value, chunksize=chunksize,
+                                       callback=callback, cancelled=cancelled, dynamic_mask=dynamic_mask)
+
+
+class DisplayWorkflow(MemoizedWorkflow):
     def __init__(self):
         super(DisplayWorkflow, self).__init__('Display')
 
-        self.cake = CakeIntegratePlugin()
-        self.processes = [self.cake]
+        # Same stage as the reduction, so displaying a frame that was just reduced reuses its histogram
+        self.cake = ReductionBundlePlugin()
+        self.cake.hints = []  # its profiles are the reduction's; only the cake is displayed, so none are plotted twice
+        # Resampling matrix is cached per geometry, so remeshing each displayed frame is a single sparse product
+        self.remesh = ImageRemap()
+        self.processes = [self.cake, self.remesh]
         self.autoConnectAll()
+        self.setRemeshing(False)
+
+    def setRemeshing(self, enabled: bool):
+        """
+        Enable or disable the remesh process; it only needs to run while the remeshed image is shown.
+        """
+        if self.remesh.disabled == enabled:
+            self.toggleDisableProcess(self.remesh, autoconnectall=True)
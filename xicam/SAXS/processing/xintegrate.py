@@ -1,6 +1,8 @@
 from xicam.plugins import ProcessingPlugin, Input, Output, PlotHint
 import numpy as np
 from pyFAI import AzimuthalIntegrator, units
+from xicam.SAXS.masking import dynamic
+from xicam.SAXS.processing import corrections, engines
 
 
 class XIntegratePlugin(ProcessingPlugin):
@@ -11,6 +13,10 @@ class XIntegratePlugin(ProcessingPlugin):
                  type=np.ndarray)
     mask = Input(description='Array (same size as image) with 1 for masked pixels, and 0 for valid pixels',
                  type=np.ndarray)
+    dynamic_mask = Input(description='DynamicMask (see masking.dynamic) evaluated on data, or its evaluation: an array '
+                                     '(same shape as data) with 1 for pixels masked in that frame only, in addition '
+                                     'to mask',
+                         type=object)
     dark = Input(description='Dark noise image',
                  type=np.ndarray)
     flat = Input(description='Flat field image',
@@ -25,16 +31,13 @@ class XIntegratePlugin(ProcessingPlugin):
     hints = [PlotHint(qx, Ix)]
 
     def evaluate(self):
-        if self.dark.value is None: self.dark.value = np.zeros_like(self.data.value)
-        if self.flat.value is None: self.flat.value = np.ones_like(self.data.value)
-        if self.mask.value is None: self.mask.value = np.zeros_like(self.data.value)
-        self.Ix.value = np.sum((self.data.value - self.dark.value) * np.average(self.flat.value - self.dark.value) / (
-                self.flat.value - self.dark.value) * np.logical_not(self.mask.value), axis=0)
-        centerx = self.ai.value.getFit2D()['centerX']
-        centerz = self.ai.value.getFit2D()['centerY']
-        self.qx.value = self.ai.value.qFunction(np.array([centerz] * self.data.value.shape[1]),
-                                                np.arange(0, self.data.value.shape[1])) / 10.
-        self.qx.value[np.arange(0, self.data.value.shape[1]) < centerx] *= -1.
+        corrected = corrections.correct(self.data.value, dark=self.dark.value, flat=self.flat.value,
+                                        mask=self.mask.value)
+        dynamic_mask = dynamic.evaluate(self.dynamic_mask.value, self.data.value)
+        if dynamic_mask is not None:
+            corrected[np.asarray(dynamic_mask, dtype=np.bool_)] = 0
+        self.Ix.value = np.sum(corrected, axis=-2)
+        self.qx.value = engines.maps.qx_axis(self.ai.value, self.data.value.shape)
 
     def getCategory() -> str:
         return "Integrations"
@@ -0,0 +1,128 @@
+"""
+Latest-wins scheduling of the GUI's workflow executions.
+
+Timeline scrubbing, header, geometry and mask changes each request a display, reduction or simulation of the current
+state. Rather than executing each request, a stage keeps only its latest request: requests made while a job of the stage
+is in flight replace each other, and cancel the in-flight job, whose results are then dropped. One job runs per stage,
+and stages start in order of priority, so a stale reduction never delays the display of the current frame.
+"""
+
+import threading
+
+
+class Ticket(object):
+    """
+    Handle of a scheduled job; cancelled once a newer request for its stage is made.
+    """
+
+    def __init__(self, scheduler, stage):
+        self.scheduler = scheduler
+        self.stage = stage
+        self.cancelled = False
+        self.finished = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def done(self, *args):
+        """
+        Mark the job finished, so the next job can start; may be used directly as a finished_slot.
+        """
+        if not self.finished:
+            self.finished = True
+            self.scheduler._finish(self)
+
+    def guard(self, slot):
+        """
+        Wrap slot (i.e. a callback_slot) so that it is skipped once this job is cancelled.
+        """
+
+        def _guarded(*args, **kwargs):
+            if not self.cancelled:
+                return slot(*args, **kwargs)
+
+        return _guarded
+
+
+class Scheduler(object):
+    """
+    Runs at most one job per stage, keeping only the latest request per stage.
+
+    Parameters
+    ----------
+    stages: tuple
+        Stage names, highest priority first; a stage's job only starts once no job of a higher priority stage is waiting
+        or running
+
+    """
+
+    def __init__(self, stages=('display', 'reduce', 'simulate')):
+        self.stages = tuple(stages)
+        self._pending = {}  # stage -> latest requested job
+        self._running = {}  # stage -> Ticket of the job in flight
+        self._lock = threading.RLock()
+
+    def submit(self, stage, job):
+        """
+        Request job for stage, replacing any job of the stage which hasn't started, and cancelling the one in flight.
+
+        job is called with its Ticket when it starts. If it starts asynchronous work it returns that work (i.e. a
+        QThreadFuture), and calls ticket.done when the work finishes; if it returns None it is finished immediately.
+        Work with a finished signal (a QThread's) also releases the ticket when that signal fires, which it does even if
+        the work fails, when the work's finished_slot isn't called.
+        """
+        with self._lock:
+            self._pending[stage] = job
+            if stage in self._running:
+                self._running[stage].cancel()
+        self._dispatch()
+
+    def cancel(self, stage=None):
+        """
+        Drop the waiting jobs of stage (or of all stages), and cancel those in flight.
+        """
+        with self._lock:
+            for name in self.stages if stage is None else (stage,):
+                self._pending.pop(name, None)
+                if name in self._running:
+                    self._running[name].cancel()
+
+    def busy(self, stage=None):
+        """
+        Whether a job of stage (or of any stage) is waiting or running.
+        """
+        with self._lock:
+            names = self.stages if stage is None else (stage,)
+            return any(name in self._pending or name in self._running for name in names)
+
+    def _finish(self, ticket):
+        with self._lock:
+            if self._running.get(ticket.stage) is ticket:
+                del self._running[ticket.stage]
+        self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            for stage in self.stages:
+                if stage in self._running:
+                    return  # wait for it; lower priority stages wait too
+                if stage in self._pending:
+                    job = self._pending.pop(stage)
+                    ticket = self._running[stage] = Ticket(self, stage)
+                    break
+            else:
+                return
+
+        try:
+            work = job(ticket)
+        except Exception:
+            ticket.done()
+            raise
+        if work is None:
+            ticket.done()  # which starts the next job
+            return
+        finished = getattr(work, 'finished', None)
+        if hasattr(finished, 'connect'):
+            finished.connect(ticket.done)
+            if work.isFinished():  # before the connection was made
+                ticket.done()
@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def test_correction_operator():
+    from xicam.SAXS.processing import corrections
+    data = np.random.poisson(100, (3, 20, 30)).astype(np.float32)
+    dark = np.random.random((20, 30))
+    flat = 2 + np.random.random((20, 30))
+    mask = np.zeros((20, 30), dtype=bool)
+    mask[5:8] = True
+    expected = (data - dark) * np.average(flat - dark) / (flat - dark) * np.logical_not(mask)
+
+    corrected = corrections.correct(data, dark=dark, flat=flat, mask=mask)
+    assert np.allclose(corrected, expected, rtol=1e-5, atol=1e-4)
+    assert corrections.operator((20, 30), dark=dark.copy(), flat=flat, mask=mask) is \
+           corrections.operator((20, 30), dark=dark, flat=flat, mask=mask)
+
+    operator = corrections.operator((20, 30), dark=dark, flat=flat, mask=mask)
+    assert np.allclose(operator.apply(data[0, :, 4], index=(slice(None), 4)), expected[0, :, 4], rtol=1e-5, atol=1e-4)
+    assert operator.apply(data, inplace=True) is data and np.allclose(data, expected, rtol=1e-5, atol=1e-4)
+    assert np.array_equal(corrections.correct(data[0]), data[0])
@@ -0,0 +1,61 @@
+import numpy as np
+from pyFAI import AzimuthalIntegrator, detectors
+from scipy import ndimage
+
+
+class Gaps(object):
+    def componentkey(self):
+        return 'gaps',
+
+    def component(self):
+        mask = np.zeros(detectors.Pilatus300k().shape, dtype=bool)
+        mask[:, 100:105] = True
+        return mask
+
+
+class Threshold(object):
+    def component(self):
+        raise AssertionError('evaluated per frame instead')
+
+    def stage(self):
+        from xicam.SAXS.masking import dynamic
+        return dynamic.Threshold(0, 1000, 1)
+
+
+def test_dynamic_mask(tmpdir):
+    from xicam.SAXS.masking import dynamic, graph
+    from xicam.SAXS.processing import engines, streaming
+    ai = AzimuthalIntegrator(detector=detectors.Pilatus300k(), dist=1, poni1=0.03, poni2=0.04)
+    ai.set_wavelength(1e-10)
+    frames = np.random.poisson(100, (6,) + ai.detector.shape).astype(np.float32)
+    frames[:, :, 100:105] = -1  # gaps, below the threshold
+    frames[3:, 50:54, 200:204] = 1e6  # a hot spot appearing mid-series
+    frames[4:, 10:14, 105:108] = 1e6  # and another, against a gap
+
+    # A data-dependent process without a stage (i.e. a third-party one) can't be evaluated per frame
+    unstaged = graph.compile([Gaps(), type('Unstaged', (object,), {'component': lambda self: None})()])
+    assert not dynamic.evaluable(unstaged) and dynamic.evaluable(graph.compile([Gaps(), Threshold()]))
+
+    dynamic_mask = dynamic.compile(graph.compile([Gaps(), Threshold()]), cache=graph.ComponentCache())
+    assert np.array_equal(dynamic_mask.static.array, Gaps().component())
+    masks = dynamic_mask(frames).copy()  # the returned buffer is reused by the next call
+    kernel = dynamic.disk(1)
+    for frame, mask in zip(frames, masks):  # in addition to the gaps
+        expected = ndimage.binary_opening((frame < 0) | (frame > 1000), kernel) & ~Gaps().component()
+        assert np.array_equal(mask, expected)
+    assert not masks[:3, 50:54, 200:204].any() and masks[3:, 51:53, 201:203].all()
+
+    # Evaluated once per frame, however many of a workflow's processes evaluate it
+    frame = frames[4].copy()
+    frame.flags.writeable = False
+    assert dynamic.evaluate(dynamic_mask, frame) is dynamic.evaluate(dynamic_mask, frame)
+    assert np.array_equal(dynamic.evaluate(dynamic_mask, frame), masks[4])
+    framemask = masks[4]
+    assert dynamic.evaluate(framemask, frame) is framemask and dynamic.evaluate(None, frame) is None
+
+    # Streamed with the static mask in the engine, and the rest per frame
+    result = streaming.reduce_stream(ai, frames, str(tmpdir), npt_rad=100, npt_azim=36, mask=dynamic_mask.static,
+                                     chunksize=4, dynamic_mask=dynamic_mask)
+    for frame, mask, Iq in zip(frames, masks, result['Iq']):
+        expected = engines.bundle(ai, frame, 100, 36, mask=mask | Gaps().component(), flipud=True)[3]
+        assert np.allclose(Iq, expected, rtol=1e-4, atol=1e-3)
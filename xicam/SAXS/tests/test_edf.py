@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+
+def test_metadata_table(tmpdir):
+    from xicam.SAXS.formats.EDFPlugin import conversions, metadata_table, normalization_factors
+
+    def write(name, header, sidecar=None):
+        items = ['HeaderID = EH:000001:000000:000000', 'ByteOrder = LowByteFirst', 'DataType = FloatValue',
+                 'Dim_1 = 4', 'Dim_2 = 3', 'Size = 48'] + ['{} = {}'.format(*item) for item in header.items()]
+        block = ('{\n' + ''.join(item + ' ;\n' for item in items)).ljust(511) + '}\n'
+        path = str(tmpdir.join(name + '.edf'))
+        with open(path, 'wb') as file:
+            file.write(block.encode('latin1') + np.zeros(12, dtype='<f4').tobytes())
+        if sidecar is not None:
+            tmpdir.join(name + '.txt').write(''.join('{}: {}\n'.format(*item) for item in sidecar.items()))
+        return path
+
+    paths = [write('a', {'Izero': 10, 'Image': 3, 'title': 'first', 'Alpha_scan_I0_intensities': '1\t2\t3'},
+                   {'Izero': 20, 'Alpha_scan_positions': '0.1\t0.2\t0.3'}),
+             write('b', {'Izero': 5, 'title': 'second', 'Alpha_scan_I0_intensities': '4\tx'},
+                   {'Alpha_scan_positions': '0.5'}),
+             write('c', {'Alpha_scan_I0_intensities': '5\t6'})]
+    table = metadata_table(paths)
+
+    assert table['Image'].dtype == np.int64 and list(table['Image']) == [3, -1, -1]
+    assert table['title'].dtype.kind == 'U' and list(table['title']) == ['first', 'second', '']
+    assert table['Izero'].dtype == np.float64
+    assert table['Izero'][0] == 20 and table['Izero'][1] == 5 and np.isnan(table['Izero'][2])  # sidecar first
+    assert table['Alpha_scan_positions'].shape == (3, 3)
+    assert np.allclose(table['Alpha_scan_positions'][0], [.1, .2, .3])
+    assert table['Alpha_scan_positions'][1, 0] == .5 and np.isnan(table['Alpha_scan_positions'][1, 1:]).all()
+    assert np.isnan(table['Alpha_scan_positions'][2]).all()
+    assert list(metadata_table(paths, keys=['Izero']).dtype.names) == ['Izero']
+
+    # Header lists are parsed a column at a time; malformed ones are missing from the table, but raise when cast
+    intensities = table['Alpha_scan_I0_intensities']
+    assert np.array_equal(intensities[[0, 2]], [[1, 2, 3], [5, 6, np.nan]], equal_nan=True)
+    assert np.isnan(intensities[1]).all()
+    with pytest.raises(ValueError):
+        conversions['tabdelimitedfloat']('4\tx')
+
+    # Frames without a valid monitor aren't silently left unnormalized
+    factors = normalization_factors(table)
+    assert list(factors[:2]) == [20, 5] and np.isnan(factors[2])
@@ -0,0 +1,107 @@
+import numpy as np
+from pyFAI import AzimuthalIntegrator, detectors
+
+
+def makeAI():
+    ai = AzimuthalIntegrator(detector=detectors.Pilatus300k(), dist=1, poni1=0.03, poni2=0.04)
+    ai.set_wavelength(1e-10)
+    return ai
+
+
+def test_engine_cache_reuse():
+    from xicam.SAXS.processing import engines
+    cache = engines.EngineCache()
+    data = np.ones(detectors.Pilatus300k().shape)
+
+    engine = cache.engine(makeAI(), data.shape, 100)
+    assert cache.engine(makeAI(), data.shape, 100) is engine  # same geometry, new instance
+    assert cache.hits == 1 and cache.misses == 1
+
+    ai = makeAI()
+    ai.set_wavelength(2e-10)
+    assert cache.engine(ai, data.shape, 100) is not engine
+
+
+def test_integrate1d():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    data = np.random.poisson(100, ai.detector.shape).astype(np.float32)
+    q, I = engines.integrate1d(ai, data, 100)
+    assert q.shape == I.shape == (100,)
+    assert np.allclose(I[I > 0], 100, rtol=.1)
+
+
+def test_integrate1d_radial_range():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    data = np.random.poisson(100, ai.detector.shape) * np.linspace(1, 10, ai.detector.shape[1], dtype=np.float32)
+    for radial_range in ((.05, .3), (.2, .5)):
+        q, I = engines.integrate1d(ai, data, 300, radial_range=radial_range)
+        expected = ai.integrate1d(data, 300, unit='q_A^-1', radial_range=radial_range, method='splitbbox')
+        assert np.allclose(q, expected.radial) and np.allclose(I, expected.intensity, rtol=1e-4)  # the end bins too
+
+
+def test_integrate1d_stack():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    stack = np.random.poisson(100, (5,) + ai.detector.shape).astype(np.float32)
+    q, I = engines.integrate1d(ai, stack, 100, normalization_factor=np.arange(1, 6))
+    assert I.shape == (5, 100)
+    for i, frame in enumerate(stack):
+        assert np.allclose(I[i], engines.integrate1d(ai, frame, 100, normalization_factor=i + 1)[1], rtol=1e-4)
+
+
+def test_bundle():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    data = np.random.poisson(100, ai.detector.shape).astype(np.float32)
+    cake, q, chi, Iq, Ichi = engines.bundle(ai, data, 300, 360)
+    assert cake.shape == (360, 300) and Ichi.shape == (360,)
+    assert np.allclose(Iq, engines.integrate1d(ai, data, 300)[1], rtol=1e-3)
+    assert engines.bundle(ai, data.copy(), 300, 360)[0] is cake  # memoized on contents
+
+
+def test_integrate_chi_flipud():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    data = np.random.poisson(100, ai.detector.shape).astype(np.float32)
+    mask = np.zeros(data.shape, dtype=bool)
+    mask[:40] = True
+    chi, I = engines.integrate_chi(ai, data, 360, radial_range=(.05, .3), mask=mask, flipud=True)
+    flippedchi, flippedI = engines.integrate_chi(ai, np.flipud(data), 360, radial_range=(.05, .3),
+                                                 mask=np.flipud(mask))
+    assert np.allclose(chi, flippedchi) and np.allclose(I, flippedI)
+
+
+def test_integrate2d_flipud():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    data = np.random.poisson(100, ai.detector.shape).astype(np.float32)
+    mask = np.zeros(data.shape, dtype=bool)
+    mask[:40] = True
+    I, q, chi = engines.integrate2d(ai, data, 100, 36, mask=mask, flipud=True)
+    flippedI, flippedq, flippedchi = engines.integrate2d(ai, np.flipud(data), 100, 36, mask=np.flipud(mask))
+    assert np.allclose(q, flippedq) and np.allclose(I, flippedI, rtol=1e-4, atol=1e-3)
+
+
+def test_q_axes():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    shape = ai.detector.shape
+    qx = engines.maps.qx_axis(ai, shape)
+    assert qx.shape == (shape[1],) and qx.dtype == np.float32
+    assert engines.maps.qx_axis(makeAI(), (3,) + shape) is qx  # shared between instances and stacks
+    assert np.all(np.diff(np.sign(qx)) >= 0)  # negative left of the beam center
+
+
+def test_remesh():
+    from xicam.SAXS.processing import engines
+    ai = makeAI()
+    data = np.full(ai.detector.shape, 3, dtype=np.float32)
+    image, qp, qz = engines.remesh(ai, data, alphai=.2, resolution=(100, 80), out_range=((-.3, .3), (0, .4)))
+    assert image.shape == (80, 100) and qp.shape == (100,) and qz.shape == (80,)
+    assert np.allclose(image[image > 0], 3)  # bins average their pixels
+
+    stack, _, _ = engines.remesh(ai, np.stack([data, 2 * data]), alphai=.2, resolution=(100, 80),
+                                 out_range=((-.3, .3), (0, .4)))
+    assert np.allclose(stack[1], 2 * image)
@@ -0,0 +1,55 @@
+import os
+import threading
+
+import numpy as np
+
+
+def test_frame_cache(tmpdir):
+    from xicam.SAXS.formats.framecache import FrameCache
+    paths = [str(tmpdir.join('frame{}'.format(i))) for i in range(4)]
+    for path in paths:
+        open(path, 'w').write('frame')
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        return np.zeros((100, 100), dtype=np.float32)  # 40 kB
+
+    frames = FrameCache(maxbytes=100000)
+    frame = frames.get(paths[0], load)
+    assert frames.get(paths[0], load) is frame and len(loads) == 1
+    assert not frame.flags.writeable
+
+    # Concurrent loads of a frame are coalesced
+    threads = [threading.Thread(target=frames.get, args=(paths[1], load)) for _ in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert loads.count(paths[1]) == 1
+
+    # The budget is in bytes; the least recently used frame is evicted
+    frames.get(paths[2], load)
+    assert paths[0] not in frames and paths[2] in frames and frames.nbytes <= frames.maxbytes
+
+    # A modified file is loaded again
+    os.utime(paths[2], ns=(0, 0))
+    frames.get(paths[2], load)
+    assert loads.count(paths[2]) == 2
+
+
+def test_frame_cache_mapped(tmpdir):
+    from xicam.SAXS.formats.framecache import FrameCache
+    paths = [str(tmpdir.join('frame{}'.format(i))) for i in range(6)]
+    for path in paths:
+        np.zeros(16, dtype=np.uint8).tofile(path)
+
+    def load(path):
+        return np.memmap(path, dtype=np.uint8, mode='r')  # holds a file descriptor
+
+    frames = FrameCache(maxmapped=4)
+    for path in paths:
+        frames.get(path, load)
+    frames.get(paths[2], load)  # recently used
+    assert frames.mapped == 4 and frames.nbytes == 0
+    assert paths[2] in frames and paths[1] not in frames and paths[5] in frames
+    frames.get(paths[0], lambda path: np.zeros(4))  # decoded frames don't count against the mappings
+    assert frames.mapped == 4
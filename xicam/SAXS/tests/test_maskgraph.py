@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class Value(object):
+    def __init__(self, value=None):
+        self.value = value
+
+
+class Static(object):
+    """A static component masking a rectangle, counting its computations"""
+
+    def __init__(self, rows, columns, shape=(20, 30)):
+        self.rows, self.columns, self.shape = rows, columns, shape
+        self.computed = 0
+
+    def componentkey(self):
+        return 'rectangle', self.rows, self.columns, self.shape
+
+    def component(self):
+        self.computed += 1
+        mask = np.zeros(self.shape, dtype=bool)
+        mask[slice(*self.rows), slice(*self.columns)] = True
+        return mask
+
+
+class Threshold(object):
+    def __init__(self, data):
+        self.data = data
+
+    def component(self):
+        return self.data > 10
+
+
+class Grow(object):
+    def __init__(self):
+        self.mask = Value()
+
+    def evaluate(self):
+        self.mask.value = self.mask.value | np.roll(self.mask.value, 1, axis=1)
+
+
+def test_mask_graph():
+    from xicam.SAXS.masking import graph
+    data = np.zeros((20, 30))
+    data[10, 10] = 100
+    gaps, beamstop, threshold, grow = Static((5, 6), (0, 30)), Static((0, 3), (0, 3)), \
+                                      Threshold(data), Grow()
+    maskgraph = graph.compile([gaps, threshold, beamstop, grow])
+    assert len(maskgraph) == 2 and maskgraph[0].static == [gaps, beamstop] and maskgraph[0].dynamic == [threshold]
+
+    cache = graph.ComponentCache()
+    mask = graph.evaluate(maskgraph, cache=cache)
+    expected = gaps.component() | beamstop.component() | (data > 10)
+    assert np.array_equal(mask, expected | np.roll(expected, 1, axis=1))
+
+    # Static components are only computed once; the data-dependent one follows the data
+    data[10, 10] = 0
+    mask = graph.evaluate(maskgraph, cache=cache)
+    assert not mask[10, 10:12].any() and mask[5].all()
+    assert gaps.computed == 2 and beamstop.computed == 2  # including the two calls computing expected
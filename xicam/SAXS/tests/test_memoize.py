@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class Scale(object):
+    """Minimal process: Iq = data * factor"""
+
+    def __init__(self):
+        self.inputs = {'data': SimpleNamespace(value=None), 'factor': SimpleNamespace(value=1.)}
+        self.outputs = {'Iq': SimpleNamespace(value=None)}
+        self.evaluations = 0
+
+    def evaluate(self):
+        self.evaluations += 1
+        self.outputs['Iq'].value = self.inputs['data'].value * self.inputs['factor'].value
+
+
+def test_memoize():
+    from xicam.SAXS.processing import memoize
+    process = Scale()
+    memoized = memoize.memoize(process)
+    assert memoize.memoize(process) is memoized
+
+    data = np.arange(10.)
+    process.inputs['data'].value = data
+    process.evaluate()
+    result = process.outputs['Iq'].value
+    process.outputs['Iq'].value = None
+    process.evaluate()  # unchanged inputs; outputs are restored
+    assert process.evaluations == 1 and process.outputs['Iq'].value is result
+
+    process.inputs['factor'].value = 2.
+    process.evaluate()
+    assert process.evaluations == 2 and np.array_equal(process.outputs['Iq'].value, 2 * data)
+
+    data[0] = 5  # in-place changes to an array are noticed
+    process.evaluate()
+    assert process.evaluations == 3
+
+    memoize.invalidate(process)
+    process.evaluate()
+    assert process.evaluations == 4
+
+    assert memoize.fingerprint({1}) != memoize.fingerprint({1})  # unfingerprintable values never match
+    readonly = np.arange(4.)
+    readonly.flags.writeable = False
+    assert memoize.fingerprint(readonly) == memoize.fingerprint(np.arange(4.))
+
+    stack = np.zeros((3, 4, 4))  # stacks of frames aren't hashed
+    assert memoize.fingerprint(stack) != memoize.fingerprint(stack)
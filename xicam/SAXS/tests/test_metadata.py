@@ -0,0 +1,27 @@
+import os
+
+
+def test_metadata_index(tmpdir):
+    from xicam.SAXS.formats import metadata
+    paths = []
+    for i in range(20):
+        path = str(tmpdir.join('frame{}.txt'.format(i)))
+        open(path, 'w').write(str(i))
+        paths.append(path)
+
+    parsed = []
+
+    def parse(path):
+        parsed.append(path)
+        return {'value': int(open(path).read())}
+
+    results = metadata.scan(paths, 'txt', parse, workers=4)
+    assert [results[path]['value'] for path in paths] == list(range(20)) and len(parsed) == 20
+
+    # A later session reads the index instead of parsing again, except for modified files
+    index = metadata.MetadataIndex(metadata.location(str(tmpdir)))
+    open(paths[3], 'w').write('33')
+    os.utime(paths[3], ns=(0, 0))
+    results = index.get_many(paths, 'txt', parse)
+    assert len(parsed) == 21 and results[paths[3]]['value'] == 33
+    assert metadata.lookup(paths[5], 'txt', parse) == {'value': 5} and len(parsed) == 21
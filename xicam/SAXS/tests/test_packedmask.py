@@ -0,0 +1,44 @@
+import pickle
+
+import numpy as np
+from pyFAI import AzimuthalIntegrator, detectors
+
+
+def test_packed_mask():
+    from xicam.SAXS.masking.packedmask import PackedMask, pack
+    from xicam.SAXS.processing import engines, memoize
+    array = np.random.random((195, 487)) > .9
+    mask = pack(array)
+    assert pack(mask) is mask and pack(None) is None
+    assert np.array_equal(mask.array, array) and not mask.array.flags.writeable
+    assert np.array_equal(np.flipud(mask), np.flipud(array))
+
+    # Pickled as 1 bit per pixel; the copy has the same contents and version
+    copy = pickle.loads(pickle.dumps(mask))
+    assert len(pickle.dumps(mask)) < array.size / 8 + 1000
+    assert np.array_equal(copy.array, array) and copy.version == mask.version
+    assert engines.array_key(copy) == engines.array_key(mask)
+
+    # A new mask gets a new version, even if its contents are the same
+    other = PackedMask(array)
+    assert memoize.fingerprint(other) != memoize.fingerprint(mask) and other.key == mask.key
+    union = mask | PackedMask(~array)
+    assert union.array.all() and union.version > other.version
+
+    # Copies are writable; views share the read-only array
+    copied = np.array(mask)
+    assert copied is not mask.array and copied.flags.writeable and np.array_equal(copied, array)
+    copied[0, 0] = not copied[0, 0]
+    assert np.asarray(mask) is mask.array and np.asarray(mask, dtype=np.int8).flags.writeable
+
+
+def test_packed_mask_integration():
+    from xicam.SAXS.masking.packedmask import pack
+    from xicam.SAXS.processing import engines
+    ai = AzimuthalIntegrator(detector=detectors.Pilatus300k(), dist=1, poni1=0.03, poni2=0.04)
+    ai.set_wavelength(1e-10)
+    data = np.random.poisson(100, ai.detector.shape).astype(np.float32)
+    mask = np.zeros(ai.detector.shape, dtype=bool)
+    mask[:50] = True
+    assert np.allclose(engines.integrate1d(ai, data, 100, mask=pack(mask), flipud=True)[1],
+                       engines.integrate1d(ai, data, 100, mask=mask, flipud=True)[1])
@@ -0,0 +1,15 @@
+import numpy as np
+from pyFAI import AzimuthalIntegrator, detectors
+
+
+def test_reduce_series():
+    from xicam.SAXS.processing import engines, parallel
+    ai = AzimuthalIntegrator(detector=detectors.Pilatus300k(), dist=1, poni1=0.03, poni2=0.04)
+    ai.set_wavelength(1e-10)
+    data = np.random.poisson(100, (20,) + ai.detector.shape).astype(np.int32)
+
+    result = parallel.reduce_series(ai, data, 300, 36, processes=2, chunksize=4)
+    _, q, chi, Iq, Ichi = engines.bundle(ai, data, 300, 36, flipud=True)
+    assert result['Iq'].shape == (20, 300) and result['Iz'].shape == (20, data.shape[1])
+    assert np.allclose(result['Iq'], Iq, rtol=1e-5) and np.allclose(result['Ichi'], Ichi, rtol=1e-5)
+    assert np.allclose(result['Ix'], data.sum(axis=-2))
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import numpy as np
+
+
+class Frames(object):
+    """A slow lazy array, recording which frames are read"""
+
+    def __init__(self, count):
+        self.count = count
+        self.reads = []
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        time.sleep(.01)
+        self.reads.append(index)
+        return np.full((10, 10), index)
+
+
+def test_prefetch():
+    from xicam.SAXS.formats.framecache import FrameCache
+    from xicam.SAXS.formats.prefetch import PrefetchedArray
+    frames = Frames(100)
+    array = PrefetchedArray(frames, depth=4, frames=FrameCache())
+
+    assert array[50][0, 0] == 50
+    assert array[48][0, 0] == 48  # scrubbing backwards by 2
+    deadline = time.time() + 5
+    while not all(array.frames.cached(array.key(i)) for i in (46, 44, 42, 40)) and time.time() < deadline:
+        time.sleep(.01)
+    assert array[46][0, 0] == 46 and frames.reads.count(46) == 1  # served by the read ahead
+    assert max(frames.reads) <= 54 and len(array) == 100  # at most depth frames ahead of the first access
+
+
+def test_prefetch_keys():
+    from xicam.SAXS.formats.framecache import FrameCache
+    from xicam.SAXS.formats.prefetch import PrefetchedArray
+
+    class Array(PrefetchedArray):
+        def key(self, index):
+            keyed.append((index, threading.current_thread()))
+            return super(Array, self).key(index)
+
+    keyed = []
+    array = Array(Frames(100), depth=4, frames=FrameCache())
+    for index in range(10, 20):
+        array[index]
+        deadline = time.time() + 5
+        while any(not future.done() for future in list(array._ahead.values())) and time.time() < deadline:
+            time.sleep(.01)
+
+    # Stepping along the timeline, only the first frame's key is computed on the accessing thread
+    assert [index for index, thread in keyed if thread is threading.current_thread()] == [10]
+    assert sorted(index for index, thread in keyed if thread is not threading.current_thread()) == list(range(11, 24))
+
+
+def test_prefetch_files(tmpdir):
+    from xicam.SAXS.formats.framecache import FrameCache
+    from xicam.SAXS.formats.prefetch import PrefetchedArray
+    paths = [str(tmpdir.join('{}.npy'.format(i))) for i in range(20)]
+    for i, path in enumerate(paths):
+        np.save(path, np.full((10, 10), i))
+
+    for mmap_mode in (None, 'r'):
+        cache = FrameCache()
+
+        class Handler(object):
+            """A lazy array of files, whose handler caches the frames it reads"""
+
+            def __len__(self):
+                return len(paths)
+
+            def __getitem__(self, index):
+                return cache.get(paths[index], lambda path: np.load(path, mmap_mode=mmap_mode))
+
+        array = PrefetchedArray(Handler(), paths, depth=4, frames=cache)
+        assert array[5][0, 0] == 5
+        deadline = time.time() + 5
+        while not all(cache.cached(cache.key(paths[i])) for i in range(6, 10)) and time.time() < deadline:
+            time.sleep(.01)
+        assert array[6][0, 0] == 6
+        while any(not future.done() for future in list(array._ahead.values())) and time.time() < deadline:
+            time.sleep(.01)
+
+        # Each frame (5 to 10) is cached once, as the handler read it; memory-mapped ones don't count against the budget
+        assert len(cache._frames) == 6 and cache.nbytes == (0 if mmap_mode else 6 * 800)
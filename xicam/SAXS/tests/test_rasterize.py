@@ -0,0 +1,20 @@
+import numpy as np
+from matplotlib.path import Path
+
+
+def test_fill_polygons():
+    from xicam.SAXS.masking.rasterize import fill_polygons
+    shape = (60, 80)
+    polygons = [[(3.2, 4.7), (50.1, 10.3), (30.6, 40.2), (12.4, 30.9)],  # convex
+                [(40, 20), (75.5, 25), (60, 58.3), (65, 35), (45, 50)],  # concave
+                [(-10, -10), (20, -5), (5, 15)]]  # clipped at the edge
+    centers = np.indices(shape)[::-1].reshape(2, -1).T + .5  # (x, y) of each pixel's center
+    expected = np.zeros(shape, dtype=bool)
+    for polygon in polygons:
+        expected |= Path(polygon).contains_points(centers).reshape(shape)
+
+    mask = np.zeros(shape, dtype=bool)
+    assert fill_polygons(polygons, out=mask) is mask
+    assert np.array_equal(mask, expected)
+    assert np.array_equal(fill_polygons(polygons, shape=shape, flipud=True), np.flipud(expected))
+    assert not fill_polygons([[(0, 0), (1, 1)]], shape=shape).any()
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def test_representations_series():
+    from xicam.SAXS.processing import representations
+    q = np.linspace(.01, .5, 100)
+    I = np.stack([np.exp(-q ** 2 * rg ** 2 / 3) for rg in (10, 20, 30)])
+
+    q2, lnI = representations.represent('guinier', q, I)
+    assert lnI.shape == (3, 100)
+    assert np.allclose(lnI[1], -q2 * 20 ** 2 / 3)
+
+    x, y = representations.represent('iq4', q, I)
+    assert x is q and np.allclose(y, I * q ** 4)
+    assert np.isnan(representations.guinier(q, -I)[1]).all()
+
+    for mode in ('gamma', 'pr'):  # the spectra toolbar's correlation and pair distribution function modes
+        r, values = representations.represent(mode, q, I)
+        assert values.shape == (3, len(r)) and np.isfinite(values).all() and values.any()
+    r, gamma = representations.represent('gamma', q, I[0])
+    assert gamma.shape == r.shape and np.isclose(gamma[0], 1)
+
+
+def test_correlation_function_sphere():
+    from xicam.SAXS.processing import correlation
+    R = 50.
+    q = np.linspace(.003, 1., 3000)
+    I = (3 * (np.sin(q * R) - q * R * np.cos(q * R)) / (q * R) ** 3) ** 2
+    r = np.linspace(0, 120, 25)
+
+    gamma, p = correlation.engine(q, r=r).transform(np.stack([I, 2 * I]))
+    assert gamma.shape == p.shape == (2, 25)
+    exact = np.where(r < 2 * R, 1 - 3 * r / (4 * R) + r ** 3 / (16 * R ** 3), 0)
+    assert np.allclose(gamma, exact, atol=3e-3)
+    assert np.allclose(p[1], 2 * p[0])
@@ -0,0 +1,83 @@
+def test_scheduler_latest_wins():
+    from xicam.SAXS.scheduler import Scheduler
+    scheduler = Scheduler()
+    started, tickets = [], []
+
+    def job(stage, frame):
+        def _job(ticket):
+            started.append((stage, frame))
+            tickets.append(ticket)
+            return ticket  # i.e. a running thread
+
+        return _job
+
+    scheduler.submit('reduce', job('reduce', 0))
+    for frame in range(1, 5):  # scrubbing; only the last frame is kept
+        scheduler.submit('reduce', job('reduce', frame))
+        scheduler.submit('display', job('display', frame))
+    assert started == [('reduce', 0), ('display', 1)]
+    assert tickets[0].cancelled and tickets[1].cancelled  # both superseded while in flight
+
+    # Results of a cancelled job are dropped
+    results = []
+    tickets[0].guard(results.append)('stale')
+    assert results == []
+
+    tickets[0].done()  # the stale reduction finishes; the latest one waits for the display
+    assert started[-1] == ('display', 1)
+    tickets[1].done()
+    assert started[2:] == [('display', 4)] and not tickets[2].cancelled
+    tickets[2].done()
+    assert started[3:] == [('reduce', 4)]
+    tickets[3].done()
+    assert not scheduler.busy()
+
+    scheduler.submit('simulate', lambda ticket: None)  # synchronous jobs finish at once
+    assert not scheduler.busy()
+
+
+def test_scheduler_failed_job():
+    from xicam.SAXS.scheduler import Scheduler
+    scheduler = Scheduler()
+
+    class Thread(object):  # a QThread's finished signal, which fires however the thread ends
+        def __init__(self):
+            self.slots = []
+            self.finished = self
+
+        def connect(self, slot):
+            self.slots.append(slot)
+
+        def isFinished(self):
+            return False
+
+        def fail(self):  # i.e. the workflow raised; the finished_slot (ticket.done) is never called
+            for slot in self.slots:
+                slot()
+
+    threads, started = [], []
+
+    def job(stage):
+        def _job(ticket):
+            started.append(stage)
+            threads.append(Thread())
+            return threads[-1]
+
+        return _job
+
+    scheduler.submit('display', job('display'))
+    scheduler.submit('reduce', job('reduce'))
+    assert started == ['display']
+    threads[0].fail()
+    assert started == ['display', 'reduce']
+    threads[1].fail()
+    assert not scheduler.busy()
+
+    def failing(ticket):
+        raise RuntimeError('failed to start')
+
+    try:
+        scheduler.submit('simulate', failing)
+    except RuntimeError:
+        pass
+    assert not scheduler.busy()
@@ -0,0 +1,63 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+from pyFAI import AzimuthalIntegrator, detectors
+
+
+def test_result_store(tmpdir):
+    from xicam.SAXS.processing import store
+    path = str(tmpdir.join('frame.edf'))
+    open(path, 'w').write('frame')
+    header = SimpleNamespace(startdoc={'paths': [path]})
+    workflow = SimpleNamespace(processes=[])
+    ai = AzimuthalIntegrator(dist=1., detector=detectors.Pilatus300k(), wavelength=1e-10)
+
+    key = store.result_key(store.frame_key(header, 0), workflow, ai, None)
+    curves = [('q', [np.linspace(0, 1, 100), np.random.random((3, 100))]), ('chi', [np.arange(10.), np.ones(10)])]
+    results = store.ResultStore(maxbytes=10 ** 6)
+    assert results.get(key, store.location(header)) is None
+
+    results.put(key, curves, store.location(header))
+    assert results.get(key) is curves
+    assert os.path.isdir(str(tmpdir.join('.xicam')))
+
+    # A new session reads the curves back from disk
+    loaded = store.ResultStore().get(key, store.location(header))
+    assert [name for name, _ in loaded] == ['q', 'chi']
+    assert all(np.array_equal(a, b) for (_, x), (_, y) in zip(curves, loaded) for a, b in zip(x, y))
+
+    # The attributes processes are memoized by, besides their inputs, are part of the key
+    fit = SimpleNamespace(inputs={}, outputs={}, memoattrs=('peakranges',), peakranges=[(.1, .2)])
+    fitkey = store.result_key(store.frame_key(header, 0), SimpleNamespace(processes=[fit]), ai, None)
+    fit.peakranges = [(.1, .3)]
+    assert store.result_key(store.frame_key(header, 0), SimpleNamespace(processes=[fit]), ai, None) != fitkey
+
+    # Modifying the frame changes its key
+    os.utime(path, ns=(0, 0))
+    assert store.result_key(store.frame_key(header, 0), workflow, ai, None) != key
+
+    # The memory tier is bounded by bytes
+    for i in range(10):
+        results.put(i, [('q', [np.zeros(50000)])])
+    assert results.nbytes <= results.maxbytes and results.get(0) is None and results.get(9) is not None
+
+    # Streamed reductions reuse their key's directory; rows of an earlier one which are still mapped stay readable
+    directory = store.stream_location(key, store.location(header))
+    assert store.stream_location(key, store.location(header)) == directory
+    os.makedirs(directory)
+    np.save(os.path.join(directory, 'Iq.npy'), np.ones(10))
+    rows = np.load(os.path.join(directory, 'Iq.npy'), mmap_mode='r')
+    assert not os.path.exists(store.stream_location(key, store.location(header)))
+    assert rows.sum() == 10
+
+    # Memory-mapped rows are stored by reference to their files, and mapped again when loaded
+    os.makedirs(directory)
+    np.save(os.path.join(directory, 'Iq.npy'), np.ones((5, 10)))
+    curves = [('q', [np.arange(10.), np.load(os.path.join(directory, 'Iq.npy'), mmap_mode='r')])]
+    results.put('streamed', curves, store.location(header))
+    assert results.get('streamed') is curves and store._nbytes(curves) == 80  # only q is held in memory
+    with np.load(os.path.join(store.location(header), results.digest('streamed') + '.npz')) as file:
+        assert sorted(file.keys()) == ['0.0', 'counts', 'names', 'references']
+    loaded = store.ResultStore().get('streamed', store.location(header))
+    assert isinstance(loaded[0][1][1], np.memmap) and np.array_equal(loaded[0][1][1], np.ones((5, 10)))
@@ -0,0 +1,31 @@
+import numpy as np
+from pyFAI import AzimuthalIntegrator, detectors
+
+
+def test_appendable_array(tmpdir):
+    from xicam.SAXS.processing.streaming import AppendableArray
+    path = str(tmpdir.join('rows.npy'))
+    with AppendableArray(path, (3,)) as array:
+        array.append(np.arange(6).reshape(2, 3))
+        assert np.array_equal(array.read(), [[0, 1, 2], [3, 4, 5]])
+    with AppendableArray(path) as array:  # reopened to append
+        array.append([6, 7, 8])
+    assert np.array_equal(np.load(path), np.arange(9).reshape(3, 3))
+
+
+def test_reduce_stream(tmpdir):
+    from xicam.SAXS.processing import engines, streaming
+    ai = AzimuthalIntegrator(detector=detectors.Pilatus300k(), dist=1, poni1=0.03, poni2=0.04)
+    ai.set_wavelength(1e-10)
+    data = np.random.poisson(100, (10,) + ai.detector.shape).astype(np.int32)
+
+    progress = []
+    result = streaming.reduce_stream(ai, data, str(tmpdir), 300, 36, chunksize=4, callback=progress.append)
+    _, q, chi, Iq, Ichi = engines.bundle(ai, data, 300, 36, flipud=True)
+    assert progress == [4, 8, 10]
+    assert np.allclose(result['Iq'], Iq, rtol=1e-5) and np.allclose(result['Ichi'], Ichi, rtol=1e-5)
+    assert np.allclose(np.load(str(tmpdir.join('q.npy'))), q)
+
+    # The same X/Z cuts as the parallel reduction
+    assert np.allclose(result['Ix'], data.sum(axis=-2)) and np.allclose(result['Iz'], data.sum(axis=-1)[..., ::-1])
+    assert np.allclose(result['qx'], engines.maps.qx_axis(ai, data.shape[1:]))
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def test_temporal_zingers(monkeypatch):
+    from xicam.SAXS.masking import dynamic, temporal
+    monkeypatch.setattr(temporal, 'CHUNK_ELEMENTS', 1000)  # many chunks of pixels, the last one partial
+    frames = np.random.poisson(100, (9, 37, 41)).astype(np.float32)
+    frames[4, 3, 5] = 1e4
+    frames[0, 10, 10] = 1e4  # at the start of the series, where the window is shifted
+
+    starts = np.clip(np.arange(9) - 2, 0, 4)
+    windows = np.stack([frames[start:start + 5] for start in starts], axis=1)
+    median = np.median(windows, axis=0)
+    deviation = np.maximum(1.4826 * np.median(np.abs(windows - median), axis=0), np.sqrt(np.maximum(median, 1)))
+    expected = frames - median > 5 * deviation
+    assert expected[4, 3, 5] and expected[0, 10, 10]
+
+    assert np.array_equal(temporal.zingers(frames), expected)
+    repaired, mask = temporal.repair(frames)
+    assert np.array_equal(mask, expected)
+    assert np.array_equal(repaired, np.where(expected, median, frames))
+    assert not temporal.zingers(frames[:2]).any()
+
+    dynamic_mask = dynamic.DynamicMask(None, [dynamic.TemporalZinger(5, 5., 1.)])
+    assert np.array_equal(dynamic_mask(frames), expected)
+
+    # Even windows are rounded up
+    assert np.array_equal(temporal.zingers(frames, window=4), expected)
+
+    # Chunks of a series are masked as in the whole series, with the neighbouring frames their windows span
+    for start in range(0, 9, 4):  # the last chunk is a single frame
+        stop = min(start + 4, 9)
+        assert np.array_equal(dynamic_mask.chunk(frames, start, stop), expected[start:stop])
+
+
+def test_temporal_zingers_reduced():
+    from pyFAI import AzimuthalIntegrator, detectors
+    from xicam.SAXS.masking import dynamic, temporal
+    from xicam.SAXS.processing import parallel
+    ai = AzimuthalIntegrator(detector=detectors.Pilatus300k(), dist=1, poni1=0.03, poni2=0.04)
+    ai.set_wavelength(1e-10)
+    data = np.random.poisson(100, (9,) + ai.detector.shape).astype(np.float32)
+    for frame in (0, 3, 4, 8):  # at the edges of the chunks, and in a trailing chunk of one frame
+        data[frame, 10 * frame, 20] = 1e5
+    expected = temporal.zingers(data)
+    assert all(expected[frame, 10 * frame, 20] for frame in (0, 3, 4, 8))
+
+    dynamic_mask = dynamic.DynamicMask(None, [dynamic.TemporalZinger(5, 5., 1.)])
+    result = parallel.reduce_series(ai, data, 100, 36, processes=2, chunksize=4, dynamic_mask=dynamic_mask)
+    assert np.allclose(result['Ix'], np.where(expected, 0, data).sum(axis=-2))
@@ -7,8 +7,12 @@ from pyqtgraph.graphicsItems.LegendItem import ItemSample
 import numpy as np
 from xicam.gui.static import path
 from xicam.core.execution.workflow import Workflow
+from xicam.plugins import PlotHint
+from xicam.SAXS.processing import representations
 from typing import Tuple
 
+MAXCURVES = 200  # most curves plotted for a series
+
 
 class SAXSSpectra(QTabWidget, QWidgetPlugin):
     name = 'SAXSSpectra'
@@ -32,31 +36,57 @@ class SAXSSpectra(QTabWidget, QWidgetPlugin):
         # hbox.setSpacing(0)
 
     def setResult(self, result: Tuple[dict]):
-        self.clear_all()
-        self._cache[0] = tuple({k: v.value for k, v in r.items()} for r in result)
-        self.replot_all()
+        self.plot_mode(result)
 
     def appendResult(self, result):
-        result_cache = tuple({k: v.value for k, v in r.items()} for r in result)
-        self._cache[len(self._cache)] = result_cache
-        self.plot_mode(result_cache)
-
-    def plot_mode(self, resultset):
-        self.clear()
-
-        for result in resultset:
-            name = next(iter(result.keys()))
-            plotwidget = PlotWidget(
-                labels={'bottom': 'q (\u212B\u207B\u00B9)', 'left': 'I (a.u.)', 'top': 'd (nm)'})
+        self.plot_mode(result, clear=False)
+
+    def plot_mode(self, resultset, clear=True):
+        # Snapshot the curves, as the workflow's outputs are overwritten by its next execution; switching
+        # representations then replots from this cache without reducing again
+        self.plot_series([curve for result in resultset for curve in self.curves(result)], clear=clear)
+
+    def plot_series(self, curves, clear=True):
+        """
+        Plot and cache a list of (name, [x, y]) curves; y may have one row per frame.
+        """
+        if clear: self.clear_all()
+        self._cache[len(self._cache)] = curves
+        self.plot_curves(curves)
+
+    def plot_curves(self, curves):
+        mode = getattr(self.toolbar, 'mode', None)
+        for name, values in curves:
+            self.plot_curve(self.findTab(name) or self.addPlotTab(name), name, values)
+
+            if name == 'q' and mode in representations.REPRESENTATIONS and len(values) == 2:
+                title, xlabel, ylabel, _ = representations.REPRESENTATIONS[mode]
+                plotwidget = self.findTab(title) or self.addPlotTab(title, labels={'bottom': xlabel, 'left': ylabel})
+                self.plot_curve(plotwidget, title, representations.represent(mode, *values))
+                self.setCurrentWidget(plotwidget)
+
+    @staticmethod
+    def plot_curve(plotwidget, name, values):
+        if len(values) == 2 and np.ndim(values[1]) == 2:  # stacked result; one curve per frame
+            x, y = values
+            y = y[::-(-len(y) // MAXCURVES)]  # evenly thinned, so that long (i.e. memory-mapped) series stay responsive
+            for i, row in enumerate(y):
+                plotwidget.plot(x, np.asarray(row), name=name, pen=intColor(i, values=len(y)))
+        else:
+            plotwidget.plot(*values, name=name)
+
+    def addPlotTab(self, name, labels=None):
+        if labels is None:
+            plotwidget = PlotWidget(labels={'bottom': 'q (\u212B\u207B\u00B9)', 'left': 'I (a.u.)', 'top': 'd (nm)'})
 
             def tickStrings(values, scale, spacing):
                 return ['{:.3f}'.format(.2 * np.pi / i) if i != 0 else '\u221E' for i in values]
 
             plotwidget.plotItem.axes['top']['item'].tickStrings = tickStrings
-
-            plotwidget.plot(*list(output.value for output in result.values()), name=name)
-
-            self.addTab(plotwidget, name)
+        else:
+            plotwidget = PlotWidget(labels=labels)
+        self.addTab(plotwidget, name)
+        return plotwidget
 
         #
         # checkedindices = self.toolbar.reductionModesModel.checkedIndices()
@@ -70,6 +100,26 @@ class SAXSSpectra(QTabWidget, QWidgetPlugin):
 
         # self._auto_pen()
 
+    @staticmethod
+    def curves(result):
+        """
+        Yield (name, values) for each curve in a process's result, following its PlotHints when it has any, so that
+        processes with several outputs (i.e. the reduction bundle) get a tab per hinted curve.
+        """
+        process = next(iter(result.values())).parent
+        hints = [hint for hint in getattr(process, 'hints', []) if isinstance(hint, PlotHint)
+                 and hint.x.name in result and hint.y.name in result]
+        if hints:
+            for hint in hints:
+                yield hint.x.name, [result[hint.x.name].value, result[hint.y.name].value]
+        else:
+            yield next(iter(result.keys())), list(output.value for output in result.values())
+
+    def findTab(self, name):
+        for i in range(self.count()):
+            if self.tabText(i) == name:
+                return self.widget(i)
+
     def plot(self, *args, **kwargs):
         self.plotwidget.plotItem.plot(*args, **kwargs)
 
@@ -83,13 +133,16 @@ class SAXSSpectra(QTabWidget, QWidgetPlugin):
 
     def replot_all(self, checked=True):
         if not checked: return
-        self.plotwidget.clear()
-        for result in self._cache.values():
-            self.plot_mode(result)
+        self.clear()
+        for curves in self._cache.values():
+            self.plot_curves(curves)
+
+        mode = getattr(self.toolbar, 'mode', None)
+        if mode not in representations.REPRESENTATIONS and self.findTab(mode):
+            self.setCurrentWidget(self.findTab(mode))
 
     def clear_all(self):
-        self.plotwidget.clear()
-        self.legend.items = []
+        self.clear()
         self._cache = {}
 
     def clear_legend(self):
@@ -123,24 +176,34 @@ class SAXSSpectraToolbar(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
 
         self.modeActionGroup = QActionGroup(self)
-        qbtn = self.mkGroupToggle('icons/q.png', text='q (Azimuthal) Integration', receiver=self.sigPlotCache.emit)
+        qbtn = self.mkGroupToggle('icons/q.png', text='q (Azimuthal) Integration', receiver=self.sigPlotCache.emit,
+                                  mode='q')
         qbtn.setChecked(True)
         modetoolbar.addAction(qbtn)
         modetoolbar.addAction(
-            self.mkGroupToggle('icons/chi.png', text='χ (chi/Radial) Integration', receiver=self.sigPlotCache.emit))
+            self.mkGroupToggle('icons/chi.png', text='χ (chi/Radial) Integration', receiver=self.sigPlotCache.emit,
+                               mode='chi'))
         modetoolbar.addAction(
-            self.mkGroupToggle('icons/x.png', text='X (Horizontal) Integration', receiver=self.sigPlotCache.emit))
+            self.mkGroupToggle('icons/x.png', text='X (Horizontal) Integration', receiver=self.sigPlotCache.emit,
+                               mode='qx'))
         modetoolbar.addAction(
-            self.mkGroupToggle('icons/z.png', text='Z (Vertical) Integration', receiver=self.sigPlotCache.emit))
-        modetoolbar.addAction(self.mkGroupToggle('icons/G.png', text='Guinier Plot', receiver=self.sigPlotCache.emit))
-        modetoolbar.addAction(self.mkGroupToggle('icons/P.png', text='Porod Plot', receiver=self.sigPlotCache.emit))
-        modetoolbar.addAction(self.mkGroupToggle('icons/Iq2.png', text='I×q\u00B2', receiver=self.sigPlotCache.emit))
-        modetoolbar.addAction(self.mkGroupToggle('icons/Iq3.png', text='I×q\u00B3', receiver=self.sigPlotCache.emit))
-        modetoolbar.addAction(self.mkGroupToggle('icons/Iq4.png', text='I×q\u0074', receiver=self.sigPlotCache.emit))
+            self.mkGroupToggle('icons/z.png', text='Z (Vertical) Integration', receiver=self.sigPlotCache.emit,
+                               mode='qz'))
+        modetoolbar.addAction(self.mkGroupToggle('icons/G.png', text='Guinier Plot', receiver=self.sigPlotCache.emit,
+                                                 mode='guinier'))
+        modetoolbar.addAction(self.mkGroupToggle('icons/P.png', text='Porod Plot', receiver=self.sigPlotCache.emit,
+                                                 mode='porod'))
+        modetoolbar.addAction(self.mkGroupToggle('icons/Iq2.png', text='I×q\u00B2', receiver=self.sigPlotCache.emit,
+                                                 mode='iq2'))
+        modetoolbar.addAction(self.mkGroupToggle('icons/Iq3.png', text='I×q\u00B3', receiver=self.sigPlotCache.emit,
+                                                 mode='iq3'))
+        modetoolbar.addAction(self.mkGroupToggle('icons/Iq4.png', text='I×q\u2074', receiver=self.sigPlotCache.emit,
+                                                 mode='iq4'))
         modetoolbar.addAction(self.mkGroupToggle('icons/gofr.png', text='Electron Density Correlation Function',
-                                                 receiver=self.sigPlotCache.emit))
+                                                 receiver=self.sigPlotCache.emit, mode='gamma'))
         modetoolbar.addAction(
-            self.mkGroupToggle('icons/gofrvec.png', text='Pair Distribution Function', receiver=self.sigPlotCache.emit))
+            self.mkGroupToggle('icons/gofrvec.png', text='Pair Distribution Function', receiver=self.sigPlotCache.emit,
+                               mode='pr'))
 
         self.multiplot = QAction(self)
         self.multiplot.setIcon(QIcon(str(path('icons/multiplot.png'))))
@@ -155,8 +218,17 @@ class SAXSSpectraToolbar(QWidget):
         optionstoolbar.setOrientation(Qt.Vertical)
         modetoolbar.setOrientation(Qt.Vertical)
 
-    def mkGroupToggle(self, iconpath: str = None, text=None, receiver=None):
+    @property
+    def mode(self):
+        """
+        The key of the checked plot mode; a curve name (i.e. 'q') or a representation (i.e. 'guinier').
+        """
+        action = self.modeActionGroup.checkedAction()
+        return action.data() if action is not None else None
+
+    def mkGroupToggle(self, iconpath: str = None, text=None, receiver=None, mode=None):
         actn = QAction(self)
+        if mode: actn.setData(mode)
         if iconpath: actn.setIcon(QIcon(QPixmap(str(path(iconpath)))))
         if text: actn.setText(text)
         if receiver: actn.triggered.connect(receiver)
@@ -6,6 +6,7 @@ from qtpy.QtCore import *
 from qtpy.QtGui import *
 import numpy as np
 from xicam.core import msg
+from xicam.SAXS.formats import prefetch
 from xicam.gui.widgets.dynimageview import DynImageView
 from xicam.gui.widgets.imageviewmixins import Crosshair, QCoordinates, CenterMarker, BetterButtons, EwaldCorrected
 import pyqtgraph as pg
@@ -50,10 +51,10 @@ class SAXSViewerPluginBase(CenterMarker, BetterButtons, Crosshair, QCoordinates,
     def setHeader(self, header: NonDBHeader, field: str, *args, **kwargs):
         self.header = header
         self.field = field
-        # make lazy array from document
+        # make lazy array from document; frames are cached and read ahead, shared with the other views of the header
         data = None
         try:
-            data = header.meta_array(field)
+            data = prefetch.prefetched(header, field)
         except IndexError:
             msg.logMessage(f'Header object contained no frames with field "{field}".', msg.ERROR)
 
@@ -80,10 +81,10 @@ class SAXSViewerPluginBase(CenterMarker, BetterButtons, Crosshair, QCoordinates,
 
         for result in self.results:
             try:
-                if self.toolbar.cakeaction.isChecked():
+                if self.toolbar.cakeaction.isChecked() and 'cake' in result:
                     self.setImage(result['cake'].value)
                     break
-                elif self.toolbar.remeshaction.isChecked():
+                elif self.toolbar.remeshaction.isChecked() and 'remesh' in result:
                     self.setImage(result['remesh'].value)  # TODO: add checkbox to toolbar
                     break
                 elif 'inpaint' in result: